@@ -1,10 +1,17 @@
 import json
 import logging
-import boto3
 import os
+import sys
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+# Add the main project's src directory to Python path for shared modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from aws_clients import get_table
+from lead_reputation import set_customer
+from conversation_history import fetch_activity_contents, hydrate_activities
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -19,7 +26,11 @@ def lambda_handler(event, context):
         path_parameters = event.get('pathParameters') or {}
         
         # Handle different API endpoints
-        if path.startswith('/api/lead/'):
+        if path.startswith('/api/lead/') and path.endswith('/customer') and http_method == 'POST':
+            lead_id = path_parameters.get('lead_id')
+            return mark_lead_as_customer(lead_id, event.get('body'))
+        
+        elif path.startswith('/api/lead/'):
             lead_id = path_parameters.get('lead_id')
             return get_lead_details(lead_id)
         
@@ -62,11 +73,9 @@ def get_lead_details(lead_id):
         return create_response(400, {'error': 'Lead ID is required'})
     
     try:
-        dynamodb = boto3.resource('dynamodb')
-        leads_table = dynamodb.Table(os.environ['LEADS_TABLE'])
-        contact_methods_table = dynamodb.Table(os.environ['CONTACT_METHODS_TABLE'])
-        activities_table = dynamodb.Table(os.environ['ACTIVITIES_TABLE'])
-        activity_content_table = dynamodb.Table(os.environ['ACTIVITY_CONTENT_TABLE'])
+        leads_table = get_table(os.environ['LEADS_TABLE'])
+        contact_methods_table = get_table(os.environ['CONTACT_METHODS_TABLE'])
+        activities_table = get_table(os.environ['ACTIVITIES_TABLE'])
         
         # Get lead info
         lead_response = leads_table.get_item(Key={'id': lead_id})
@@ -91,20 +100,8 @@ def get_lead_details(lead_id):
             Limit=20
         )
         
-        # Get activity content for each activity
-        activities_with_content = []
-        for activity in activities_response['Items']:
-            content_response = activity_content_table.query(
-                IndexName='activity-id-index',
-                KeyConditionExpression='activity_id = :activity_id',
-                ExpressionAttributeValues={':activity_id': activity['id']}
-            )
-            
-            activity_data = dict(activity)
-            if content_response['Items']:
-                activity_data['content'] = content_response['Items'][0]['content']
-            
-            activities_with_content.append(activity_data)
+        # Get activity content for all activities in bulk
+        activities_with_content = hydrate_activities(activities_response['Items'])
         
         result = {
             'lead': convert_decimals(lead),
@@ -118,14 +115,37 @@ def get_lead_details(lead_id):
         logger.error(f"Error getting lead details: {str(e)}")
         return create_response(500, {'error': str(e)})
 
+def mark_lead_as_customer(lead_id, body):
+    """Mark (or unmark) a lead as customer, which lets it skip AI spam detection"""
+    
+    if not lead_id:
+        return create_response(400, {'error': 'Lead ID is required'})
+    
+    try:
+        request = json.loads(body) if body else {}
+        is_customer = request.get('is_customer', True)
+        if not isinstance(is_customer, bool):
+            return create_response(400, {'error': 'is_customer must be a boolean'})
+        
+        if not set_customer(lead_id, is_customer):
+            return create_response(404, {'error': 'Lead not found'})
+        
+        logger.info(f"Lead {lead_id} marked as customer: {is_customer}")
+        return create_response(200, {'lead_id': lead_id, 'is_customer': is_customer})
+        
+    except json.JSONDecodeError:
+        return create_response(400, {'error': 'Invalid JSON body'})
+    except Exception as e:
+        logger.error(f"Error marking lead as customer: {str(e)}")
+        return create_response(500, {'error': str(e)})
+
 def get_daily_analytics():
     """Get daily analytics and statistics"""
     
     try:
-        dynamodb = boto3.resource('dynamodb')
-        leads_table = dynamodb.Table(os.environ['LEADS_TABLE'])
-        activities_table = dynamodb.Table(os.environ['ACTIVITIES_TABLE'])
-        spam_activities_table = dynamodb.Table(os.environ['SPAM_ACTIVITIES_TABLE'])
+        leads_table = get_table(os.environ['LEADS_TABLE'])
+        activities_table = get_table(os.environ['ACTIVITIES_TABLE'])
+        spam_activities_table = get_table(os.environ['SPAM_ACTIVITIES_TABLE'])
         
         today = datetime.now().date()
         today_start = datetime.combine(today, datetime.min.time()).isoformat()
@@ -184,11 +204,9 @@ def get_spam_activities():
     """Get recent spam activities with details"""
     
     try:
-        dynamodb = boto3.resource('dynamodb')
-        spam_activities_table = dynamodb.Table(os.environ['SPAM_ACTIVITIES_TABLE'])
-        leads_table = dynamodb.Table(os.environ['LEADS_TABLE'])
-        contact_methods_table = dynamodb.Table(os.environ['CONTACT_METHODS_TABLE'])
-        activity_content_table = dynamodb.Table(os.environ['ACTIVITY_CONTENT_TABLE'])
+        spam_activities_table = get_table(os.environ['SPAM_ACTIVITIES_TABLE'])
+        leads_table = get_table(os.environ['LEADS_TABLE'])
+        contact_methods_table = get_table(os.environ['CONTACT_METHODS_TABLE'])
         
         # Get recent spam activities (last 7 days)
         seven_days_ago = (datetime.now() - timedelta(days=7)).isoformat()
@@ -197,8 +215,13 @@ def get_spam_activities():
             ExpressionAttributeValues={':seven_days_ago': seven_days_ago}
         )
         
+        recent_spam_activities = spam_response['Items'][:50]  # Limit to 50 for performance
+        
+        # Get activity content for all spam activities in bulk
+        contents = fetch_activity_contents([spam_activity['activity_id'] for spam_activity in recent_spam_activities])
+        
         spam_activities = []
-        for spam_activity in spam_response['Items'][:50]:  # Limit to 50 for performance
+        for spam_activity in recent_spam_activities:
             # Get lead info
             lead_response = leads_table.get_item(Key={'id': spam_activity['lead_id']})
             lead_name = lead_response.get('Item', {}).get('name', 'Unknown')
@@ -216,17 +239,7 @@ def get_spam_activities():
                     phone = contact['value']
                     break
             
-            # Get activity content
-            content_response = activity_content_table.query(
-                IndexName='activity-id-index',
-                KeyConditionExpression='activity_id = :activity_id',
-                ExpressionAttributeValues={':activity_id': spam_activity['activity_id']}
-            )
-            
-            message = 'N/A'
-            if content_response['Items']:
-                content = content_response['Items'][0]['content']
-                message = content.get('leadMessage', 'N/A')
+            message = contents.get(spam_activity['activity_id'], {}).get('leadMessage', 'N/A')
             
             spam_activities.append({
                 'id': spam_activity.get('id'),
@@ -252,10 +265,9 @@ def get_spam_users():
     """Get users classified as spammers"""
     
     try:
-        dynamodb = boto3.resource('dynamodb')
-        spam_activities_table = dynamodb.Table(os.environ['SPAM_ACTIVITIES_TABLE'])
-        leads_table = dynamodb.Table(os.environ['LEADS_TABLE'])
-        contact_methods_table = dynamodb.Table(os.environ['CONTACT_METHODS_TABLE'])
+        spam_activities_table = get_table(os.environ['SPAM_ACTIVITIES_TABLE'])
+        leads_table = get_table(os.environ['LEADS_TABLE'])
+        contact_methods_table = get_table(os.environ['CONTACT_METHODS_TABLE'])
         
         # Get spam activities from last 30 days
         thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
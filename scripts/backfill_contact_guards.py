@@ -0,0 +1,88 @@
+"""
+Create the uniqueness guard items of the existing contact methods.
+
+Scans the ContactMethodsTable and puts a guard ('type_value#<type>#<value>')
+for every contact method that has none, conditionally, so running it while
+traffic flows (or re-running it) never overwrites a guard. Contact methods
+whose type#value is already owned by another contact method (duplicates
+created before the guards) are reported; the oldest one keeps the guard.
+Once it has run, LEGACY_CONTACT_LOOKUP can be set to 'false'.
+
+Usage:
+    python scripts/backfill_contact_guards.py \\
+        --contact-methods-table pandasdb-crm-comm-dev-contact-methods [--dry-run]
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aws_clients import get_table
+from lead_store import put_guard, read_guard
+
+
+def scan_contact_methods(contact_methods_table):
+    """Contact methods grouped by type_value (guard items have no type_value and are skipped)"""
+    scan_kwargs = {
+        'FilterExpression': 'attribute_exists(type_value)',
+        'ProjectionExpression': 'id, lead_id, type_value, created_at'
+    }
+
+    contact_methods = defaultdict(list)
+    scanned = 0
+    while True:
+        response = contact_methods_table.scan(**scan_kwargs)
+        scanned += response.get('ScannedCount', 0)
+        for item in response['Items']:
+            contact_methods[item['type_value']].append(item)
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    return contact_methods, scanned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--contact-methods-table', default=os.environ.get('CONTACT_METHODS_TABLE'))
+    parser.add_argument('--dry-run', action='store_true', help='Only print what would be written')
+    args = parser.parse_args()
+
+    if not args.contact_methods_table:
+        parser.error('--contact-methods-table is required')
+    os.environ['CONTACT_METHODS_TABLE'] = args.contact_methods_table
+
+    print(f"Scanning {args.contact_methods_table}...")
+    contact_methods, scanned = scan_contact_methods(get_table(args.contact_methods_table))
+    print(f"Scanned {scanned} items: {len(contact_methods)} distinct contact methods")
+
+    created = existing = 0
+    for type_value, items in sorted(contact_methods.items()):
+        items.sort(key=lambda item: item.get('created_at', ''))
+        owner = items[0]
+        if len(items) > 1:
+            others = ', '.join(f"{item['id']} (lead {item['lead_id']})" for item in items[1:])
+            print(f"  duplicate {type_value}: kept {owner['id']} (lead {owner['lead_id']}), also {others}")
+
+        if args.dry_run:
+            continue
+        if put_guard(type_value, owner['lead_id'], owner['id'], owner.get('created_at')):
+            created += 1
+        else:
+            existing += 1
+            guard_owner = read_guard(type_value)
+            if guard_owner and guard_owner['contact_method_id'] != owner['id']:
+                print(f"  {type_value}: guard already owned by {guard_owner['contact_method_id']}")
+
+    if args.dry_run:
+        print(f"Would create up to {len(contact_methods)} guards")
+        return
+    print(f"Created {created} guards, {existing} already existed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Build the per-day lead message counters from the existing ActivitiesTable.
+
+Scans inbound activities inside the largest message_limits window of
+config/business.yml, aggregates them per lead and day, and writes the
+day buckets (overwriting existing ones, so the script can be re-run).
+Run it before switching spam_detection.message_count_source to counters.
+
+Usage:
+    python scripts/backfill_message_counters.py \\
+        --activities-table pandasdb-crm-comm-dev-activities \\
+        --counters-table pandasdb-crm-comm-dev-lead-message-counters [--dry-run]
+"""
+import argparse
+import os
+import sys
+from collections import Counter
+from datetime import datetime
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aws_clients import get_table
+from message_counters import get_counter_expiry, get_counter_retention_days
+from spam_windows import day_window_start
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'business.yml')
+
+
+def count_inbound_messages(activities_table, since):
+    """Scan inbound activities created since `since` and count them per (lead_id, day)"""
+    scan_kwargs = {
+        'FilterExpression': '#direction = :inbound AND created_at >= :since',
+        'ProjectionExpression': 'lead_id, created_at',
+        'ExpressionAttributeNames': {'#direction': 'direction'},
+        'ExpressionAttributeValues': {':inbound': 'inbound', ':since': since}
+    }
+
+    counts = Counter()
+    scanned = 0
+    while True:
+        response = activities_table.scan(**scan_kwargs)
+        scanned += response.get('ScannedCount', 0)
+        for item in response['Items']:
+            if item.get('lead_id'):
+                counts[(item['lead_id'], item['created_at'][:10])] += 1
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    return counts, scanned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--activities-table', default=os.environ.get('ACTIVITIES_TABLE'))
+    parser.add_argument('--counters-table', default=os.environ.get('LEAD_MESSAGE_COUNTERS_TABLE'))
+    parser.add_argument('--config', default=CONFIG_PATH)
+    parser.add_argument('--dry-run', action='store_true', help='Only print what would be written')
+    args = parser.parse_args()
+
+    if not args.activities_table or not args.counters_table:
+        parser.error('--activities-table and --counters-table are required')
+
+    with open(args.config, encoding='utf-8') as config_file:
+        config = yaml.safe_load(config_file)
+
+    retention_days = get_counter_retention_days(config)
+    since = day_window_start(retention_days - 1, datetime.now())
+
+    print(f"Counting inbound activities since {since} in {args.activities_table}...")
+    counts, scanned = count_inbound_messages(get_table(args.activities_table), since)
+    print(f"Scanned {scanned} activities: {len(counts)} day buckets for {len({lead for lead, _ in counts})} leads")
+
+    if args.dry_run:
+        for (lead_id, day), message_count in sorted(counts.items())[:20]:
+            print(f"  {lead_id} {day}: {message_count}")
+        return
+
+    with get_table(args.counters_table).batch_writer() as batch:
+        for (lead_id, day), message_count in counts.items():
+            batch.put_item(Item={
+                'lead_id': lead_id,
+                'day': day,
+                'message_count': message_count,
+                'expires_at': get_counter_expiry(day, retention_days)
+            })
+
+    print(f"Wrote {len(counts)} day buckets to {args.counters_table}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: per-invocation AWS client setup on a warm container.
+
+Compares the client/resource/Table construction done by one
+generate_ai_response invocation before the shared registry (fresh boto3
+objects every call) with the cached objects from src/aws_clients.py.
+No AWS calls are made, so this measures construction overhead only; the
+saved TLS handshakes from connection reuse come on top of it.
+
+Usage:
+    python scripts/benchmarks/bench_aws_clients.py [--invocations 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+
+import boto3
+
+import aws_clients
+
+
+def setup_without_registry():
+    """Client construction performed by one invocation before the registry"""
+    # lambda_handler
+    dynamodb = boto3.resource('dynamodb')
+    dynamodb.Table('activities')
+    dynamodb.Table('activity-content')
+    boto3.client(service_name='bedrock-runtime', region_name='eu-west-1')
+    # load_system_prompt_from_s3 + load_business_config
+    boto3.client('s3')
+    boto3.client('s3')
+    # get_conversation_history (+ its own load_business_config)
+    dynamodb = boto3.resource('dynamodb')
+    dynamodb.Table('activities')
+    dynamodb.Table('activity-content')
+    boto3.client('s3')
+
+
+def setup_with_registry():
+    """The same lookups through the shared registry"""
+    aws_clients.get_table('activities')
+    aws_clients.get_table('activity-content')
+    aws_clients.get_bedrock_runtime()
+    aws_clients.get_client('s3')
+    aws_clients.get_client('s3')
+    aws_clients.get_table('activities')
+    aws_clients.get_table('activity-content')
+    aws_clients.get_client('s3')
+
+
+def measure(setup, invocations):
+    """Return per-invocation milliseconds, excluding the first (cold) call"""
+    setup()
+    started = time.perf_counter()
+    for _ in range(invocations):
+        setup()
+    return (time.perf_counter() - started) * 1000 / invocations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invocations', type=int, default=200)
+    args = parser.parse_args()
+
+    aws_clients.reset_clients()
+    cold_started = time.perf_counter()
+    setup_with_registry()
+    cold_ms = (time.perf_counter() - cold_started) * 1000
+
+    before_ms = measure(setup_without_registry, args.invocations)
+    after_ms = measure(setup_with_registry, args.invocations)
+
+    print(f"Warm invocations measured: {args.invocations}")
+    print(f"Before (fresh clients per invocation): {before_ms:8.3f} ms/invocation")
+    print(f"After  (shared registry):              {after_ms:8.3f} ms/invocation")
+    print(f"Registry cold start (first invocation): {cold_ms:8.3f} ms")
+    print(f"Saved per warm invocation:              {before_ms - after_ms:8.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: conversation history hydration.
+
+Compares the previous hydration (one activity_content Query per activity,
+in sequence) with src/conversation_history.py against a stubbed DynamoDB
+that sleeps a fixed latency per call:
+
+- batched: content stored with ids derived from the activity id (BatchGetItem)
+- fallback: content stored with random ids (BatchGetItem miss, then
+  concurrent index queries on a bounded pool)
+
+Usage:
+    python scripts/benchmarks/bench_conversation_history.py [--latency-ms 8]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+import conversation_history
+from conversation_history import get_content_id
+
+ACTIVITIES_TABLE = 'activities'
+ACTIVITY_CONTENT_TABLE = 'activity-content'
+
+
+class StubDynamoDB:
+    """Activities and activity_content tables with injected per-call latency"""
+
+    def __init__(self, latency_ms, activity_count, derived_ids):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.activities = [
+            {'id': str(uuid.uuid4()), 'lead_id': 'lead', 'created_at': f"2025-01-01T00:00:{position:02d}"}
+            for position in range(activity_count)
+        ]
+        self.contents = {}
+        for activity in self.activities:
+            content_id = get_content_id(activity['id']) if derived_ids else str(uuid.uuid4())
+            self.contents[content_id] = {
+                'id': content_id,
+                'activity_id': activity['id'],
+                'content': {'leadMessage': 'hola', 'assistantMessage': 'hola, en que puedo ayudarte?'}
+            }
+        self.by_activity = {item['activity_id']: item for item in self.contents.values()}
+
+    def call(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency)
+
+    def Table(self, table_name):
+        return StubTable(self, table_name)
+
+    def batch_get_item(self, RequestItems):
+        self.call()
+        keys = RequestItems[ACTIVITY_CONTENT_TABLE]['Keys']
+        items = [self.contents[key['id']] for key in keys if key['id'] in self.contents]
+        return {'Responses': {ACTIVITY_CONTENT_TABLE: items}, 'UnprocessedKeys': {}}
+
+
+class StubTable:
+    def __init__(self, dynamodb, table_name):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+
+    def query(self, **kwargs):
+        self.dynamodb.call()
+        values = kwargs['ExpressionAttributeValues']
+        if self.table_name == ACTIVITIES_TABLE:
+            items = sorted(self.dynamodb.activities, key=lambda activity: activity['created_at'], reverse=True)
+            return {'Items': items[:kwargs.get('Limit')]}
+        item = self.dynamodb.by_activity.get(values[':activity_id'])
+        return {'Items': [item] if item else []}
+
+
+def legacy_history(dynamodb, lead_id, limit):
+    """Previous behaviour: activities query + one content query per activity"""
+    activities_table = dynamodb.Table(ACTIVITIES_TABLE)
+    activity_content_table = dynamodb.Table(ACTIVITY_CONTENT_TABLE)
+    response = activities_table.query(
+        IndexName='lead-id-created-at-index',
+        KeyConditionExpression='lead_id = :lead_id',
+        ExpressionAttributeValues={':lead_id': lead_id},
+        ScanIndexForward=False,
+        Limit=limit
+    )
+    history = []
+    for activity in response['Items']:
+        content_response = activity_content_table.query(
+            IndexName='activity-id-index',
+            KeyConditionExpression='activity_id = :activity_id',
+            ExpressionAttributeValues={':activity_id': activity['id']}
+        )
+        if content_response['Items']:
+            history.append(content_response['Items'][0]['content'])
+    return history
+
+
+def run(variant, limit, latency_ms, repetitions=5):
+    dynamodb = StubDynamoDB(latency_ms, limit, derived_ids=(variant != 'fallback'))
+    conversation_history.get_resource = lambda service_name: dynamodb
+    conversation_history.get_table = dynamodb.Table
+
+    started = time.perf_counter()
+    for _ in range(repetitions):
+        if variant == 'legacy':
+            history = legacy_history(dynamodb, 'lead', limit)
+        else:
+            history = conversation_history.load_conversation_history('lead', limit)
+    elapsed_ms = (time.perf_counter() - started) * 1000 / repetitions
+    return len(history), dynamodb.calls / repetitions, elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency-ms', type=float, default=8.0)
+    args = parser.parse_args()
+
+    os.environ['ACTIVITIES_TABLE'] = ACTIVITIES_TABLE
+    os.environ['ACTIVITY_CONTENT_TABLE'] = ACTIVITY_CONTENT_TABLE
+
+    print(f"Per-call latency: {args.latency_ms} ms")
+    print(f"{'history':>7} | {'variant':>8} | {'messages':>8} | {'calls':>5} | {'ms':>7}")
+    print('-' * 48)
+    for limit in (10, 20, 50):
+        for variant in ('legacy', 'batched', 'fallback'):
+            messages, calls, elapsed_ms = run(variant, limit, args.latency_ms)
+            print(f"{limit:>7} | {variant:>8} | {messages:>8} | {calls:>5.0f} | {elapsed_ms:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
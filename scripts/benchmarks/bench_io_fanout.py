@@ -0,0 +1,196 @@
+"""
+Benchmark: pre-Bedrock I/O of the response stages, serial versus fanned out.
+
+Runs the real generate_ai_response and generate_spam_response handlers
+against stubbed DynamoDB tables, S3 and Bedrock that sleep a fixed latency
+per call, with io_fanout disabled, enabled, and enabled with write_behind.
+Every invocation starts with the S3 cache expired (conditional GETs, as
+after CONFIG_CACHE_TTL_SECONDS). Reports the time until Bedrock is called
+and the total handler time (AI stage), and the total handler time (spam stage).
+
+Usage:
+    python scripts/benchmarks/bench_io_fanout.py [--runs 10] [--dynamodb-ms 8] [--s3-ms 25] [--bedrock-ms 600]
+"""
+import argparse
+import copy
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+import yaml
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+import aux
+import aws_clients
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'config', 'business.yml')
+TABLES = {
+    'ACTIVITIES_TABLE': 'activities',
+    'ACTIVITY_CONTENT_TABLE': 'activity-content',
+    'SPAM_ACTIVITIES_TABLE': 'spam-activities',
+    'LEADS_TABLE': 'leads',
+    'LEAD_MESSAGE_COUNTERS_TABLE': 'lead-message-counters'
+}
+
+
+class StubTable:
+    """Any table: writes succeed, the lead item carries a short recent_messages buffer"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def put_item(self, **kwargs):
+        time.sleep(self.latency)
+        return {}
+
+    def update_item(self, **kwargs):
+        time.sleep(self.latency)
+        return {}
+
+    def get_item(self, **kwargs):
+        time.sleep(self.latency)
+        return {'Item': {
+            'id': kwargs['Key']['id'],
+            'recent_messages': [
+                {'timestamp': '2025-01-01T10:00:00', 'direction': 'inbound', 'text': 'Hola'},
+                {'timestamp': '2025-01-01T10:00:05', 'direction': 'outbound', 'text': 'Hola! En que puedo ayudarte?'}
+            ]
+        }}
+
+    def query(self, **kwargs):
+        time.sleep(self.latency)
+        return {'Items': []}
+
+
+class StubDynamoDBClient:
+    """Multi-item writes (WriteBatch transactions and batches) succeed after one round trip"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def transact_write_items(self, TransactItems):
+        time.sleep(self.latency)
+        return {}
+
+    def batch_write_item(self, RequestItems):
+        time.sleep(self.latency)
+        return {'UnprocessedItems': {}}
+
+
+class StubS3:
+    def __init__(self, latency, objects):
+        self.latency = latency
+        self.objects = objects
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        time.sleep(self.latency)
+        etag = f'"{hash(self.objects[Key])}"'
+        if IfNoneMatch == etag:
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[Key]), 'ETag': etag}
+
+
+class StubBedrock:
+    def __init__(self, latency):
+        self.latency = latency
+        self.called_at = None
+
+    def invoke_model(self, **kwargs):
+        self.called_at = time.perf_counter()
+        time.sleep(self.latency)
+        body = {'content': [{'text': 'Claro, el renting incluye mantenimiento.'}],
+                'usage': {'input_tokens': 800, 'output_tokens': 20}}
+        return {'body': io.BytesIO(json.dumps(body).encode('utf-8'))}
+
+
+def bench_config(fanout, write_behind):
+    with open(CONFIG_PATH, encoding='utf-8') as config_file:
+        config = yaml.safe_load(config_file)
+    config = copy.deepcopy(config)
+    # Only the I/O measured here: no retrieval, cache, summary, streaming or routing calls
+    for section in ('knowledge_retrieval', 'faq_cache', 'conversation_summary', 'reply_streaming'):
+        config.setdefault(section, {})['enabled'] = False
+    config['ai_models'].setdefault('routing', {})['enabled'] = False
+    config['io_fanout'] = {'enabled': fanout, 'max_workers': 8, 'write_behind': write_behind}
+    return config
+
+
+def install_stubs(args, config):
+    aws_clients.reset_clients()
+    for env_name, table_name in TABLES.items():
+        os.environ[env_name] = table_name
+        aws_clients._tables[table_name] = StubTable(args.dynamodb_ms / 1000)
+    aws_clients._clients[('dynamodb', None)] = StubDynamoDBClient(args.dynamodb_ms / 1000)
+    os.environ['S3_KNOWLEDGE_BUCKET'] = 'knowledge'
+    aux._s3_cache.clear()
+    aws_clients._clients[('s3', None)] = StubS3(args.s3_ms / 1000, {
+        'config/business.yml': yaml.safe_dump(config).encode('utf-8'),
+        'knowledge/system_prompt.txt': 'Eres el asistente de ventas de máquinas expendedoras.'.encode('utf-8')
+    })
+    bedrock = StubBedrock(args.bedrock_ms / 1000)
+    aws_clients._clients[('bedrock-runtime', os.environ.get('AWS_REGION', 'eu-west-1'))] = bedrock
+    return bedrock
+
+
+def expire_s3_cache():
+    """Every invocation starts past the cache TTL: its first read of each S3 object is a conditional GET"""
+    for entry in aux._s3_cache.values():
+        entry.checked_at = float('-inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--dynamodb-ms', type=float, default=8)
+    parser.add_argument('--s3-ms', type=float, default=25)
+    parser.add_argument('--bedrock-ms', type=float, default=600)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'handlers', 'common'))
+    import generate_ai_response
+    import generate_spam_response
+    logging.getLogger().setLevel(logging.WARNING)
+
+    event = {
+        'lead_id': 'lead-1',
+        'contact_method_id': 'contact-1',
+        'flow_input': {'platform': 'whatsapp', 'From': '+34600000000', 'To': '+34900000000',
+                       'Body': 'Cuánto cuesta el renting?', 'ProfileName': 'María', 'MessageSid': 'SM1'}
+    }
+
+    print(f"DynamoDB {args.dynamodb_ms:g} ms, S3 {args.s3_ms:g} ms, Bedrock {args.bedrock_ms:g} ms per call, "
+          f"median of {args.runs} runs")
+    print(f"{'mode':>20} | {'AI: to Bedrock ms':>17} | {'AI: total ms':>12} | {'spam: total ms':>14}")
+    print('-' * 74)
+    for name, fanout, write_behind in (('serial', False, False), ('fan-out', True, False),
+                                       ('fan-out+write-behind', True, True)):
+        bedrock = install_stubs(args, bench_config(fanout, write_behind))
+        to_bedrock, ai_total, spam_total = [], [], []
+        for _ in range(args.runs):
+            expire_s3_cache()
+            started = time.perf_counter()
+            result = generate_ai_response.lambda_handler(copy.deepcopy(event), None)
+            ai_total.append((time.perf_counter() - started) * 1000)
+            to_bedrock.append((bedrock.called_at - started) * 1000)
+            if result.get('action') == 'error':
+                raise RuntimeError(result['error'])
+
+            expire_s3_cache()
+            started = time.perf_counter()
+            result = generate_spam_response.lambda_handler(copy.deepcopy(event), None)
+            spam_total.append((time.perf_counter() - started) * 1000)
+            if result.get('action') == 'error':
+                raise RuntimeError(result['error'])
+        print(f"{name:>20} | {statistics.median(to_bedrock):>17.0f} | {statistics.median(ai_total):>12.0f} | "
+              f"{statistics.median(spam_total):>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
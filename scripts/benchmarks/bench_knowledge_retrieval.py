@@ -0,0 +1,150 @@
+"""
+Evaluation: knowledge retrieval versus sending the whole system prompt.
+
+Builds the BM25 index from the knowledge folder (optionally padded with
+synthetic sections to simulate a larger knowledge base) and, for lead
+messages phrased the way leads write them (short, generic, informal, often
+without any word of the knowledge text), reports the estimated system
+prompt tokens sent, whether the reply gets the facts it needs, and the
+retrieval time per query. A message matching no section gets the whole
+system prompt, as in retrieve_system_prompt. Also reports the index size
+and load time.
+
+Usage:
+    python scripts/benchmarks/bench_knowledge_retrieval.py [--synthetic-sections 500] [--top-k 3]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from knowledge_index import KnowledgeIndex, render_section, sections_from_folder
+from prompt_budget import estimate_tokens
+
+KNOWLEDGE_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'knowledge')
+FIXED_SECTIONS = ['Overview', 'IMPORTANT INSTRUCTIONS']
+
+# (lead message, substring of the heading holding the answer; None for small talk)
+QUERIES = [
+    ('¿Cuánto cuesta?', 'Modelos de adquisición'),
+    ('precio', 'Modelos de adquisición'),
+    ('info', None),
+    ('hola', None),
+    ('Hola buenas, me pasais info?', None),
+    ('cómo funciona', 'Experiencia de usuario'),
+    ('cuanto vale al mes', 'Modelos de adquisición'),
+    ('hay que pagar algo al principio?', 'Modelos de adquisición'),
+    ('y si se rompe quien la arregla', 'Servicios adicionales'),
+    ('quien la rellena?', 'Servicios adicionales'),
+    ('se puede pagar con el movil?', 'Experiencia de usuario'),
+    ('que productos lleva', 'Experiencia de usuario'),
+    ('tengo un bar, me vale?', 'Aplicaciones por sector'),
+    ('me interesa una máquina para mi oficina', 'Aplicaciones por sector'),
+    ('cuanto dinero puedo sacar', 'Rentabilidad'),
+    ('necesito enchufe?', 'Ventajas operativas'),
+    ('ok gracias', None),
+]
+
+SYNTHETIC_WORDS = ('producto servicio cliente contrato envio garantia factura soporte instalacion mantenimiento '
+                   'tarifa plazo pedido devolucion horario oficina almacen proveedor catalogo descuento').split()
+
+
+def synthetic_sections(count, seed=7):
+    """Filler sections with realistic length, to measure behaviour on a larger knowledge base"""
+    rng = random.Random(seed)
+    sections = []
+    for position in range(count):
+        text = '\n'.join(
+            '- ' + ' '.join(rng.choice(SYNTHETIC_WORDS) for _ in range(rng.randint(8, 16)))
+            for _ in range(rng.randint(3, 8))
+        )
+        sections.append({
+            'source': 'synthetic.md',
+            'heading': f"Anexo {position // 10} > Apartado {position}",
+            'level': 3,
+            'text': text
+        })
+    return sections
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--knowledge-dir', default=KNOWLEDGE_DIR)
+    parser.add_argument('--synthetic-sections', type=int, default=0)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--repetitions', type=int, default=200)
+    args = parser.parse_args()
+
+    sections = sections_from_folder(args.knowledge_dir) + synthetic_sections(args.synthetic_sections)
+    full_prompt = '\n\n'.join(render_section(section) for section in sections)
+    full_tokens = estimate_tokens(full_prompt)
+
+    started = time.perf_counter()
+    data = KnowledgeIndex.build(sections).to_bytes()
+    build_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    index = KnowledgeIndex.from_bytes(data)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    settings = {'fixed_sections': FIXED_SECTIONS, 'top_k': args.top_k, 'min_score': 0.5}
+
+    print(f"Sections: {len(sections)} ({args.synthetic_sections} synthetic), index {len(data) / 1024:.1f} KB, "
+          f"build {build_ms:.1f} ms, load {load_ms:.1f} ms")
+    print(f"Whole system prompt: ~{full_tokens} tokens")
+    print()
+    print(f"{'lead message':<45} | {'prompt':>9} | {'tokens':>6} | {'saved':>6} | {'facts':>5} | {'p50 ms':>6} | {'p99 ms':>6}")
+    print('-' * 100)
+
+    outcomes = {'retrieved': 0, 'whole prompt': 0, 'missing': 0}
+    labelled = 0
+    retrieved_tokens = []
+    timings = []
+    for query, expected in QUERIES:
+        durations = []
+        for _ in range(args.repetitions):
+            started = time.perf_counter()
+            prompt, retrieved = index.build_prompt(query, settings)
+            durations.append((time.perf_counter() - started) * 1000)
+        timings.extend(durations)
+
+        # No section reached min_score: the whole system prompt is sent
+        if not retrieved:
+            prompt = full_prompt
+        headings = [index.sections[position]['heading'] for position in retrieved]
+        if expected is None:
+            facts = '-'
+        else:
+            labelled += 1
+            if not retrieved:
+                outcome = 'whole prompt'
+            else:
+                outcome = 'retrieved' if any(expected in heading for heading in headings) else 'missing'
+            outcomes[outcome] += 1
+            facts = 'NO' if outcome == 'missing' else 'yes'
+
+        tokens = estimate_tokens(prompt)
+        retrieved_tokens.append(tokens)
+        print(f"{query[:45]:<45} | {'sections' if retrieved else 'whole':>9} | {tokens:>6} | "
+              f"{1 - tokens / full_tokens:>6.0%} | {facts:>5} | "
+              f"{percentile(durations, 0.5):>6.3f} | {percentile(durations, 0.99):>6.3f}")
+
+    print('-' * 100)
+    mean_tokens = statistics.mean(retrieved_tokens)
+    print(f"Mean system prompt: ~{mean_tokens:.0f} tokens vs ~{full_tokens} ({1 - mean_tokens / full_tokens:.0%} fewer)")
+    print(f"Questions with their answer in the prompt: {labelled - outcomes['missing']}/{labelled} "
+          f"(section retrieved {outcomes['retrieved']}, whole prompt {outcomes['whole prompt']}, "
+          f"missing {outcomes['missing']})")
+    print(f"Retrieval time: p50 {percentile(timings, 0.5):.3f} ms, p99 {percentile(timings, 0.99):.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Benchmark: get-or-create of a lead by phone, GSI lookup + puts versus guard + transaction.
+
+Runs against an in-memory DynamoDB stub that honours condition expressions
+and applies TransactWriteItems atomically (cancelling it with per-item
+reasons), with a fixed latency per request and a type-value-index that only
+sees items older than --gsi-lag-ms (eventually consistent, as the real GSI).
+Reports the requests and time per new and existing user, then races
+--concurrency invocations for the same new phone and counts the leads created.
+The "before" path is the previous handler logic (GSI query, then three puts);
+"cached" adds the warm-container lead_cache and also replays --messages messages
+from --senders known numbers.
+
+Usage:
+    python scripts/benchmarks/bench_lead_get_or_create.py [--dynamodb-ms 8] [--gsi-lag-ms 50] [--concurrency 8] \
+        [--messages 1000] [--senders 50]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+import aws_clients
+
+TABLES = {
+    'LEADS_TABLE': 'leads',
+    'CONTACT_METHODS_TABLE': 'contact-methods',
+    'CONTACT_METHOD_SETTINGS_TABLE': 'contact-method-settings'
+}
+
+_deserializer = TypeDeserializer()
+
+
+class Store:
+    """All tables' items, the request counter and the lock making writes atomic"""
+
+    def __init__(self, latency, gsi_lag):
+        self.latency = latency
+        self.gsi_lag = gsi_lag
+        self.items = {table_name: {} for table_name in TABLES.values()}
+        self.written_at = {}
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    def request(self, operation):
+        with self.lock:
+            self.requests[operation] += 1
+        time.sleep(self.latency)
+
+    def check(self, table_name, item, condition_expression):
+        if condition_expression == 'attribute_not_exists(id)' and item['id'] in self.items[table_name]:
+            return 'ConditionalCheckFailed'
+        return 'None'
+
+    def write(self, table_name, item):
+        self.items[table_name][item['id']] = item
+        self.written_at[(table_name, item['id'])] = time.perf_counter()
+
+
+class StubTable:
+    def __init__(self, store, table_name):
+        self.store = store
+        self.table_name = table_name
+
+    def get_item(self, Key, **kwargs):
+        self.store.request('GetItem')
+        item = self.store.items[self.table_name].get(Key['id'])
+        return {'Item': dict(item)} if item else {}
+
+    def put_item(self, Item, ConditionExpression=None, **kwargs):
+        self.store.request('PutItem')
+        with self.store.lock:
+            if self.store.check(self.table_name, Item, ConditionExpression) != 'None':
+                raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, 'PutItem')
+            self.store.write(self.table_name, Item)
+        return {}
+
+    def query(self, IndexName, KeyConditionExpression, **kwargs):
+        self.store.request('Query')
+        type_value = KeyConditionExpression.get_expression()['values'][1]
+        visible_before = time.perf_counter() - self.store.gsi_lag
+        with self.store.lock:
+            items = [dict(item) for item in self.store.items[self.table_name].values()
+                     if item.get('type_value') == type_value
+                     and self.store.written_at[(self.table_name, item['id'])] <= visible_before]
+        return {'Items': items}
+
+
+class StubDynamoDBClient:
+    def __init__(self, store):
+        self.store = store
+
+    def transact_write_items(self, TransactItems):
+        self.store.request('TransactWriteItems')
+        puts = [(put['Put']['TableName'], {key: _deserializer.deserialize(value) for key, value in put['Put']['Item'].items()},
+                 put['Put'].get('ConditionExpression')) for put in TransactItems]
+        with self.store.lock:
+            reasons = [{'Code': self.store.check(table_name, item, condition)} for table_name, item, condition in puts]
+            if any(reason['Code'] != 'None' for reason in reasons):
+                error = ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': ''}}, 'TransactWriteItems')
+                error.response['CancellationReasons'] = reasons
+                raise error
+            for table_name, item, _ in puts:
+                self.store.write(table_name, item)
+        return {}
+
+
+def install_stubs(store):
+    aws_clients.reset_clients()
+    for env_name, table_name in TABLES.items():
+        os.environ[env_name] = table_name
+        aws_clients._tables[table_name] = StubTable(store, table_name)
+    aws_clients._clients[('dynamodb', None)] = StubDynamoDBClient(store)
+
+
+def legacy_get_or_create(phone):
+    """The previous handler logic: GSI query, then lead, contact method and settings puts"""
+    from boto3.dynamodb.conditions import Key
+    contact_methods_table = aws_clients.get_table(os.environ['CONTACT_METHODS_TABLE'])
+    response = contact_methods_table.query(IndexName='type-value-index',
+                                           KeyConditionExpression=Key('type_value').eq(f"phone#{phone}"))
+    if response['Items']:
+        return {'lead_id': response['Items'][0]['lead_id'], 'created': False}
+    lead_id, contact_method_id = str(uuid.uuid4()), str(uuid.uuid4())
+    timestamp = datetime.now().isoformat()
+    aws_clients.get_table(os.environ['LEADS_TABLE']).put_item(Item={'id': lead_id, 'created_at': timestamp})
+    contact_methods_table.put_item(Item={'id': contact_method_id, 'lead_id': lead_id, 'type': 'phone', 'value': phone,
+                                         'type_value': f"phone#{phone}", 'created_at': timestamp})
+    aws_clients.get_table(os.environ['CONTACT_METHOD_SETTINGS_TABLE']).put_item(
+        Item={'id': str(uuid.uuid4()), 'contact_method_id': contact_method_id, 'is_primary': True})
+    return {'lead_id': lead_id, 'created': True}
+
+
+def transactional_get_or_create(phone):
+    from lead_store import get_or_create_lead
+    return get_or_create_lead('phone', phone, {'name': 'María', 'metadata': {'source': 'whatsapp'}})
+
+
+def cached_get_or_create(phone):
+    from lead_store import get_or_create_lead
+    return get_or_create_lead('phone', phone, {'name': 'María', 'metadata': {'source': 'whatsapp'}},
+                              cache_settings={'enabled': True, 'max_entries': 10000, 'ttl_seconds': 86400})
+
+
+def reset_cache():
+    import lead_store
+    lead_store.owner_cache.clear()
+    for name in lead_store.cache_stats:
+        lead_store.cache_stats[name] = 0
+
+
+def measure(store, function, phone):
+    store.requests.clear()
+    started = time.perf_counter()
+    function(phone)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return sum(store.requests.values()), elapsed_ms, ', '.join(f"{op} {n}" for op, n in sorted(store.requests.items()))
+
+
+def race(store, function, phone, concurrency):
+    barrier = threading.Barrier(concurrency)
+
+    def invocation():
+        barrier.wait()
+        return function(phone)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: invocation(), range(concurrency)))
+    leads = len(store.items['leads'])
+    contact_methods = sum(1 for item in store.items['contact-methods'].values() if item.get('type_value'))
+    return leads, contact_methods, len({result['lead_id'] for result in results})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dynamodb-ms', type=float, default=8)
+    parser.add_argument('--gsi-lag-ms', type=float, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--senders', type=int, default=50)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    os.environ['LEGACY_CONTACT_LOOKUP'] = 'false'
+
+    print(f"DynamoDB {args.dynamodb_ms:g} ms per request, GSI lag {args.gsi_lag_ms:g} ms")
+    print(f"{'path':>14} | {'user':>8} | {'requests':>8} | {'ms':>4} | detail")
+    print('-' * 80)
+    for name, function in (('GSI + puts', legacy_get_or_create), ('transactional', transactional_get_or_create),
+                           ('cached', cached_get_or_create)):
+        store = Store(args.dynamodb_ms / 1000, args.gsi_lag_ms / 1000)
+        install_stubs(store)
+        reset_cache()
+        requests, elapsed_ms, detail = measure(store, function, '+34600000001')
+        print(f"{name:>14} | {'new':>8} | {requests:>8} | {elapsed_ms:>4.0f} | {detail}")
+        time.sleep(args.gsi_lag_ms / 1000)
+        requests, elapsed_ms, detail = measure(store, function, '+34600000001')
+        print(f"{name:>14} | {'existing':>8} | {requests:>8} | {elapsed_ms:>4.0f} | {detail}")
+
+    print(f"\n{args.messages} messages from {args.senders} numbers (first message of each creates the lead)")
+    print(f"{'path':>14} | {'requests':>8} | {'per message':>11}")
+    print('-' * 40)
+    senders = [f"+3470000{index:04d}" for index in range(args.senders)]
+    messages = random.Random(7).choices(senders, k=args.messages)
+    for name, function in (('transactional', transactional_get_or_create), ('cached', cached_get_or_create)):
+        store = Store(0, 0)
+        install_stubs(store)
+        reset_cache()
+        for phone in messages:
+            function(phone)
+        requests = sum(store.requests.values())
+        print(f"{name:>14} | {requests:>8} | {requests / args.messages:>11.2f}")
+
+    print(f"\n{args.concurrency} concurrent first messages from one new phone")
+    print(f"{'path':>14} | {'leads':>5} | {'contact methods':>15} | {'distinct lead_ids returned':>26}")
+    print('-' * 70)
+    for name, function in (('GSI + puts', legacy_get_or_create), ('transactional', transactional_get_or_create)):
+        store = Store(args.dynamodb_ms / 1000, args.gsi_lag_ms / 1000)
+        install_stubs(store)
+        leads, contact_methods, lead_ids = race(store, function, '+34600000002', args.concurrency)
+        print(f"{name:>14} | {leads:>5} | {contact_methods:>15} | {lead_ids:>26}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Benchmark: bulk lead import throughput and correctness against a DynamoDB stand-in.
+
+Generates a file of leads (some with two contact methods, some repeating a
+contact method of an earlier row, some already in the table, some invalid),
+writes it as NDJSON and CSV and imports each through scripts/import_leads.py
+into an in-memory DynamoDB stub: fixed latency per request, condition
+expressions honoured, and a share of every BatchWriteItem returned as
+unprocessed so the retries run. Some phones are claimed by another lead
+while the import runs (after its owner check), as a live message would.
+Checks that every contact method has exactly one guard and one item, that
+every guard's lead exists, that no items of discarded rows are left, and
+that a second run of the same file creates nothing. For comparison, a sample of the
+rows goes through the single-lead path (guard read + transaction per lead).
+
+Usage:
+    python scripts/benchmarks/bench_lead_import.py [--rows 20000] [--dynamodb-ms 2] [--workers 16] [--unprocessed-share 0.02]
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import aws_clients
+import import_leads
+from lead_store import ContactMethodExistsError, create_contact_methods, guard_item, read_guard
+
+TABLES = {
+    'LEADS_TABLE': 'leads',
+    'CONTACT_METHODS_TABLE': 'contact-methods',
+    'CONTACT_METHOD_SETTINGS_TABLE': 'contact-method-settings'
+}
+
+_deserializer = TypeDeserializer()
+
+
+class Store:
+    def __init__(self, latency, unprocessed_share=0.0, late=()):
+        self.latency = latency
+        self.unprocessed_share = unprocessed_share
+        # Contact methods another lead claims as soon as the import writes them
+        self.late = set(late)
+        self.items = {table_name: {} for table_name in TABLES.values()}
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self.random = random.Random(3)
+
+    def request(self, operation):
+        with self.lock:
+            self.requests[operation] += 1
+        time.sleep(self.latency)
+
+
+def conditional_check_failed(operation):
+    return ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, operation)
+
+
+class StubTable:
+    def __init__(self, store, table_name):
+        self.store = store
+        self.table_name = table_name
+
+    def get_item(self, Key, **kwargs):
+        self.store.request('GetItem')
+        item = self.store.items[self.table_name].get(Key['id'])
+        return {'Item': dict(item)} if item else {}
+
+    def put_item(self, Item, ConditionExpression=None, **kwargs):
+        self.store.request('PutItem')
+        with self.store.lock:
+            if ConditionExpression and Item['id'] in self.store.items[self.table_name]:
+                raise conditional_check_failed('PutItem')
+            self.store.items[self.table_name][Item['id']] = Item
+        return {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeValues=None, **kwargs):
+        self.store.request('DeleteItem')
+        with self.store.lock:
+            item = self.store.items[self.table_name].get(Key['id'])
+            if ConditionExpression and (item is None or item.get('owner_lead_id') != ExpressionAttributeValues[':lead_id']):
+                raise conditional_check_failed('DeleteItem')
+            self.store.items[self.table_name].pop(Key['id'], None)
+        return {}
+
+    def query(self, **kwargs):
+        self.store.request('Query')
+        return {'Items': []}
+
+
+class StubResource:
+    def __init__(self, store):
+        self.store = store
+
+    def batch_get_item(self, RequestItems):
+        self.store.request('BatchGetItem')
+        responses = {}
+        for table_name, request in RequestItems.items():
+            found = [self.store.items[table_name].get(key['id']) for key in request['Keys']]
+            responses[table_name] = [dict(item) for item in found if item]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+
+class StubDynamoDBClient:
+    def __init__(self, store):
+        self.store = store
+
+    def batch_write_item(self, RequestItems):
+        self.store.request('BatchWriteItem')
+        unprocessed = {}
+        with self.store.lock:
+            for table_name, requests in RequestItems.items():
+                for request in requests:
+                    if self.store.random.random() < self.store.unprocessed_share:
+                        unprocessed.setdefault(table_name, []).append(request)
+                        continue
+                    item = {key: _deserializer.deserialize(value) for key, value in request['PutRequest']['Item'].items()}
+                    self.store.items[table_name][item['id']] = item
+                    if item.get('type_value') in self.store.late:
+                        guard = guard_item(item['type_value'], f"late-lead-{item['id']}", f"late-contact-{item['id']}", item['created_at'])
+                        self.store.items['contact-methods'].setdefault(guard['id'], guard)
+        return {'UnprocessedItems': unprocessed}
+
+    def transact_write_items(self, TransactItems):
+        self.store.request('TransactWriteItems')
+        puts = [(put['Put']['TableName'], {key: _deserializer.deserialize(value) for key, value in put['Put']['Item'].items()},
+                 put['Put'].get('ConditionExpression')) for put in TransactItems]
+        with self.store.lock:
+            reasons = [{'Code': 'ConditionalCheckFailed' if condition and item['id'] in self.store.items[table_name] else 'None'}
+                       for table_name, item, condition in puts]
+            if any(reason['Code'] != 'None' for reason in reasons):
+                error = ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': ''}}, 'TransactWriteItems')
+                error.response['CancellationReasons'] = reasons
+                raise error
+            for table_name, item, _ in puts:
+                self.store.items[table_name][item['id']] = item
+        return {}
+
+
+def install_stubs(store):
+    aws_clients.reset_clients()
+    for env_name, table_name in TABLES.items():
+        os.environ[env_name] = table_name
+        aws_clients._tables[table_name] = StubTable(store, table_name)
+    aws_clients._resources[('dynamodb', None)] = StubResource(store)
+    aws_clients._clients[('dynamodb', None)] = StubDynamoDBClient(store)
+
+
+def generate_leads(count, seed=11):
+    """
+    Lead rows, the contact methods that should already exist in the table and
+    those another lead claims during the import
+    """
+    generator = random.Random(seed)
+    leads, existing, late = [], [], []
+    for index in range(count):
+        phone = f"+3461{index:07d}"
+        draw = generator.random()
+        if draw < 0.03 and index:
+            phone = f"+3461{generator.randrange(index):07d}"
+        elif draw < 0.05:
+            existing.append(f"phone#{phone}")
+        elif draw < 0.06:
+            late.append(f"phone#{phone}")
+        contact_methods = [{'type': 'phone', 'value': phone}]
+        if generator.random() < 0.3:
+            contact_methods.append({'type': 'email', 'value': f"lead{index}@example.com"})
+        if generator.random() < 0.01:
+            contact_methods = [{'type': 'fax', 'value': phone}]
+        leads.append({'name': f"Lead {index}", 'metadata': {'source': 'old_crm', 'segment': str(index % 7)},
+                      'contact_methods': contact_methods})
+    return leads, existing, late
+
+
+def write_files(leads, directory):
+    ndjson_path = os.path.join(directory, 'leads.ndjson')
+    with open(ndjson_path, 'w', encoding='utf-8') as ndjson_file:
+        for lead in leads:
+            ndjson_file.write(json.dumps(lead) + '\n')
+
+    csv_path = os.path.join(directory, 'leads.csv')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=['name', 'phone', 'email', 'other', 'source', 'segment', 'fax'])
+        writer.writeheader()
+        for lead in leads:
+            row = {'name': lead['name'], **lead['metadata']}
+            for contact_method in lead['contact_methods']:
+                row[contact_method['type']] = contact_method['value']
+            writer.writerow(row)
+    return ndjson_path, csv_path
+
+
+def seed_existing(store, existing):
+    for index, type_value in enumerate(existing):
+        guard = guard_item(type_value, f"existing-lead-{index}", f"existing-contact-{index}", '2024-01-01T00:00:00')
+        store.items['contact-methods'][guard['id']] = guard
+
+
+def check_store(store, existing):
+    """Problems found in the tables after an import (an empty list when consistent)"""
+    contact_methods = [item for item in store.items['contact-methods'].values() if item.get('type_value')]
+    guards = {item['id'][len('type_value#'):]: item for item in store.items['contact-methods'].values()
+              if item.get('item_type') == 'type_value_guard'}
+    problems = []
+    per_type_value = Counter(item['type_value'] for item in contact_methods)
+    problems += [f"{type_value} stored {count} times" for type_value, count in per_type_value.items() if count > 1]
+    problems += [f"{item['type_value']} belongs to missing lead {item['lead_id']}" for item in contact_methods
+                 if item['lead_id'] not in store.items['leads']]
+    leads_with_contacts = {item['lead_id'] for item in contact_methods}
+    problems += [f"lead {lead_id} has no contact method" for lead_id in store.items['leads'] if lead_id not in leads_with_contacts]
+    for type_value, guard in guards.items():
+        if type_value in existing or guard['owner_lead_id'].startswith('late-lead-'):
+            continue
+        if per_type_value.get(type_value) != 1:
+            problems.append(f"guard {type_value} without its contact method")
+        elif guard['owner_lead_id'] not in store.items['leads']:
+            problems.append(f"guard {type_value} owned by a missing lead")
+    problems += [f"{item['type_value']} has no guard" for item in contact_methods if item['type_value'] not in guards]
+    problems += [f"{item['type_value']} is guarded for another lead" for item in contact_methods
+                 if item['type_value'] in guards and guards[item['type_value']]['owner_lead_id'] != item['lead_id']]
+    if len(store.items['contact-method-settings']) != len(contact_methods):
+        problems.append(f"{len(store.items['contact-method-settings'])} settings for {len(contact_methods)} contact methods")
+    return problems
+
+
+def single_lead_rate(args, leads):
+    """Rows per second through the single-lead API path (guard read + one transaction per lead)"""
+    store = Store(args.dynamodb_ms / 1000)
+    install_stubs(store)
+    sample = [lead for lead in leads[:500] if all(cm['type'] != 'fax' for cm in lead['contact_methods'])]
+    started = time.perf_counter()
+    for index, lead in enumerate(sample):
+        if any(read_guard(f"{cm['type']}#{cm['value']}") for cm in lead['contact_methods']):
+            continue
+        try:
+            create_contact_methods(f"lead-{index}", [{**cm, 'is_primary': i == 0} for i, cm in enumerate(lead['contact_methods'])],
+                                   lead_item={'id': f"lead-{index}"})
+        except ContactMethodExistsError:
+            pass
+    return len(sample) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--dynamodb-ms', type=float, default=2)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--unprocessed-share', type=float, default=0.02,
+                        help='Share of BatchWriteItem items returned unprocessed per attempt')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    os.environ['LEGACY_CONTACT_LOOKUP'] = 'false'
+
+    leads, existing, late = generate_leads(args.rows)
+    print(f"{args.rows} leads, DynamoDB {args.dynamodb_ms:g} ms per request, {args.unprocessed_share:.0%} of batch items "
+          f"unprocessed per attempt, {args.workers} workers")
+    print(f"single-lead path: {single_lead_rate(args, leads):.0f} leads/s")
+    print(f"{'file':>7} | {'run':>6} | {'rows/s':>7} | {'requests':>8} | {'check':>5} | results")
+    print('-' * 100)
+    with tempfile.TemporaryDirectory() as directory:
+        for file_format, path in zip(('ndjson', 'csv'), write_files(leads, directory)):
+            store = Store(args.dynamodb_ms / 1000, args.unprocessed_share, late)
+            install_stubs(store)
+            seed_existing(store, existing)
+            for run in ('first', 'rerun'):
+                store.requests.clear()
+                summary, elapsed = import_leads.run_import(path, file_format, args.chunk_size, args.workers, progress=False)
+                problems = check_store(store, set(existing))
+                results = ', '.join(f"{status} {count}" for status, count in sorted(summary.items()))
+                print(f"{file_format:>7} | {run:>6} | {args.rows / elapsed:>7.0f} | {sum(store.requests.values()):>8} | "
+                      f"{'ok' if not problems else 'FAIL':>5} | {results}")
+                for problem in problems[:10]:
+                    print(f"    {problem}")
+
+
+if __name__ == '__main__':
+    main()
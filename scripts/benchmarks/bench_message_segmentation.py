@@ -0,0 +1,119 @@
+"""
+Benchmark: reply segmentation.
+
+Compares the previous split_message_by_stops (repeated string
+concatenation) against src/message_segmentation.py on 100 KB inputs,
+with the number of messages each produces above the limit. The property
+checks live in tests/test_message_segmentation.py.
+
+Usage:
+    python scripts/benchmarks/bench_message_segmentation.py [--seed 1]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from message_segmentation import segment_message, text_length
+
+WORDS = ('hola maquina expendedora renting precio instalacion seguro reposicion tarjeta oficina hospital '
+         'rentabilidad inteligencia artificial sensores camara estantes').split()
+EMOJIS = ['😀', '👍🏽', '👨‍👩‍👧', '🇪🇸', '❤️', '1️⃣', 'é', 'ñ']
+STOPS = ['. ', '! ', '? ', '.\n', '\n\n', ', ', ' ']
+
+
+def legacy_split_message_by_stops(message, max_length):
+    """Previous implementation from generate_ai_response, kept for comparison"""
+    if len(message) <= max_length:
+        return [message]
+    messages = []
+    current_message = ""
+    sentences = re.split(r'([.!?])', message)
+    i = 0
+    while i < len(sentences):
+        part = sentences[i]
+        if i + 1 < len(sentences) and sentences[i + 1] in ['.', '!', '?']:
+            part += sentences[i + 1]
+            i += 2
+        else:
+            i += 1
+        if len(current_message + part) > max_length:
+            if current_message:
+                messages.append(current_message.strip())
+                current_message = part
+            else:
+                messages.append(part[:max_length])
+                current_message = part[max_length:]
+        else:
+            current_message += part
+    if current_message.strip():
+        messages.append(current_message.strip())
+    return [msg for msg in messages if msg.strip()]
+
+
+def random_text(rng, size):
+    parts = []
+    length = 0
+    while length < size:
+        roll = rng.random()
+        if roll < 0.75:
+            token = rng.choice(WORDS)
+        elif roll < 0.9:
+            token = rng.choice(EMOJIS)
+        elif roll < 0.97:
+            token = ''.join(rng.choice(WORDS) for _ in range(rng.randint(3, 30)))  # long word
+        else:
+            token = 'https://example.com/' + 'x' * rng.randint(10, 400)
+        parts.append(token)
+        parts.append(rng.choice(STOPS) if rng.random() < 0.3 else ' ')
+        length += len(token) + 1
+    return ''.join(parts)
+
+
+def timed(function, repetitions=3):
+    best = float('inf')
+    result = None
+    for _ in range(repetitions):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    inputs = {
+        'prose': random_text(rng, 100_000),
+        'no stops': ' '.join(rng.choice(WORDS) for _ in range(12_000))[:100_000],
+        'one word': 'x' * 100_000,
+        'emoji': ''.join(rng.choice(EMOJIS) + ' ' for _ in range(30_000))[:100_000],
+    }
+    print(f"{'100 KB input':>12} | {'legacy ms':>9} | {'new ms':>7} | {'utf16 ms':>8} | "
+          f"{'legacy msgs (over)':>18} | {'new msgs (over)':>15}")
+    print('-' * 86)
+    for name, text in inputs.items():
+        legacy_ms, legacy = timed(lambda: legacy_split_message_by_stops(text, 280))
+        new_ms, new = timed(lambda: segment_message(text, 280))
+        utf16_ms, new_utf16 = timed(lambda: segment_message(text, 280, 'utf16'))
+        legacy_over = sum(1 for message in legacy if text_length(message, 'utf16') > 280)
+        new_over = sum(1 for message in new_utf16 if text_length(message, 'utf16') > 280)
+        print(f"{name:>12} | {legacy_ms:>9.1f} | {new_ms:>7.1f} | {utf16_ms:>8.1f} | "
+              f"{f'{len(legacy)} ({legacy_over})':>18} | {f'{len(new_utf16)} ({new_over})':>15}")
+
+    print()
+    text = inputs['prose']
+    for size in (100_000, 200_000, 400_000):
+        elapsed_ms, _ = timed(lambda: segment_message((text * 4)[:size], 280))
+        print(f"{size // 1000:>4} KB: {elapsed_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: time to first reply, blocking versus streamed generation.
+
+Replays a local fake Bedrock stream (invoke_model_with_response_stream
+event format) that emits text deltas with a first-token latency and a
+fixed generation rate, and a fake platform send with a fixed latency:
+
+- blocking: wait for the whole reply, segment_message, send in order
+- streaming: src/reply_stream.py segments the stream as it arrives and an
+  OrderedDispatcher sends each message as soon as it is complete
+
+Reports when the lead receives the first and the last message, and checks
+that both modes produce the same messages.
+
+Usage:
+    python scripts/benchmarks/bench_reply_streaming.py [--first-token-ms 400] [--chars-per-second 300]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from message_segmentation import segment_message
+from reply_stream import OrderedDispatcher, stream_reply
+
+SENTENCES = [
+    "Claro, te cuento como funciona nuestro renting.",
+    "Por 240€ al mes mas IVA tienes la maquina con software, instalacion y formacion incluidos.",
+    "Si prefieres comprarla, son 4.900€ mas IVA y 27€ al mes por el software.",
+    "Ademas puedes contratar el seguro multirriesgo por 30€ al mes, que cubre danos, robos y averias.",
+    "La reposicion profesional empieza en 19€ a la semana.",
+    "Con unas 10 ventas al dia ya es rentable!",
+    "Te parece si agendamos una llamada esta semana para verlo con calma?",
+]
+
+
+def make_reply(length):
+    """A reply of about `length` characters built from realistic sentences"""
+    sentences = []
+    while sum(len(sentence) + 1 for sentence in sentences) < length:
+        sentences.append(SENTENCES[len(sentences) % len(SENTENCES)])
+    return ' '.join(sentences)
+
+
+class FakeStream:
+    """Iterates like the EventStream body of invoke_model_with_response_stream"""
+
+    def __init__(self, text, first_token_ms, chars_per_second, delta_chars=12):
+        self.text = text
+        self.first_token = first_token_ms / 1000
+        self.delta_chars = delta_chars
+        self.delta_seconds = delta_chars / chars_per_second
+
+    def __iter__(self):
+        yield {'chunk': {'bytes': json.dumps({'type': 'message_start'}).encode('utf-8')}}
+        time.sleep(self.first_token)
+        for start in range(0, len(self.text), self.delta_chars):
+            payload = {'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': self.text[start:start + self.delta_chars]}}
+            yield {'chunk': {'bytes': json.dumps(payload).encode('utf-8')}}
+            time.sleep(self.delta_seconds)
+        yield {'chunk': {'bytes': json.dumps({'type': 'message_stop'}).encode('utf-8')}}
+
+
+def fake_send(send_ms, received):
+    def send(message):
+        time.sleep(send_ms / 1000)
+        received.append((time.perf_counter(), message))
+        return {'success': True}
+    return send
+
+
+def run_blocking(text, args):
+    received = []
+    send = fake_send(args.send_ms, received)
+    started = time.perf_counter()
+    generated = ''.join(
+        json.loads(event['chunk']['bytes']).get('delta', {}).get('text', '')
+        for event in FakeStream(text, args.first_token_ms, args.chars_per_second)
+    )
+    for message in segment_message(generated, args.max_length):
+        send(message)
+    return started, received
+
+
+def run_streaming(text, args, executor):
+    received = []
+    started = time.perf_counter()
+    dispatcher = OrderedDispatcher(fake_send(args.send_ms, received), executor)
+    stream_reply({'body': FakeStream(text, args.first_token_ms, args.chars_per_second)},
+                 {'max_length': args.max_length, 'unit': 'code_points'}, dispatcher.submit)
+    dispatcher.results()
+    return started, received
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--first-token-ms', type=float, default=400)
+    parser.add_argument('--chars-per-second', type=float, default=300)
+    parser.add_argument('--send-ms', type=float, default=150)
+    parser.add_argument('--max-length', type=int, default=280, help='character_limit_fallback')
+    args = parser.parse_args()
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    print(f"First token {args.first_token_ms:.0f} ms, {args.chars_per_second:.0f} chars/s, send {args.send_ms:.0f} ms, "
+          f"messages up to {args.max_length} chars")
+    print(f"{'reply':>6} | {'msgs':>4} | {'mode':>9} | {'first ms':>8} | {'last ms':>8} | same")
+    print('-' * 56)
+    for length in (150, 400, 800, 1500):
+        text = make_reply(length)
+        outputs = {}
+        for mode in ('blocking', 'streaming'):
+            if mode == 'blocking':
+                started, received = run_blocking(text, args)
+            else:
+                started, received = run_streaming(text, args, executor)
+            outputs[mode] = [message for _, message in received]
+            first_ms = (received[0][0] - started) * 1000
+            last_ms = (received[-1][0] - started) * 1000
+            same = 'yes' if mode == 'blocking' or outputs['streaming'] == outputs['blocking'] else 'NO'
+            print(f"{len(text):>6} | {len(received):>4} | {mode:>9} | {first_ms:>8.0f} | {last_ms:>8.0f} | {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Benchmark: spam campaign index lookups at 1M signatures, and which matching
+settings are safe.
+
+Builds an index with a few real campaign clusters plus random members
+standing in for the rest of 1M signatures (computing 1M MinHash signatures
+in pure Python would take minutes and does not change lookup cost), then
+times lookups of lightly varied campaign messages and legitimate messages.
+Also reports the serialized size and load time of the index.
+
+Then indexes a set of messages and looks up word-substituted variants of
+them, bucketed by their exact shingle Jaccard similarity, reporting the
+share matched for several min_matching_bands / min_similarity settings.
+Pairs below about 0.6 are different messages that happen to share wording
+and must not match; lightly varied campaign messages sit above 0.8.
+
+Usage:
+    python scripts/benchmarks/bench_spam_campaign_index.py [--signatures 1000000] [--variants 150]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from spam_campaign_index import (
+    DEFAULT_MIN_MATCHING_BANDS, DEFAULT_MIN_SIMILARITY, DEFAULT_NUM_PERM, DEFAULT_ROWS_PER_BAND, DEFAULT_SEED,
+    SpamCampaignIndex, band_keys, minhash_signature, shingles, verification_values
+)
+
+CAMPAIGNS = [
+    "Gana dinero desde casa con nuestro sistema automatico, hasta 500 euros al dia. Escribe YA a este numero",
+    "Felicidades! Has sido seleccionado para recibir un iPhone 15 gratis, reclama tu premio en el enlace",
+    "Inversion en criptomonedas garantizada, duplica tu capital en 7 dias, plazas limitadas, contacta conmigo",
+    "Hola querido, soy agente de recursos humanos, te ofrecemos trabajo a tiempo parcial 200 euros diarios",
+]
+
+LEGITIMATE = [
+    "Hola, queria informacion sobre los precios del servicio para mi empresa",
+    "Buenas tardes, tengo una reunion el jueves, podemos hablar despues de las cinco?",
+    "Me interesa el plan anual, cuantos usuarios incluye y si hay descuento para ONG",
+    "Gracias por la respuesta, lo comento con mi socio y os digo algo la semana que viene",
+]
+
+SUBSTITUTE_WORDS = [
+    "pedido", "factura", "cliente", "manana", "oficina", "precio", "semana", "correo", "telefono", "cita",
+    "empresa", "proyecto", "equipo", "viernes", "lunes", "gracias", "cuenta", "tarifa", "reunion", "envio"
+]
+
+JACCARD_BUCKETS = [(0.3, 0.5), (0.5, 0.6), (0.6, 0.7), (0.7, 0.75), (0.75, 0.8), (0.8, 0.9), (0.9, 1.01)]
+
+SETTINGS = [(1, 0.0), (2, 0.0), (3, 0.0), (1, 0.8), (2, 0.7), (2, 0.8), (3, 0.8)]
+
+
+def vary(message, generator):
+    """Lightly vary a campaign message the way spammers do (names, numbers, punctuation)"""
+    words = message.split()
+    position = generator.randrange(len(words))
+    words[position] = generator.choice([words[position].upper(), words[position] + '!!', str(generator.randint(10, 999))])
+    return ' '.join(words) + generator.choice(['', ' 🔥', ' ...', ' https://bit.ly/x'])
+
+
+def build_index(signature_count, generator):
+    """Campaign signatures (8 variants each) plus random members up to signature_count"""
+    bands = DEFAULT_NUM_PERM // DEFAULT_ROWS_PER_BAND
+    clusters = [{'size': 8, 'leads': 8, 'example': campaign[:60]} for campaign in CAMPAIGNS]
+    clusters.append({'size': 0, 'leads': 0, 'example': 'synthetic'})
+    synthetic_cluster = len(clusters) - 1
+
+    band_entries = [[] for _ in range(bands)]
+    member_clusters = array('I')
+    member_signatures = array('H')
+    for cluster_id, campaign in enumerate(CAMPAIGNS):
+        for _ in range(8):
+            signature = minhash_signature(vary(campaign, generator))
+            for band, key in enumerate(band_keys(signature, DEFAULT_ROWS_PER_BAND)):
+                band_entries[band].append((key, len(member_clusters)))
+            member_clusters.append(cluster_id)
+            member_signatures.extend(verification_values(signature))
+
+    campaign_members = len(member_clusters)
+    synthetic_members = signature_count - campaign_members
+    member_clusters.extend([synthetic_cluster] * synthetic_members)
+    member_signatures.frombytes(generator.randbytes(member_signatures.itemsize * DEFAULT_NUM_PERM * synthetic_members))
+    for band in range(bands):
+        band_entries[band].extend(
+            (generator.getrandbits(64), member) for member in range(campaign_members, signature_count)
+        )
+        band_entries[band].sort()
+
+    return SpamCampaignIndex(
+        DEFAULT_NUM_PERM, DEFAULT_ROWS_PER_BAND, DEFAULT_SEED,
+        [array('Q', (key for key, _ in entries)) for entries in band_entries],
+        [array('I', (member for _, member in entries)) for entries in band_entries],
+        member_clusters, member_signatures, clusters
+    )
+
+
+def time_lookups(index, messages, repetitions=200):
+    """Per-lookup timings (ms) of the signature and of the band search plus verification"""
+    signature_ms, search_ms, results = [], [], []
+    for _ in range(repetitions):
+        for message in messages:
+            started = time.perf_counter()
+            signature = minhash_signature(message, index.num_perm, index.seed)
+            signed = time.perf_counter()
+            match = index.lookup_signature(signature)
+            searched = time.perf_counter()
+            signature_ms.append((signed - started) * 1000)
+            search_ms.append((searched - signed) * 1000)
+            results.append(match is not None)
+    return signature_ms, search_ms, sum(results) / len(results)
+
+
+def jaccard(text, other):
+    text_shingles, other_shingles = shingles(text), shingles(other)
+    return len(text_shingles & other_shingles) / len(text_shingles | other_shingles)
+
+
+def substitute_words(message, count, generator):
+    """The message with `count` of its words replaced by other common words"""
+    words = message.split()
+    for position in generator.sample(range(len(words)), min(count, len(words))):
+        words[position] = generator.choice(SUBSTITUTE_WORDS)
+    return ' '.join(words)
+
+
+def match_rates(variants_per_message, generator):
+    """Share of variants matched to their original, per Jaccard bucket and setting"""
+    originals = CAMPAIGNS + LEGITIMATE
+    index = SpamCampaignIndex.build(
+        [(minhash_signature(message), cluster_id) for cluster_id, message in enumerate(originals)],
+        [{'example': message[:60]} for message in originals]
+    )
+    counts = {(bucket, setting): [0, 0] for bucket in JACCARD_BUCKETS for setting in SETTINGS}
+    for cluster_id, message in enumerate(originals):
+        for _ in range(variants_per_message):
+            variant = substitute_words(message, generator.randint(1, 10), generator)
+            similarity = jaccard(message, variant)
+            bucket = next((bucket for bucket in JACCARD_BUCKETS if bucket[0] <= similarity < bucket[1]), None)
+            if bucket is None:
+                continue
+            for min_matching_bands, min_similarity in SETTINGS:
+                match = index.lookup(variant, min_matching_bands, min_similarity)
+                count = counts[(bucket, (min_matching_bands, min_similarity))]
+                count[0] += bool(match and match['cluster_id'] == cluster_id)
+                count[1] += 1
+    return counts
+
+
+def percentile(values, fraction):
+    return sorted(values)[int(len(values) * fraction) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--signatures', type=int, default=1000000)
+    parser.add_argument('--variants', type=int, default=150, help='Variants per indexed message for the match rates')
+    args = parser.parse_args()
+    generator = random.Random(7)
+
+    started = time.perf_counter()
+    index = build_index(args.signatures, generator)
+    print(f"Built index with {index.entries} signatures x {index.bands} bands in {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    data = index.to_bytes()
+    serialized_s = time.perf_counter() - started
+    started = time.perf_counter()
+    index = SpamCampaignIndex.from_bytes(data)
+    print(f"Serialized size {len(data) / 1024 / 1024:.1f} MB, to_bytes {serialized_s * 1000:.0f} ms, "
+          f"from_bytes {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    variants = [vary(campaign, generator) for campaign in CAMPAIGNS for _ in range(5)]
+    print(f"\n{'messages':>12} | {'signature p50':>13} | {'search p50':>10} | {'search p99':>10} | {'total p99':>9} | matched")
+    print('-' * 80)
+    for name, messages in (('campaign', variants), ('legitimate', LEGITIMATE)):
+        signature_ms, search_ms, match_rate = time_lookups(index, messages)
+        total_ms = [signature + search for signature, search in zip(signature_ms, search_ms)]
+        print(f"{name:>12} | {statistics.median(signature_ms):>10.3f} ms | {statistics.median(search_ms):>7.3f} ms | "
+              f"{percentile(search_ms, 0.99):>7.3f} ms | {percentile(total_ms, 0.99):>6.3f} ms | {match_rate:.0%}")
+
+    counts = match_rates(args.variants, generator)
+    print(f"\nShare of variants matched by exact Jaccard similarity "
+          f"(default: {DEFAULT_MIN_MATCHING_BANDS} bands, similarity {DEFAULT_MIN_SIMILARITY:g})")
+    print(f"{'bands, similarity':>17} | " + ' | '.join(f"{low:.2f}-{min(high, 1):.2f}" for low, high in JACCARD_BUCKETS))
+    print('-' * 100)
+    for setting in SETTINGS:
+        rates = []
+        for bucket in JACCARD_BUCKETS:
+            matched, total = counts[(bucket, setting)]
+            rates.append(f"{matched / total:>9.0%}" if total else f"{'-':>9}")
+        print(f"{f'{setting[0]}, {setting[1]:g}':>17} | " + ' | '.join(rates))
+    print(f"{'variants':>17} | " + ' | '.join(f"{counts[(bucket, SETTINGS[0])][1]:>9}" for bucket in JACCARD_BUCKETS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: message limit evaluation in check_lead_spammer.
+
+Compares the previous evaluation (one full-item, unpaginated Query per
+message_limits window) with the single-query window evaluator in
+src/spam_windows.py, against a stubbed activities index that pages results
+at 1MB like DynamoDB does. Leads hold 10 to 10,000 activities.
+
+Usage:
+    python scripts/benchmarks/bench_spam_windows.py
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from spam_windows import day_window_start, evaluate_message_windows
+
+MESSAGE_LIMITS = [[1, 50], [7, 200], [30, 600]]
+PAGE_LIMIT_BYTES = 1024 * 1024
+FULL_ITEM_BYTES = 420       # typical activity item (ids, metadata, timestamps)
+PROJECTED_ITEM_BYTES = 40   # created_at only
+
+
+class StubActivitiesIndex:
+    """In-memory lead-id-created-at-index with 1MB pagination and call accounting"""
+
+    def __init__(self, activities):
+        self.activities = sorted(activities, key=lambda activity: activity['created_at'])
+        self.calls = 0
+        self.bytes_returned = 0
+
+    def query(self, **kwargs):
+        self.calls += 1
+        values = kwargs['ExpressionAttributeValues']
+        since = values.get(':since', values.get(':start_date'))
+        projected = 'ProjectionExpression' in kwargs
+
+        start = kwargs.get('ExclusiveStartKey', {}).get('position', 0)
+        items = []
+        read_bytes = 0
+        position = start
+        while position < len(self.activities) and read_bytes < PAGE_LIMIT_BYTES:
+            activity = self.activities[position]
+            position += 1
+            if activity['created_at'] < since:
+                continue
+            # The 1MB page limit applies to data read, before projection and filters
+            read_bytes += FULL_ITEM_BYTES
+            if values.get(':inbound') and activity['direction'] != values[':inbound']:
+                continue
+            items.append({'created_at': activity['created_at']} if projected else activity)
+
+        self.bytes_returned += len(items) * (PROJECTED_ITEM_BYTES if projected else FULL_ITEM_BYTES)
+        response = {'Items': items}
+        if position < len(self.activities):
+            response['LastEvaluatedKey'] = {'position': position}
+        return response
+
+
+def legacy_message_counts(activities_table, lead_id, now):
+    """Previous behaviour: one unpaginated query per window"""
+    counts = []
+    for days, max_messages in MESSAGE_LIMITS:
+        start_date = day_window_start(days, now)
+        response = activities_table.query(
+            IndexName='lead-id-created-at-index',
+            KeyConditionExpression='lead_id = :lead_id AND created_at >= :start_date',
+            ExpressionAttributeValues={':lead_id': lead_id, ':start_date': start_date}
+        )
+        counts.append((days, max_messages, len(response['Items'])))
+    return counts
+
+
+def build_activities(count, now):
+    """Activities spread over the last 30 days"""
+    activities = []
+    for _ in range(count):
+        created_at = now - timedelta(seconds=random.randint(0, 30 * 24 * 3600 - 1))
+        activities.append({
+            'id': f"{random.getrandbits(64):x}",
+            'lead_id': 'lead',
+            'direction': 'inbound',
+            'created_at': created_at.isoformat()
+        })
+    return activities
+
+
+def run(evaluate, activities, now, repetitions):
+    table = StubActivitiesIndex(activities)
+    started = time.perf_counter()
+    for _ in range(repetitions):
+        counts = evaluate(table, 'lead', now)
+    elapsed_ms = (time.perf_counter() - started) * 1000 / repetitions
+    return counts, table.calls / repetitions, table.bytes_returned / repetitions, elapsed_ms
+
+
+def main():
+    random.seed(7)
+    now = datetime.now()
+    new_evaluate = lambda table, lead_id, now: evaluate_message_windows(table, lead_id, MESSAGE_LIMITS, now)
+
+    print(f"{'activities':>10} | {'variant':>7} | {'queries':>7} | {'KB returned':>11} | {'ms':>7} | counts (1d/7d/30d)")
+    print('-' * 80)
+    for count in (10, 100, 1000, 5000, 10000):
+        activities = build_activities(count, now)
+        repetitions = 20 if count <= 1000 else 5
+        for name, evaluate in (('legacy', legacy_message_counts), ('single', new_evaluate)):
+            counts, calls, bytes_returned, elapsed_ms = run(evaluate, activities, now, repetitions)
+            windows = '/'.join(str(window_count) for _, _, window_count in counts)
+            print(f"{count:>10} | {name:>7} | {calls:>7.0f} | {bytes_returned / 1024:>11.1f} | {elapsed_ms:>7.2f} | {windows}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Evaluation: tokens of the conversation context per prompt, JSON history
+(previous format) versus the compact transcript (lines and messages formats).
+
+Histories come from real leads (their recent_messages buffers in the leads
+table, or the activities tables when --activities-table is given), from a
+JSON file (a list of histories, newest turn first, in the conversation
+history format), or from generated sample conversations. Reports estimated
+tokens per prompt for each format, the savings, and how many turns fit a
+history budget in each format.
+
+Usage:
+    python scripts/benchmarks/bench_transcript_encoding.py [--sample 50] [--history-limit 10]
+        [--leads-table pandasdb-crm-comm-dev-leads [--activities-table ... --activity-content-table ...]]
+        [--histories histories.json] [--budget 300]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from prompt_budget import estimate_tokens, fit_newest
+from transcript import compact_turns, estimate_messages_tokens, render_lines, to_bedrock_messages
+
+LEAD_MESSAGES = [
+    'Hola, buenas tardes', 'Cuánto cuesta el renting de la máquina?', 'y el seguro está incluido?',
+    'Tengo un gimnasio con unos 300 socios, os encaja?', 'ok', 'Vale, gracias', 'Qué productos se pueden vender?',
+    'Necesito factura para la empresa', 'Se puede pagar con tarjeta y con el móvil?', '👍',
+    'Mañana me viene mejor, a las 10?', 'Cuánto espacio ocupa más o menos?'
+]
+ASSISTANT_MESSAGES = [
+    '¡Hola! Soy el asistente de ventas. ¿En qué tipo de negocio estás pensando instalar la máquina?',
+    'El renting empieza en 150 €/mes con mantenimiento incluido. ¿Quieres que te prepare una propuesta?',
+    'Sí, el seguro contra robo y vandalismo está incluido en todas las modalidades.',
+    'Perfecto para gimnasios: bebidas, snacks proteicos y fruta. La reposición la hacemos nosotros.',
+    'Ocupa menos de 1 m² y solo necesita un enchufe. ¿Te paso una visita con un comercial?'
+]
+
+
+def legacy_context(profile_name, phone, message_body, history):
+    """Previous user turn (history as JSON), kept for comparison"""
+    return f"""
+    Lead Information:
+    - Name: {profile_name}
+    - Phone: {phone}
+
+    Current Message: {message_body}
+
+    Previous Conversations (JSON format): {json.dumps(history)}
+    """
+
+
+def compact_messages(profile_name, phone, message_body, history, transcript_format, now):
+    """The prompt messages of generate_ai_response.build_conversation_context (without summary)"""
+    turns = compact_turns(history, message_body)
+    transcript_section = f"\nConversation so far:\n{render_lines(turns, now)}\n" if turns and transcript_format == 'lines' else ''
+    context = f"""Lead Information:
+- Name: {profile_name}
+- Phone: {phone}
+{transcript_section}
+Current Message: {message_body}"""
+    if transcript_format == 'messages':
+        return to_bedrock_messages(turns, context, now)
+    return [{'role': 'user', 'content': context}]
+
+
+def sample_histories(rng, count, limit, now):
+    """Generated conversations: alternating buffer entries with gaps from seconds to days"""
+    histories = []
+    for _ in range(count):
+        timestamp = now - timedelta(days=rng.randint(0, 20))
+        entries = []
+        for index in range(rng.randint(1, limit)):
+            timestamp += timedelta(seconds=rng.choice([20, 90, 600, 7200, 90000]))
+            inbound = index % 2 == 0 or rng.random() < 0.2
+            entries.append({
+                'timestamp': min(timestamp, now).isoformat(),
+                'lead_message': rng.choice(LEAD_MESSAGES) if inbound else '',
+                'assistant_message': '' if inbound else rng.choice(ASSISTANT_MESSAGES)
+            })
+        histories.append(list(reversed(entries)))
+    return histories
+
+
+def real_histories(args):
+    """Histories of up to --sample leads, read like generate_ai_response does"""
+    os.environ['LEADS_TABLE'] = args.leads_table
+    from aws_clients import get_table
+    from conversation_history import load_conversation_history
+    from recent_messages import get_lead_conversation, to_conversation_history
+
+    histories = []
+    scan_kwargs = {'ProjectionExpression': 'id'}
+    leads_table = get_table(args.leads_table)
+    while len(histories) < args.sample:
+        response = leads_table.scan(**scan_kwargs)
+        for item in response['Items']:
+            if args.activities_table:
+                history = load_conversation_history(item['id'], args.history_limit)
+            else:
+                messages = get_lead_conversation(item['id'])['recent_messages'] or []
+                history = to_conversation_history(messages, args.history_limit)
+            if history:
+                histories.append(history)
+            if len(histories) >= args.sample:
+                break
+        if not response.get('LastEvaluatedKey'):
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return histories
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sample', type=int, default=50)
+    parser.add_argument('--history-limit', type=int, default=10)
+    parser.add_argument('--leads-table')
+    parser.add_argument('--activities-table')
+    parser.add_argument('--activity-content-table')
+    parser.add_argument('--histories', help='JSON file with a list of histories')
+    parser.add_argument('--budget', type=int, default=300, help='History budget (estimated tokens) for the fit comparison')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    now = datetime.now()
+    if args.histories:
+        with open(args.histories, encoding='utf-8') as histories_file:
+            histories = json.load(histories_file)[:args.sample]
+        source = args.histories
+    elif args.leads_table:
+        if args.activities_table:
+            os.environ['ACTIVITIES_TABLE'] = args.activities_table
+            os.environ['ACTIVITY_CONTENT_TABLE'] = args.activity_content_table or ''
+        histories = real_histories(args)
+        source = args.leads_table
+    else:
+        histories = sample_histories(random.Random(args.seed), args.sample, args.history_limit, now)
+        source = 'generated sample'
+
+    tokens = {'json': [], 'lines': [], 'messages': []}
+    fitted = {'json': [], 'lines': []}
+    for history in histories:
+        # The newest entry is the current message, as in generate_ai_response
+        message_body = history[0].get('lead_message') or 'Hola'
+        tokens['json'].append(estimate_tokens(legacy_context('María García', '+34600000000', message_body, history)))
+        for transcript_format in ('lines', 'messages'):
+            messages = compact_messages('María García', '+34600000000', message_body, history, transcript_format, now)
+            tokens[transcript_format].append(estimate_messages_tokens(messages))
+
+        fitted['json'].append(len(fit_newest(history, args.budget, lambda turn: json.dumps(turn) + ', ')))
+        fitted['lines'].append(len(fit_newest(
+            history, args.budget, lambda turn: render_lines(compact_turns([turn], message_body), now) + '\n'
+        )))
+
+    print(f"{len(histories)} histories ({source}), up to {args.history_limit} turns each")
+    print()
+    print(f"{'format':>9} | {'mean tokens':>11} | {'median':>6} | {'max':>5} | {'saved':>6}")
+    print('-' * 50)
+    baseline = statistics.mean(tokens['json']) if histories else 0
+    for name, values in tokens.items():
+        if not values:
+            continue
+        mean = statistics.mean(values)
+        print(f"{name:>9} | {mean:>11.0f} | {statistics.median(values):>6.0f} | {max(values):>5} | "
+              f"{1 - mean / baseline:>6.0%}")
+
+    if histories:
+        print()
+        print(f"Turns fitting a {args.budget}-token history budget: JSON {statistics.mean(fitted['json']):.1f}, "
+              f"compact {statistics.mean(fitted['lines']):.1f} (mean per history)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark: DynamoDB round trips per message, with and without write_coalescing.
+
+Runs the real generate_ai_response, generate_spam_response and send_message
+handlers against stubbed DynamoDB (tables and the low-level client used for
+TransactWriteItems / BatchWriteItem), S3, Bedrock and platform API, counting
+every DynamoDB request and the time spent in them at a fixed latency per
+request. io_fanout is disabled so the times are those of sequential writes.
+
+Usage:
+    python scripts/benchmarks/bench_write_coalescing.py [--dynamodb-ms 8] [--chunks 1 3 5]
+"""
+import argparse
+import copy
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+import aux
+import aws_clients
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'config', 'business.yml')
+TABLES = {
+    'ACTIVITIES_TABLE': 'activities',
+    'ACTIVITY_CONTENT_TABLE': 'activity-content',
+    'SPAM_ACTIVITIES_TABLE': 'spam-activities',
+    'LEADS_TABLE': 'leads',
+    'LEAD_MESSAGE_COUNTERS_TABLE': 'lead-message-counters'
+}
+
+
+class RequestCounter:
+    def __init__(self, latency):
+        self.latency = latency
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    def request(self, operation):
+        with self.lock:
+            self.requests[operation] += 1
+        time.sleep(self.latency)
+
+
+class StubTable:
+    def __init__(self, counter):
+        self.counter = counter
+
+    def put_item(self, **kwargs):
+        self.counter.request('PutItem')
+        return {}
+
+    def update_item(self, **kwargs):
+        self.counter.request('UpdateItem')
+        return {}
+
+    def get_item(self, **kwargs):
+        self.counter.request('GetItem')
+        return {'Item': {'id': kwargs['Key']['id'], 'recent_messages': []}}
+
+    def query(self, **kwargs):
+        self.counter.request('Query')
+        return {'Items': []}
+
+
+class StubDynamoDBClient:
+    def __init__(self, counter):
+        self.counter = counter
+
+    def transact_write_items(self, TransactItems):
+        self.counter.request('TransactWriteItems')
+        return {}
+
+    def batch_write_item(self, RequestItems):
+        self.counter.request('BatchWriteItem')
+        return {'UnprocessedItems': {}}
+
+
+class StubS3:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_object(self, Bucket, Key, **kwargs):
+        return {'Body': io.BytesIO(self.objects[Key]), 'ETag': '"1"'}
+
+
+class StubBedrock:
+    def invoke_model(self, **kwargs):
+        body = {'content': [{'text': 'Claro, el renting incluye mantenimiento.'}], 'usage': {}}
+        return {'body': io.BytesIO(json.dumps(body).encode('utf-8'))}
+
+
+def bench_config(coalesce):
+    with open(CONFIG_PATH, encoding='utf-8') as config_file:
+        config = copy.deepcopy(yaml.safe_load(config_file))
+    for section in ('knowledge_retrieval', 'faq_cache', 'conversation_summary', 'reply_streaming', 'io_fanout'):
+        config.setdefault(section, {})['enabled'] = False
+    config['ai_models'].setdefault('routing', {})['enabled'] = False
+    config['write_coalescing'] = {'enabled': coalesce}
+    return config
+
+
+def install_stubs(config, counter):
+    aws_clients.reset_clients()
+    aux._s3_cache.clear()
+    for env_name, table_name in TABLES.items():
+        os.environ[env_name] = table_name
+        aws_clients._tables[table_name] = StubTable(counter)
+    os.environ['S3_KNOWLEDGE_BUCKET'] = 'knowledge'
+    aws_clients._clients[('s3', None)] = StubS3({
+        'config/business.yml': yaml.safe_dump(config).encode('utf-8'),
+        'knowledge/system_prompt.txt': 'Eres el asistente de ventas.'.encode('utf-8')
+    })
+    aws_clients._clients[('dynamodb', None)] = StubDynamoDBClient(counter)
+    aws_clients._clients[('bedrock-runtime', os.environ.get('AWS_REGION', 'eu-west-1'))] = StubBedrock()
+
+
+def measure(counter, handler, event):
+    counter.requests.clear()
+    started = time.perf_counter()
+    result = handler(copy.deepcopy(event), None)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if result.get('action') == 'error':
+        raise RuntimeError(result['error'])
+    return sum(counter.requests.values()), elapsed_ms, dict(counter.requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dynamodb-ms', type=float, default=8)
+    parser.add_argument('--chunks', type=int, nargs='+', default=[1, 3, 5])
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'handlers', 'common'))
+    import generate_ai_response
+    import generate_spam_response
+    import send_message
+    logging.getLogger().setLevel(logging.WARNING)
+    send_message.send_platform_message = lambda platform, to, body, sender: {'success': True, 'message_id': 'SM1'}
+
+    flow_input = {'platform': 'whatsapp', 'From': '+34600000000', 'To': '+34900000000',
+                  'Body': 'Cuánto cuesta el renting?', 'ProfileName': 'María', 'MessageSid': 'SM1'}
+    inbound_event = {'lead_id': 'lead-1', 'contact_method_id': 'contact-1', 'flow_input': flow_input}
+    stages = [('AI stage (inbound)', generate_ai_response.lambda_handler, inbound_event),
+              ('spam stage', generate_spam_response.lambda_handler, inbound_event)]
+    for chunks in args.chunks:
+        stages.append((f"send, {chunks} chunk(s)", send_message.lambda_handler, {
+            'lead_id': 'lead-1',
+            'contact_method_id': 'contact-1',
+            'send_message': {'platform': 'whatsapp', 'to': '+34600000000', 'from': '+34900000000',
+                             'messages': [f"Mensaje {position}" for position in range(chunks)],
+                             'answer_to_activity_id': 'activity-1'}
+        }))
+
+    counter = RequestCounter(args.dynamodb_ms / 1000)
+    print(f"DynamoDB requests per message (all calls of the stage), {args.dynamodb_ms:g} ms per request")
+    print(f"{'stage':>20} | {'before':>6} | {'after':>5} | {'before ms':>9} | {'after ms':>8} | after")
+    print('-' * 100)
+    for name, handler, event in stages:
+        install_stubs(bench_config(False), counter)
+        before, before_ms, _ = measure(counter, handler, event)
+        install_stubs(bench_config(True), counter)
+        after, after_ms, requests = measure(counter, handler, event)
+        detail = ', '.join(f"{operation} {count}" for operation, count in sorted(requests.items()))
+        print(f"{name:>20} | {before:>6} | {after:>5} | {before_ms:>9.0f} | {after_ms:>8.0f} | {detail}")
+
+
+if __name__ == '__main__':
+    main()
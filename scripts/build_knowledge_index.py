@@ -0,0 +1,59 @@
+"""
+Build the knowledge retrieval index from the knowledge folder.
+
+Every .txt/.md file is chunked by markdown heading into sections and
+indexed with BM25. The index is written to a local file and/or uploaded
+to the knowledge bucket, where generate_ai_response picks it up on its
+next revalidation (see knowledge_retrieval in config/business.yml).
+Run it whenever the knowledge files change (npm run upload-knowledge does).
+
+Usage:
+    python scripts/build_knowledge_index.py \\
+        --bucket pandasdb-crm-comm-dev-knowledge [--key knowledge_index/index.json] \\
+        [--knowledge-dir knowledge] [--output index.json]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aws_clients import get_client
+from knowledge_index import KnowledgeIndex, sections_from_folder
+
+DEFAULT_KEY = 'knowledge_index/index.json'
+KNOWLEDGE_DIR = os.path.join(os.path.dirname(__file__), '..', 'knowledge')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--knowledge-dir', default=KNOWLEDGE_DIR)
+    parser.add_argument('--bucket', default=os.environ.get('S3_KNOWLEDGE_BUCKET'), help='Upload the index to this bucket')
+    parser.add_argument('--key', default=DEFAULT_KEY)
+    parser.add_argument('--output', help='Also write the index to this local file')
+    args = parser.parse_args()
+
+    if not args.bucket and not args.output:
+        parser.error('--bucket or --output is required')
+
+    sections = sections_from_folder(args.knowledge_dir)
+    if not sections:
+        parser.error(f"No .txt/.md knowledge files found in {args.knowledge_dir}")
+
+    index = KnowledgeIndex.build(sections)
+    data = index.to_bytes()
+    print(f"Index: {len(sections)} sections, {len(index.postings)} terms, {len(data) / 1024:.1f} KB")
+    for section in sections:
+        print(f"  {section['source']}: {section['heading'] or '(preamble)'} ({len(section['text'])} chars)")
+
+    if args.output:
+        with open(args.output, 'wb') as output_file:
+            output_file.write(data)
+        print(f"Wrote {args.output}")
+    if args.bucket:
+        get_client('s3').put_object(Bucket=args.bucket, Key=args.key, Body=data, ContentType='application/json')
+        print(f"Uploaded s3://{args.bucket}/{args.key}")
+
+
+if __name__ == '__main__':
+    main()
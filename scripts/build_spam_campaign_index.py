@@ -0,0 +1,172 @@
+"""
+Build the near-duplicate spam campaign index from existing spam records.
+
+Reads the spam_activities of the last --since-days days and their lead
+messages from activity_content (leaving out the messages of leads already
+blocked as spammers, which would repeat one sender), groups near-duplicate
+messages into clusters, and keeps the clusters sent by at least --min-leads
+different leads. Two messages are joined only when they share a MinHash band
+and their estimated Jaccard similarity reaches --min-similarity. The index is written to a local file and/or
+uploaded to the knowledge bucket, where detect_spam picks it up on its
+next config revalidation (see spam_detection.campaign_index).
+
+Usage:
+    python scripts/build_spam_campaign_index.py \\
+        --spam-activities-table pandasdb-crm-comm-dev-spam-activities \\
+        --activity-content-table pandasdb-crm-comm-dev-activity-content \\
+        --bucket pandasdb-crm-comm-dev-knowledge [--key spam/campaign_index.bin] [--output index.bin]
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aws_clients import get_client, get_table
+from spam_campaign_index import (
+    DEFAULT_MIN_SIMILARITY, DEFAULT_NUM_PERM, DEFAULT_ROWS_PER_BAND, DEFAULT_SEED, SpamCampaignIndex,
+    band_keys, estimate_similarity, minhash_signature
+)
+
+DEFAULT_KEY = 'spam/campaign_index.bin'
+# Messages of leads already blocked say nothing about how widespread a campaign is
+EXCLUDED_SPAM_REASONS = {'existing_spammer'}
+
+
+def scan_all(table, **scan_kwargs):
+    """Yield every item of a paginated scan"""
+    while True:
+        response = table.scan(**scan_kwargs)
+        yield from response['Items']
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+
+def load_spam_messages(spam_activities_table, activity_content_table, since):
+    """(lead_id, spam_date, message) of every spam activity since `since`"""
+    spam_activities = {
+        item['activity_id']: item
+        for item in scan_all(
+            spam_activities_table,
+            FilterExpression='spam_date >= :since',
+            ProjectionExpression='activity_id, lead_id, spam_date, spam_reason',
+            ExpressionAttributeValues={':since': since}
+        )
+        if item.get('spam_reason') not in EXCLUDED_SPAM_REASONS
+    }
+    print(f"Found {len(spam_activities)} spam activities since {since}")
+
+    messages = []
+    for item in scan_all(activity_content_table, ProjectionExpression='activity_id, content'):
+        spam_activity = spam_activities.get(item.get('activity_id'))
+        message = (item.get('content') or {}).get('leadMessage')
+        if spam_activity and message:
+            messages.append((spam_activity['lead_id'], spam_activity['spam_date'], message))
+    return messages
+
+
+def cluster_messages(signatures, rows_per_band, min_similarity):
+    """
+    Group signatures (union-find) joining two only when they share a band key
+    and their estimated Jaccard similarity reaches min_similarity, so single
+    band collisions do not chain unrelated messages; returns lists of positions
+    """
+    parent = list(range(len(signatures)))
+
+    def find(position):
+        while parent[position] != position:
+            parent[position] = parent[parent[position]]
+            position = parent[position]
+        return position
+
+    buckets = defaultdict(list)
+    for position, signature in enumerate(signatures):
+        for band, key in enumerate(band_keys(signature, rows_per_band)):
+            for other in buckets[(band, key)]:
+                if find(position) != find(other) and estimate_similarity(signature, signatures[other]) >= min_similarity:
+                    parent[find(position)] = find(other)
+            buckets[(band, key)].append(position)
+
+    groups = defaultdict(list)
+    for position in range(len(signatures)):
+        groups[find(position)].append(position)
+    return list(groups.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spam-activities-table', default=os.environ.get('SPAM_ACTIVITIES_TABLE'))
+    parser.add_argument('--activity-content-table', default=os.environ.get('ACTIVITY_CONTENT_TABLE'))
+    parser.add_argument('--bucket', default=os.environ.get('S3_KNOWLEDGE_BUCKET'), help='Upload the index to this bucket')
+    parser.add_argument('--key', default=DEFAULT_KEY)
+    parser.add_argument('--output', help='Also write the index to this local file')
+    parser.add_argument('--since-days', type=int, default=90)
+    parser.add_argument('--min-leads', type=int, default=3, help='Minimum distinct leads for a cluster to be a campaign')
+    parser.add_argument('--num-perm', type=int, default=DEFAULT_NUM_PERM)
+    parser.add_argument('--rows-per-band', type=int, default=DEFAULT_ROWS_PER_BAND)
+    parser.add_argument('--min-similarity', type=float, default=DEFAULT_MIN_SIMILARITY,
+                        help='Estimated Jaccard similarity for two messages to join a cluster')
+    args = parser.parse_args()
+
+    if not args.spam_activities_table or not args.activity_content_table:
+        parser.error('--spam-activities-table and --activity-content-table are required')
+    if not args.bucket and not args.output:
+        parser.error('--bucket or --output is required')
+
+    since = (datetime.now() - timedelta(days=args.since_days)).isoformat()
+    messages = load_spam_messages(get_table(args.spam_activities_table), get_table(args.activity_content_table), since)
+
+    # One entry per distinct signature: {'signature', 'leads', 'messages', 'last_seen', 'example'}
+    signed = {}
+    too_short = 0
+    for lead_id, spam_date, message in messages:
+        signature = minhash_signature(message, args.num_perm, DEFAULT_SEED)
+        if signature is None:
+            too_short += 1
+            continue
+        entry = signed.setdefault(tuple(signature), {
+            'signature': signature, 'leads': set(), 'messages': 0, 'last_seen': spam_date, 'example': message
+        })
+        entry['leads'].add(lead_id)
+        entry['messages'] += 1
+        entry['last_seen'] = max(entry['last_seen'], spam_date)
+    signed = list(signed.values())
+    print(f"Computed {len(signed)} distinct signatures ({too_short} messages too short)")
+
+    clusters = []
+    members = []
+    for positions in cluster_messages([entry['signature'] for entry in signed], args.rows_per_band, args.min_similarity):
+        leads = set().union(*(signed[position]['leads'] for position in positions))
+        if len(leads) < args.min_leads:
+            continue
+        cluster_id = len(clusters)
+        clusters.append({
+            'size': sum(signed[position]['messages'] for position in positions),
+            'leads': len(leads),
+            'last_seen': max(signed[position]['last_seen'] for position in positions),
+            'example': signed[positions[0]]['example'][:120]
+        })
+        members.extend((signed[position]['signature'], cluster_id) for position in positions)
+
+    index = SpamCampaignIndex.build(members, clusters, args.num_perm, args.rows_per_band, DEFAULT_SEED)
+    data = index.to_bytes()
+    print(f"Index: {len(clusters)} campaigns, {len(members)} signatures, {len(data) / 1024:.1f} KB")
+    for cluster in sorted(clusters, key=lambda cluster: -cluster['leads'])[:10]:
+        print(f"  {cluster['leads']:>5} leads {cluster['size']:>6} messages: {cluster['example'][:60]!r}")
+
+    if args.output:
+        with open(args.output, 'wb') as output_file:
+            output_file.write(data)
+        print(f"Wrote {args.output}")
+    if args.bucket:
+        get_client('s3').put_object(Bucket=args.bucket, Key=args.key, Body=data)
+        print(f"Uploaded s3://{args.bucket}/{args.key}")
+
+
+if __name__ == '__main__':
+    main()
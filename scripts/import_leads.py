@@ -0,0 +1,148 @@
+"""
+Import leads from an NDJSON or CSV file, streaming it in chunks.
+
+NDJSON: one lead per line, in the body format of POST /api/leads
+({"name": ..., "metadata": {...}, "contact_methods": [{"type": "phone", "value": ...}]}).
+CSV: a header row with `name`, contact columns `phone`, `email` and `other`
+(several values in a cell separated by ';'), every other column going into
+metadata; the first contact method of a row is its primary one.
+
+Each chunk goes through src/lead_import.py: rows repeating a contact method
+of an earlier row of the file are skipped, existing contact methods are
+checked concurrently, and new leads are written with BatchWriteItem. One
+result per row (created / exists / duplicate / invalid / error) is written
+to --results as NDJSON. Re-running a file only creates the missing leads.
+Point AWS_ENDPOINT_URL_DYNAMODB at a local DynamoDB to try it out.
+
+Usage:
+    python scripts/import_leads.py leads.csv \\
+        --leads-table pandasdb-crm-comm-dev-leads \\
+        --contact-methods-table pandasdb-crm-comm-dev-contact-methods \\
+        --contact-method-settings-table pandasdb-crm-comm-dev-contact-method-settings \\
+        [--results results.ndjson] [--chunk-size 1000] [--workers 16] [--dry-run]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lead_import import import_leads, prepare_rows
+from lead_store import VALID_CONTACT_TYPES
+
+CONTACT_VALUE_SEPARATOR = ';'
+
+
+def read_ndjson(path):
+    """Leads of an NDJSON file (None for lines that are not valid JSON)"""
+    with open(path, encoding='utf-8') as ndjson_file:
+        for line in ndjson_file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+
+
+def csv_record_to_lead(record):
+    contact_methods = []
+    metadata = {}
+    for column, cell in record.items():
+        cell = (cell or '').strip()
+        if column in VALID_CONTACT_TYPES:
+            contact_methods.extend({'type': column, 'value': value.strip()}
+                                   for value in cell.split(CONTACT_VALUE_SEPARATOR) if value.strip())
+        elif column != 'name' and column and cell:
+            metadata[column] = cell
+    # Primary contact method: phone, then email, then other
+    contact_methods.sort(key=lambda contact_method: VALID_CONTACT_TYPES.index(contact_method['type']))
+    return {'name': record.get('name') or '', 'metadata': metadata, 'contact_methods': contact_methods}
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as csv_file:
+        for record in csv.DictReader(csv_file):
+            yield csv_record_to_lead(record)
+
+
+def chunked(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_import(path, file_format, chunk_size=1000, workers=16, results_file=None, dry_run=False, progress=True):
+    """Import a file chunk by chunk; returns the row counts by status and the elapsed seconds"""
+    rows = read_csv(path) if file_format == 'csv' else read_ndjson(path)
+    seen = set()
+    summary = Counter()
+    started = time.perf_counter()
+    start_row = 0
+
+    for chunk in chunked(rows, chunk_size):
+        if dry_run:
+            rejected, pending = prepare_rows(chunk, seen, start_row)
+            results = sorted(rejected.values(), key=lambda result: result['row'])
+            summary['to_import'] += len(pending)
+        else:
+            results = import_leads(chunk, seen=seen, start_row=start_row, max_workers=workers)
+        start_row += len(chunk)
+
+        for result in results:
+            summary[result['status']] += 1
+            if results_file:
+                results_file.write(json.dumps(result) + '\n')
+        if progress:
+            elapsed = time.perf_counter() - started
+            print(f"  {start_row} rows | {', '.join(f'{status} {count}' for status, count in sorted(summary.items()))} | "
+                  f"{start_row / elapsed:.0f} rows/s")
+
+    return summary, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['ndjson', 'csv'], help='Default: from the file extension')
+    parser.add_argument('--leads-table', default=os.environ.get('LEADS_TABLE'))
+    parser.add_argument('--contact-methods-table', default=os.environ.get('CONTACT_METHODS_TABLE'))
+    parser.add_argument('--contact-method-settings-table', default=os.environ.get('CONTACT_METHOD_SETTINGS_TABLE'))
+    parser.add_argument('--results', help='Write the per-row results here (NDJSON)')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--dry-run', action='store_true', help='Only validate and deduplicate the file')
+    args = parser.parse_args()
+
+    file_format = args.format or ('csv' if args.path.lower().endswith('.csv') else 'ndjson')
+    if not args.dry_run:
+        if not args.leads_table or not args.contact_methods_table or not args.contact_method_settings_table:
+            parser.error('--leads-table, --contact-methods-table and --contact-method-settings-table are required')
+        os.environ['LEADS_TABLE'] = args.leads_table
+        os.environ['CONTACT_METHODS_TABLE'] = args.contact_methods_table
+        os.environ['CONTACT_METHOD_SETTINGS_TABLE'] = args.contact_method_settings_table
+
+    print(f"Importing {args.path} ({file_format}{', dry run' if args.dry_run else ''})...")
+    results_file = open(args.results, 'w', encoding='utf-8') if args.results else None
+    try:
+        summary, elapsed = run_import(args.path, file_format, args.chunk_size, args.workers, results_file, args.dry_run)
+    finally:
+        if results_file:
+            results_file.close()
+
+    rows = sum(summary.values())
+    print(f"Done: {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s): "
+          f"{', '.join(f'{status} {count}' for status, count in sorted(summary.items()))}")
+
+
+if __name__ == '__main__':
+    main()
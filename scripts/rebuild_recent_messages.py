@@ -0,0 +1,84 @@
+"""
+Rebuild the recent_messages buffer of leads from the activities tables.
+
+The activities/activity_content tables are the source of truth; this
+overwrites each lead's buffer with its last recent_messages.max_messages
+messages. Buffers are seeded from the activities when a lead gets its first
+message after recent_messages is enabled; run this to build them all ahead
+of time or whenever a buffer is suspected to be out of date.
+
+Usage:
+    python scripts/rebuild_recent_messages.py \\
+        --leads-table pandasdb-crm-comm-dev-leads \\
+        --activities-table pandasdb-crm-comm-dev-activities \\
+        --activity-content-table pandasdb-crm-comm-dev-activity-content \\
+        [--lead-id LEAD_ID ...] [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aws_clients import get_table
+from conversation_history import hydrate_activities, query_recent_activities
+from recent_messages import DEFAULT_MAX_MESSAGES, build_recent_messages, replace_recent_messages
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'business.yml')
+
+
+def scan_lead_ids(leads_table):
+    """Yield the id of every lead"""
+    scan_kwargs = {'ProjectionExpression': 'id'}
+    while True:
+        response = leads_table.scan(**scan_kwargs)
+        for item in response['Items']:
+            yield item['id']
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leads-table', default=os.environ.get('LEADS_TABLE'))
+    parser.add_argument('--activities-table', default=os.environ.get('ACTIVITIES_TABLE'))
+    parser.add_argument('--activity-content-table', default=os.environ.get('ACTIVITY_CONTENT_TABLE'))
+    parser.add_argument('--lead-id', action='append', help='Only rebuild these leads (repeatable)')
+    parser.add_argument('--config', default=CONFIG_PATH)
+    parser.add_argument('--dry-run', action='store_true', help='Only print what would be written')
+    args = parser.parse_args()
+
+    if not args.leads_table or not args.activities_table or not args.activity_content_table:
+        parser.error('--leads-table, --activities-table and --activity-content-table are required')
+
+    # The shared modules read table names from the environment
+    os.environ['LEADS_TABLE'] = args.leads_table
+    os.environ['ACTIVITIES_TABLE'] = args.activities_table
+    os.environ['ACTIVITY_CONTENT_TABLE'] = args.activity_content_table
+
+    with open(args.config, encoding='utf-8') as config_file:
+        settings = yaml.safe_load(config_file).get('recent_messages', {})
+    max_messages = settings.get('max_messages', DEFAULT_MAX_MESSAGES)
+
+    lead_ids = args.lead_id or scan_lead_ids(get_table(args.leads_table))
+
+    rebuilt = 0
+    for lead_id in lead_ids:
+        activities = hydrate_activities(query_recent_activities(lead_id, max_messages))
+        messages = build_recent_messages(activities, settings)
+        if args.dry_run:
+            print(f"{lead_id}: {len(messages)} messages")
+        else:
+            replace_recent_messages(lead_id, messages)
+        rebuilt += 1
+
+    print(f"{'Would rebuild' if args.dry_run else 'Rebuilt'} recent messages of {rebuilt} leads")
+
+
+if __name__ == '__main__':
+    main()
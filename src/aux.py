@@ -1,10 +1,85 @@
 import yaml
-import boto3
 import os
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
 
-def load_business_config():
-    """Load business configuration from S3"""
-    s3_client = boto3.client('s3')
+from botocore.exceptions import ClientError
+
+from aws_clients import get_client
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+@dataclass
+class CachedS3Object:
+    """
+    S3 object body kept in memory with the ETag used to revalidate it.
+    Loaders of large binary objects may drop the body (None) once parsed.
+    """
+    body: Optional[bytes]
+    etag: str
+    version_id: Optional[str]
+    checked_at: float
+    parsed: Any = None
+
+    @property
+    def text(self) -> str:
+        return self.body.decode('utf-8')
+
+# Process-wide cache of knowledge bucket objects, keyed by S3 key
+_s3_cache: Dict[str, CachedS3Object] = {}
+
+def get_config_cache_ttl():
+    """Seconds a cached S3 object is served before it is revalidated"""
+    return int(os.environ.get('CONFIG_CACHE_TTL_SECONDS', '60'))
+
+def load_s3_object(key):
+    """
+    Load an object from the knowledge bucket through the process-wide cache.
+    Within the TTL no S3 call is made; after it, the object is re-fetched
+    conditionally (If-None-Match on its ETag) so unchanged files cost a 304.
+    If S3 fails after the first load, the last good copy keeps being served.
+    """
     bucket_name = os.environ['S3_KNOWLEDGE_BUCKET']
-    response = s3_client.get_object(Bucket=bucket_name, Key='config/business.yml')
-    return yaml.safe_load(response['Body'].read().decode('utf-8'))
+    now = time.monotonic()
+    cached = _s3_cache.get(key)
+
+    if cached and now - cached.checked_at < get_config_cache_ttl():
+        return cached
+
+    s3_client = get_client('s3')
+    request = {'Bucket': bucket_name, 'Key': key}
+    if cached:
+        request['IfNoneMatch'] = cached.etag
+
+    try:
+        response = s3_client.get_object(**request)
+    except ClientError as e:
+        if not cached:
+            raise
+        if e.response['Error']['Code'] not in ('304', 'NotModified'):
+            logger.warning(f"Could not revalidate s3://{bucket_name}/{key}, serving cached copy: {str(e)}")
+        cached.checked_at = now
+        return cached
+
+    entry = CachedS3Object(
+        body=response['Body'].read(),
+        etag=response['ETag'],
+        version_id=response.get('VersionId'),
+        checked_at=now
+    )
+    _s3_cache[key] = entry
+    logger.info(f"Loaded s3://{bucket_name}/{key} (version {entry.version_id or entry.etag})")
+    return entry
+
+def load_business_config():
+    """
+    Load business configuration from S3 (cached, see load_s3_object).
+    The parsed YAML is shared between calls and must not be modified.
+    """
+    entry = load_s3_object('config/business.yml')
+    if entry.parsed is None:
+        entry.parsed = yaml.safe_load(entry.text)
+    return entry.parsed
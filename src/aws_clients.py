@@ -0,0 +1,72 @@
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+# Clients, resources and tables are built once per process and reused by warm
+# invocations, keeping their HTTP connections alive between requests
+_clients: Dict[Tuple[str, Optional[str]], Any] = {}
+_resources: Dict[Tuple[str, Optional[str]], Any] = {}
+_tables: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '25')),
+    tcp_keepalive=True,
+    connect_timeout=int(os.environ.get('AWS_CONNECT_TIMEOUT_SECONDS', '5')),
+    retries={
+        'mode': 'adaptive',
+        'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', '5'))
+    }
+)
+
+
+def get_client(service_name: str, region_name: Optional[str] = None):
+    """Return a cached boto3 client for the service (and region, if given)"""
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = boto3.client(service_name, region_name=region_name, config=CLIENT_CONFIG)
+                _clients[key] = client
+    return client
+
+
+def get_resource(service_name: str, region_name: Optional[str] = None):
+    """Return a cached boto3 service resource"""
+    key = (service_name, region_name)
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = boto3.resource(service_name, region_name=region_name, config=CLIENT_CONFIG)
+                _resources[key] = resource
+    return resource
+
+
+def get_table(table_name: str):
+    """Return a cached DynamoDB Table object by table name"""
+    table = _tables.get(table_name)
+    if table is None:
+        table = get_resource('dynamodb').Table(table_name)
+        with _lock:
+            table = _tables.setdefault(table_name, table)
+    return table
+
+
+def get_bedrock_runtime():
+    """Return the cached Bedrock runtime client for the function's region"""
+    return get_client('bedrock-runtime', os.environ.get('AWS_REGION', 'eu-west-1'))
+
+
+def reset_clients():
+    """Drop every cached client, resource and table (used by benchmarks)"""
+    with _lock:
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
@@ -0,0 +1,129 @@
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from aws_clients import get_resource, get_table
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Namespace of the deterministic activity_content ids (uuid5 of the activity id)
+CONTENT_ID_NAMESPACE = uuid.UUID('5d3c7a52-6f0e-4a53-9d1c-2b8f4e6a9c10')
+
+BATCH_GET_LIMIT = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+LEGACY_QUERY_WORKERS = 8
+
+# Bounded pool for the per-activity queries of content stored with random ids
+_query_executor = ThreadPoolExecutor(max_workers=LEGACY_QUERY_WORKERS)
+
+
+def get_content_id(activity_id: str) -> str:
+    """Id of the activity_content item of an activity, so it can be read by key"""
+    return str(uuid.uuid5(CONTENT_ID_NAMESPACE, activity_id))
+
+
+def batch_get_contents(table_name: str, activity_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Read content items by their deterministic ids with BatchGetItem
+    (100 keys per request, unprocessed keys retried with backoff).
+    Returns the items found, by activity id.
+    """
+    dynamodb = get_resource('dynamodb')
+    found = {}
+
+    for start in range(0, len(activity_ids), BATCH_GET_LIMIT):
+        keys = [{'id': get_content_id(activity_id)} for activity_id in activity_ids[start:start + BATCH_GET_LIMIT]]
+        request = {table_name: {'Keys': keys}}
+
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(table_name, []):
+                found[item['activity_id']] = item
+
+            request = response.get('UnprocessedKeys')
+            if not request:
+                break
+            time.sleep(0.05 * 2 ** attempt)
+        else:
+            logger.warning(f"{len(request[table_name]['Keys'])} activity contents left unprocessed by BatchGetItem")
+
+    return found
+
+
+def query_content(table, activity_id: str) -> Optional[Dict[str, Any]]:
+    """Content item of an activity through the activity-id-index (content stored with a random id)"""
+    response = table.query(
+        IndexName='activity-id-index',
+        KeyConditionExpression='activity_id = :activity_id',
+        ExpressionAttributeValues={':activity_id': activity_id}
+    )
+    return response['Items'][0] if response['Items'] else None
+
+
+def fetch_activity_contents(activity_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch the content of many activities in bulk.
+    Content is read by key with BatchGetItem; activities whose content was
+    stored before ids were derived from the activity id are looked up with
+    concurrent index queries. Returns the content map by activity id.
+    """
+    if not activity_ids:
+        return {}
+
+    table_name = os.environ['ACTIVITY_CONTENT_TABLE']
+    found = batch_get_contents(table_name, activity_ids)
+
+    missing = [activity_id for activity_id in activity_ids if activity_id not in found]
+    if missing:
+        table = get_table(table_name)
+        items = _query_executor.map(lambda activity_id: query_content(table, activity_id), missing)
+        for activity_id, item in zip(missing, items):
+            if item:
+                found[activity_id] = item
+
+    return {activity_id: item.get('content', {}) for activity_id, item in found.items()}
+
+
+def hydrate_activities(activities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copies of the activities with their 'content' added (when stored)"""
+    contents = fetch_activity_contents([activity['id'] for activity in activities])
+    hydrated = []
+    for activity in activities:
+        activity_data = dict(activity)
+        if activity['id'] in contents:
+            activity_data['content'] = contents[activity['id']]
+        hydrated.append(activity_data)
+    return hydrated
+
+
+def query_recent_activities(lead_id: str, limit: int) -> List[Dict[str, Any]]:
+    """The lead's last `limit` activities, most recent first"""
+    activities_table = get_table(os.environ['ACTIVITIES_TABLE'])
+    response = activities_table.query(
+        IndexName='lead-id-created-at-index',
+        KeyConditionExpression='lead_id = :lead_id',
+        ExpressionAttributeValues={':lead_id': lead_id},
+        ScanIndexForward=False,  # Most recent first
+        Limit=limit
+    )
+    return response['Items']
+
+
+def load_conversation_history(lead_id: str, limit: int) -> List[Dict[str, str]]:
+    """
+    Most recent `limit` messages of the lead (newest first) with their content.
+    Costs one index query plus one BatchGetItem instead of one query per activity.
+    """
+    conversation_history = []
+    for activity in hydrate_activities(query_recent_activities(lead_id, limit)):
+        if 'content' in activity:
+            conversation_history.append({
+                'timestamp': activity.get('created_at', ''),
+                'lead_message': activity['content'].get('leadMessage', ''),
+                'assistant_message': activity['content'].get('assistantMessage', '')
+            })
+    return conversation_history
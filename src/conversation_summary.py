@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List
+
+from aws_clients import get_bedrock_runtime, get_client, get_table
+from prompt_budget import truncate_to_tokens
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+DEFAULT_REFRESH_EVERY_TURNS = 6
+DEFAULT_KEEP_RECENT_TURNS = 4
+DEFAULT_MAX_SUMMARY_TOKENS = 200
+# A container does not re-request a refresh for the same lead within this window
+REFRESH_REQUEST_COOLDOWN_SECONDS = 60
+
+SUMMARY_INSTRUCTIONS = """You maintain the running summary of a conversation between a lead and a sales assistant.
+Merge the previous summary with the new messages into one updated summary.
+Keep the facts the assistant needs to continue the conversation: who the lead is, what they asked for,
+what was offered or promised, prices, dates, objections and open questions.
+Write in the language of the conversation, in plain prose, in at most {max_words} words.
+Reply with the summary only."""
+
+_refresh_requested_at: Dict[str, float] = {}
+
+
+def get_summary_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    return config.get('conversation_summary', {})
+
+
+def unsummarized_turns(messages: List[Dict[str, Any]], covered_until: str) -> List[Dict[str, Any]]:
+    """Entries newer than the summary (works on buffer entries and history entries alike)"""
+    if not covered_until:
+        return list(messages)
+    return [message for message in messages if message.get('timestamp', '') > covered_until]
+
+
+def needs_refresh(unsummarized_count: int, settings: Dict[str, Any]) -> bool:
+    """A refresh folds refresh_every_turns turns while leaving keep_recent_turns verbatim"""
+    threshold = (settings.get('refresh_every_turns', DEFAULT_REFRESH_EVERY_TURNS)
+                 + settings.get('keep_recent_turns', DEFAULT_KEEP_RECENT_TURNS))
+    return unsummarized_count >= threshold
+
+
+def request_summary_refresh(lead_id: str):
+    """
+    Ask the summarizer Lambda to fold old turns into the summary, asynchronously
+    so the reply never waits for it. Failures are logged, never raised.
+    """
+    now = time.monotonic()
+    if now - _refresh_requested_at.get(lead_id, float('-inf')) < REFRESH_REQUEST_COOLDOWN_SECONDS:
+        return
+    _refresh_requested_at[lead_id] = now
+
+    try:
+        get_client('lambda').invoke(
+            FunctionName=os.environ['SUMMARIZE_CONVERSATION_FUNCTION_NAME'],
+            InvocationType='Event',
+            Payload=json.dumps({'lead_id': lead_id})
+        )
+        logger.info(f"Requested conversation summary refresh for lead {lead_id}")
+    except Exception as e:
+        logger.warning(f"Could not request conversation summary refresh for lead {lead_id}: {str(e)}")
+
+
+def select_turns_to_fold(messages: List[Dict[str, Any]], covered_until: str,
+                         settings: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Unsummarized buffer entries (oldest first) that a refresh folds into the
+    summary: all but the newest keep_recent_turns. Empty if too few have accumulated.
+    """
+    pending = unsummarized_turns(messages, covered_until)
+    if not needs_refresh(len(pending), settings):
+        return []
+    return pending[:len(pending) - settings.get('keep_recent_turns', DEFAULT_KEEP_RECENT_TURNS)]
+
+
+def summarize_turns(previous_summary: str, turns: List[Dict[str, Any]], config: Dict[str, Any]) -> str:
+    """Merge the previous summary with the turns (buffer entries, oldest first) using Bedrock"""
+    settings = get_summary_settings(config)
+    max_tokens = settings.get('max_summary_tokens', DEFAULT_MAX_SUMMARY_TOKENS)
+
+    transcript = '\n'.join(
+        f"{'Lead' if turn.get('direction') == 'inbound' else 'Assistant'}: {turn.get('text', '')}"
+        for turn in turns
+    )
+    body = {
+        "anthropic_version": config['ai_models']['bedrock_version'],
+        "max_tokens": max_tokens,
+        "system": SUMMARY_INSTRUCTIONS.format(max_words=int(max_tokens * 0.6)),
+        "messages": [
+            {
+                "role": "user",
+                "content": f"Previous summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+            }
+        ]
+    }
+
+    response = get_bedrock_runtime().invoke_model(
+        body=json.dumps(body),
+        modelId=settings.get('bedrock_model_id', config['ai_models']['bedrock_model_id']),
+        accept='application/json',
+        contentType='application/json'
+    )
+    response_body = json.loads(response.get('body').read())
+    summary = response_body.get('content', [{}])[0].get('text', '').strip()
+
+    # The summary is injected into every prompt, so never let it outgrow its budget
+    return truncate_to_tokens(summary, max_tokens)
+
+
+def save_summary(lead_id: str, summary: str, covered_until: str, previous_covered_until: str):
+    """
+    Store the new summary only if no other refresh stored one since it was read.
+    Raises ConditionalCheckFailedException when it lost that race.
+    """
+    leads_table = get_table(os.environ['LEADS_TABLE'])
+    leads_table.update_item(
+        Key={'id': lead_id},
+        UpdateExpression='SET conversation_summary = :summary, summary_covered_until = :covered_until',
+        ConditionExpression='attribute_exists(id) AND summary_covered_until = :previous' if previous_covered_until
+                            else 'attribute_exists(id) AND attribute_not_exists(summary_covered_until)',
+        ExpressionAttributeValues={
+            ':summary': summary,
+            ':covered_until': covered_until,
+            **({':previous': previous_covered_until} if previous_covered_until else {})
+        }
+    )
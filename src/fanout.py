@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+DEFAULT_MAX_WORKERS = 8
+
+# One bounded pool per container, reused by warm invocations (its size is fixed on first use)
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_worker = threading.local()
+
+
+def get_fanout_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    return config.get('io_fanout', {})
+
+
+def mark_worker():
+    _worker.active = True
+
+
+def in_worker() -> bool:
+    return getattr(_worker, 'active', False)
+
+
+def get_executor(max_workers: int = DEFAULT_MAX_WORKERS) -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fanout',
+                                               initializer=mark_worker)
+    return _executor
+
+
+class PhaseTimer:
+    """Wall-clock time of the phases of one invocation, logged as a single breakdown line"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def record(self, phase: str, elapsed_ms: float):
+        with self.lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + elapsed_ms
+
+    def measure(self, phase: str, function: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call function(*args, **kwargs), recording its time under `phase`"""
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.record(phase, (time.perf_counter() - started) * 1000)
+
+    def log(self):
+        breakdown = ' | '.join(f"{phase} {elapsed_ms:.0f}ms" for phase, elapsed_ms in self.phases.items())
+        total_ms = (time.perf_counter() - self.started) * 1000
+        logger.info(f"{self.label} timings: {breakdown or 'no phases'} | total {total_ms:.0f}ms")
+
+
+def submit(phase: str, function: Callable[..., Any], *args, timer: Optional[PhaseTimer] = None,
+           max_workers: int = DEFAULT_MAX_WORKERS) -> Future:
+    """Start function(*args) on the shared pool (timed under `phase`) without waiting for it"""
+    if timer:
+        return get_executor(max_workers).submit(timer.measure, phase, function, *args)
+    return get_executor(max_workers).submit(function, *args)
+
+
+def wait_all(futures: Dict[str, Future]) -> Dict[str, Any]:
+    """
+    Wait for every future and return the results by name. Once all have
+    finished, the first failure (in the given order) is raised.
+    """
+    results = {}
+    error = None
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logger.error(f"Concurrent call {name} failed: {str(e)}")
+            error = error or e
+    if error:
+        raise error
+    return results
+
+
+def fan_out(calls: Dict[str, Callable[[], Any]], timer: Optional[PhaseTimer] = None,
+            max_workers: int = DEFAULT_MAX_WORKERS) -> Dict[str, Any]:
+    """
+    Run independent calls concurrently on the shared bounded pool and return
+    their results by name, each call timed under its name. Inside a pool worker
+    (a fan-out within a fan-out) the calls run one after the other, so nested
+    fan-outs can't exhaust the pool and deadlock.
+    """
+    if in_worker() or len(calls) < 2:
+        if timer:
+            return {name: timer.measure(name, call) for name, call in calls.items()}
+        return {name: call() for name, call in calls.items()}
+    return wait_all({name: submit(name, call, timer=timer, max_workers=max_workers) for name, call in calls.items()})
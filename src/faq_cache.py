@@ -0,0 +1,197 @@
+import hashlib
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from aux import load_s3_object
+from aws_clients import get_table
+from spam_heuristics import message_hash, normalize_message
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.85
+DEFAULT_TTL_HOURS = 72
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_MAX_QUESTION_CHARACTERS = 200
+DEFAULT_REFRESH_SECONDS = 300
+
+# Hashed feature space of the question vectors (word unigrams + character trigrams)
+VECTOR_DIMENSIONS = 1 << 20
+CHARACTER_NGRAM = 3
+WORD_PATTERN = re.compile(r'\w+')
+
+# Cached entries per prompt version, reloaded from the table every refresh_seconds
+_entries: Dict[str, Dict[str, Any]] = {}
+
+# Per-container counters used for the hit rate log
+cache_stats = {
+    'lookups': 0,
+    'hits': 0
+}
+
+
+def hash_feature(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big') % VECTOR_DIMENSIONS
+
+
+def vectorize(question: str) -> Dict[int, float]:
+    """
+    L2-normalized sparse vector of a question: hashed word unigrams plus
+    character trigrams of each word, so typos and inflections stay close.
+    """
+    features = Counter()
+    for word in WORD_PATTERN.findall(normalize_message(question)):
+        features[hash_feature(f"w:{word}")] += 1
+        padded = f" {word} "
+        for start in range(max(len(padded) - CHARACTER_NGRAM + 1, 1)):
+            features[hash_feature(f"c:{padded[start:start + CHARACTER_NGRAM]}")] += 1
+
+    norm = math.sqrt(sum(count * count for count in features.values()))
+    return {feature: count / norm for feature, count in features.items()} if norm else {}
+
+
+def cosine_similarity(vector: Dict[int, float], other: Dict[int, float]) -> float:
+    if len(other) < len(vector):
+        vector, other = other, vector
+    return sum(weight * other.get(feature, 0.0) for feature, weight in vector.items())
+
+
+def is_cacheable_question(message_body: str, settings: Dict[str, Any]) -> bool:
+    """Short questions with words in them; long messages are too specific to be FAQs"""
+    return (0 < len(message_body) <= settings.get('max_question_characters', DEFAULT_MAX_QUESTION_CHARACTERS)
+            and bool(WORD_PATTERN.search(message_body)))
+
+
+def get_prompt_version(config: Dict[str, Any], platform: str, route: Dict[str, Any]) -> Optional[str]:
+    """
+    Version of everything a reply depends on besides the question: the routed
+    model and max_tokens (model_router.select_route), the routing and
+    transcript settings, platform reply limits, system prompt file and
+    knowledge index (ETags). Any change starts a fresh set of cached answers.
+    None if it can't be determined.
+    """
+    try:
+        parts = [
+            route['model_id'],
+            str(route['max_tokens']),
+            repr(config['ai_models'].get('routing', {})),
+            repr(config.get('transcript', {})),
+            platform,
+            repr(sorted(config['reply_length'].get(platform, config['reply_length']['default']).items())),
+            load_s3_object(os.environ.get('S3_KNOWLEDGE_FILE', 'knowledge/system_prompt.txt')).etag
+        ]
+        retrieval_settings = config.get('knowledge_retrieval', {})
+        if retrieval_settings.get('enabled'):
+            try:
+                parts.append(load_s3_object(retrieval_settings['s3_key']).etag)
+            except Exception:
+                parts.append('no-index')
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()[:32]
+    except Exception as e:
+        logger.warning(f"Could not determine prompt version for the FAQ cache: {str(e)}")
+        return None
+
+
+def load_entries(prompt_version: str, settings: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Unexpired cached answers of a prompt version, kept in memory between refreshes"""
+    now = time.monotonic()
+    cached = _entries.get(prompt_version)
+    if cached and now - cached['loaded_at'] < settings.get('refresh_seconds', DEFAULT_REFRESH_SECONDS):
+        return cached['entries']
+
+    entries = []
+    faq_table = get_table(os.environ['FAQ_ANSWER_CACHE_TABLE'])
+    query_kwargs = {
+        'KeyConditionExpression': 'prompt_version = :prompt_version',
+        'FilterExpression': 'expires_at > :now',
+        'ExpressionAttributeValues': {':prompt_version': prompt_version, ':now': int(time.time())}
+    }
+    max_entries = settings.get('max_entries', DEFAULT_MAX_ENTRIES)
+    while len(entries) < max_entries:
+        response = faq_table.query(**query_kwargs)
+        for item in response['Items']:
+            entries.append({
+                'question': item['question'],
+                'vector': vectorize(item['question']),
+                'messages': list(item['messages']),
+                'expires_at': int(item['expires_at'])
+            })
+        if not response.get('LastEvaluatedKey'):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    # Entries of older prompt versions are never read again
+    _entries.clear()
+    _entries[prompt_version] = {'loaded_at': now, 'entries': entries[:max_entries]}
+    return _entries[prompt_version]['entries']
+
+
+def log_cache_stats(outcome: str):
+    """Log the lookup outcome and the container-wide hit rate"""
+    lookups = cache_stats['lookups']
+    hits = cache_stats['hits']
+    logger.info(f"FAQ answer cache: {outcome} | hit rate {hits / lookups if lookups else 0.0:.1%} ({hits}/{lookups})")
+
+
+def find_cached_answer(message_body: str, prompt_version: str, settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Most similar cached question of the prompt version (cosine of the hashed
+    n-gram vectors). Returns {question, similarity, messages} when it reaches
+    similarity_threshold, else None. Failures are treated as misses.
+    """
+    cache_stats['lookups'] += 1
+    try:
+        vector = vectorize(message_body)
+        now = time.time()
+        best, best_similarity = None, 0.0
+        for entry in load_entries(prompt_version, settings):
+            if entry['expires_at'] <= now:
+                continue
+            similarity = cosine_similarity(vector, entry['vector'])
+            if similarity > best_similarity:
+                best, best_similarity = entry, similarity
+    except Exception as e:
+        logger.warning(f"Could not read FAQ answer cache: {str(e)}")
+        log_cache_stats('error')
+        return None
+
+    if best is None or best_similarity < settings.get('similarity_threshold', DEFAULT_SIMILARITY_THRESHOLD):
+        log_cache_stats(f"miss (best similarity {best_similarity:.2f})")
+        return None
+
+    cache_stats['hits'] += 1
+    log_cache_stats(f"hit {best_similarity:.2f} for {best['question'][:60]!r}")
+    return {'question': best['question'], 'similarity': best_similarity, 'messages': best['messages']}
+
+
+def store_answer(message_body: str, messages: List[str], prompt_version: str, settings: Dict[str, Any]):
+    """Cache the reply to a first-turn question without failing the caller"""
+    expires_at = int(time.time() + settings.get('ttl_hours', DEFAULT_TTL_HOURS) * 3600)
+    try:
+        faq_table = get_table(os.environ['FAQ_ANSWER_CACHE_TABLE'])
+        faq_table.put_item(Item={
+            'prompt_version': prompt_version,
+            'question_hash': message_hash(message_body),
+            'question': message_body,
+            'messages': messages,
+            'created_at': datetime.now().isoformat(),
+            'expires_at': expires_at
+        })
+    except Exception as e:
+        logger.warning(f"Could not store FAQ answer: {str(e)}")
+        return
+
+    cached = _entries.get(prompt_version)
+    if cached is not None and len(cached['entries']) < settings.get('max_entries', DEFAULT_MAX_ENTRIES):
+        cached['entries'].append({
+            'question': message_body,
+            'vector': vectorize(message_body),
+            'messages': messages,
+            'expires_at': expires_at
+        })
@@ -8,7 +8,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from handlers_aux import (
     NormalizedInputMessage, 
-    start_step_function_execution, 
+    dispatch_message, 
     get_platform_success_response,
     get_platform_error_response,
     handle_webhook_error
@@ -42,8 +42,8 @@ def lambda_handler(event, context):
         
         logger.info(f"Normalized Chat message: From={normalized_message.From}")
         
-        # Start Step Functions execution
-        start_step_function_execution(normalized_message, context)
+        # Start pipeline execution (Step Functions or fused)
+        dispatch_message(normalized_message, context)
         
         return get_platform_success_response('chat')
         
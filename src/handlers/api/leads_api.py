@@ -1,22 +1,32 @@
 import json
 import os
+import sys
 import uuid
+from collections import Counter
 from datetime import datetime
-import boto3
 from botocore.exceptions import ClientError
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from aws_clients import get_table
+from lead_import import import_leads
+from lead_store import (
+    MAX_CONTACT_METHODS_PER_TRANSACTION,
+    ContactMethodExistsError,
+    create_contact_methods as store_contact_methods,
+    get_contact_method_owner,
+    make_type_value,
+    validate_contact_method
+)
 
 # Get table names from environment variables
 LEADS_TABLE = os.environ['LEADS_TABLE']
-CONTACT_METHODS_TABLE = os.environ['CONTACT_METHODS_TABLE']
-CONTACT_METHOD_SETTINGS_TABLE = os.environ['CONTACT_METHOD_SETTINGS_TABLE']
 
 # Initialize tables
-leads_table = dynamodb.Table(LEADS_TABLE)
-contact_methods_table = dynamodb.Table(CONTACT_METHODS_TABLE)
-contact_method_settings_table = dynamodb.Table(CONTACT_METHOD_SETTINGS_TABLE)
+leads_table = get_table(LEADS_TABLE)
+
+# Leads per bulk request (an array body), so a request finishes within the API Gateway timeout
+MAX_BULK_LEADS = 1000
 
 def create_response(status_code, body, headers=None):
     """Create standardized API response"""
@@ -36,38 +46,17 @@ def create_response(status_code, body, headers=None):
         'body': json.dumps(body)
     }
 
-def validate_contact_method(contact_method):
-    """Validate contact method data"""
-    required_fields = ['type', 'value']
-    
-    for field in required_fields:
-        if field not in contact_method:
-            return f"Missing required field: {field}"
-    
-    valid_types = ['phone', 'email', 'other']
-    if contact_method['type'] not in valid_types:
-        return f"Invalid contact method type. Must be one of: {', '.join(valid_types)}"
-    
-    if not contact_method['value'].strip():
-        return "Contact method value cannot be empty"
-    
-    return None
-
 def check_contact_method_exists(contact_type, value):
-    """Check if contact method already exists"""
-    type_value = f"{contact_type}#{value}"
+    """Check if contact method already exists (strongly consistent guard read)"""
+    type_value = make_type_value(contact_type, value.strip())
     
     try:
-        response = contact_methods_table.query(
-            IndexName='type-value-index',
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('type_value').eq(type_value)
-        )
-        return len(response['Items']) > 0
+        return get_contact_method_owner(type_value) is not None
     except ClientError:
         return False
 
-def create_lead(lead_data):
-    """Create a new lead"""
+def build_lead(lead_data):
+    """Build a new lead item (written together with its contact methods)"""
     lead_id = str(uuid.uuid4())
     timestamp = datetime.utcnow().isoformat()
     
@@ -79,45 +68,51 @@ def create_lead(lead_data):
         'updated_at': timestamp
     }
     
-    leads_table.put_item(Item=lead_item)
     return lead_id, lead_item
 
+def create_contact_methods(lead_id, contact_methods_data, lead_item=None):
+    """
+    Create contact methods (the first one primary), and the lead if lead_item
+    is given, in one transaction. Raises ContactMethodExistsError if any of
+    them already exists, in which case nothing is written.
+    """
+    created = store_contact_methods(
+        lead_id,
+        [
+            {'type': data['type'], 'value': data['value'].strip(), 'is_primary': i == 0}
+            for i, data in enumerate(contact_methods_data)
+        ],
+        lead_item=lead_item,
+        timestamp=datetime.utcnow().isoformat()
+    )
+    return [(item['contact_method']['id'], item['contact_method'], item['settings']) for item in created]
+
 def create_contact_method(lead_id, contact_method_data, is_primary=False):
     """Create a new contact method"""
-    contact_method_id = str(uuid.uuid4())
-    timestamp = datetime.utcnow().isoformat()
-    
-    contact_type = contact_method_data['type']
-    value = contact_method_data['value'].strip()
-    type_value = f"{contact_type}#{value}"
-    
-    # Create contact method
-    contact_method_item = {
-        'id': contact_method_id,
-        'lead_id': lead_id,
-        'type': contact_type,
-        'value': value,
-        'type_value': type_value,
-        'created_at': timestamp,
-        'updated_at': timestamp
-    }
-    
-    contact_methods_table.put_item(Item=contact_method_item)
-    
-    # Create contact method settings
-    settings_id = str(uuid.uuid4())
-    settings_item = {
-        'id': settings_id,
-        'contact_method_id': contact_method_id,
-        'is_primary': is_primary,
-        'is_active': True,
-        'created_at': timestamp,
-        'updated_at': timestamp
-    }
-    
-    contact_method_settings_table.put_item(Item=settings_item)
-    
-    return contact_method_id, contact_method_item, settings_item
+    created = store_contact_methods(
+        lead_id,
+        [{'type': contact_method_data['type'], 'value': contact_method_data['value'].strip(), 'is_primary': is_primary}],
+        timestamp=datetime.utcnow().isoformat()
+    )
+    return created[0]['contact_method']['id'], created[0]['contact_method'], created[0]['settings']
+
+def import_bulk(rows):
+    """Bulk mode: import an array of leads and report a result per row"""
+    if not rows:
+        return create_response(400, {'error': 'At least one lead is required'})
+    
+    if len(rows) > MAX_BULK_LEADS:
+        return create_response(400, {'error': f"At most {MAX_BULK_LEADS} leads per request"})
+    
+    results = import_leads(rows)
+    summary = Counter(result['status'] for result in results)
+    
+    return create_response(200, {
+        'success': summary['error'] == 0,
+        'summary': dict(summary),
+        'results': results,
+        'total_leads': len(rows)
+    })
 
 def lambda_handler(event, context):
     """Main Lambda handler for leads API"""
@@ -133,6 +128,10 @@ def lambda_handler(event, context):
         # Parse request body
         body = json.loads(event.get('body', '{}'))
         
+        # An array of leads is a bulk import
+        if isinstance(body, list):
+            return import_bulk(body)
+        
         # Validate required fields
         if 'contact_methods' not in body or not isinstance(body['contact_methods'], list):
             return create_response(400, {
@@ -152,6 +151,16 @@ def lambda_handler(event, context):
                     'error': f"Contact method {i + 1}: {validation_error}"
                 })
         
+        if len(body['contact_methods']) > MAX_CONTACT_METHODS_PER_TRANSACTION:
+            return create_response(400, {
+                'error': f"At most {MAX_CONTACT_METHODS_PER_TRANSACTION} contact methods per request"
+            })
+        
+        # The same contact method twice in one request
+        type_values = [make_type_value(cm['type'], cm['value'].strip()) for cm in body['contact_methods']]
+        if len(set(type_values)) < len(type_values):
+            return create_response(400, {'error': 'Duplicate contact methods in request'})
+        
         # Check for duplicate contact methods
         for contact_method in body['contact_methods']:
             if check_contact_method_exists(contact_method['type'], contact_method['value']):
@@ -160,6 +169,7 @@ def lambda_handler(event, context):
                 })
         
         lead_id = body.get('lead_id')
+        new_lead_item = None
         
         # If lead_id is provided, verify it exists
         if lead_id:
@@ -171,35 +181,29 @@ def lambda_handler(event, context):
             except ClientError as e:
                 return create_response(500, {'error': f'Error retrieving lead: {str(e)}'})
         else:
-            # Create new lead
-            try:
-                lead_id, lead_item = create_lead(body)
-            except ClientError as e:
-                return create_response(500, {'error': f'Error creating lead: {str(e)}'})
+            # New lead, written in the same transaction as its contact methods
+            lead_id, lead_item = build_lead(body)
+            new_lead_item = lead_item
         
-        # Create contact methods
-        created_contact_methods = []
+        # Create contact methods (first one is primary by default): all or none
+        try:
+            created = create_contact_methods(lead_id, body['contact_methods'], lead_item=new_lead_item)
+        except ContactMethodExistsError as e:
+            # Created concurrently since the check above
+            return create_response(409, {'error': f"Contact method {e.type_value.replace('#', ':', 1)} already exists"})
+        except ClientError as e:
+            return create_response(500, {'error': f'Error creating contact methods: {str(e)}'})
         
-        for i, contact_method_data in enumerate(body['contact_methods']):
-            try:
-                # First contact method is primary by default
-                is_primary = (i == 0)
-                contact_method_id, contact_method_item, settings_item = create_contact_method(
-                    lead_id, contact_method_data, is_primary
-                )
-                
-                created_contact_methods.append({
-                    'id': contact_method_id,
-                    'type': contact_method_item['type'],
-                    'value': contact_method_item['value'],
-                    'is_primary': is_primary,
-                    'is_active': True
-                })
-                
-            except ClientError as e:
-                return create_response(500, {
-                    'error': f'Error creating contact method {i + 1}: {str(e)}'
-                })
+        created_contact_methods = [
+            {
+                'id': contact_method_id,
+                'type': contact_method_item['type'],
+                'value': contact_method_item['value'],
+                'is_primary': settings_item['is_primary'],
+                'is_active': True
+            }
+            for contact_method_id, contact_method_item, settings_item in created
+        ]
         
         # Prepare response
         response_data = {
@@ -1,14 +1,16 @@
 import yaml
 import logging
-import boto3
 import os
 import sys
-from datetime import datetime, timedelta
 
 # Add the src directory to Python path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from aux import load_business_config
+from aws_clients import get_table
+from spam_windows import evaluate_message_windows, evaluate_spam_windows
+from message_counters import evaluate_counter_windows
+from lead_reputation import is_trusted_lead
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -16,27 +18,19 @@ logger.setLevel(logging.INFO)
 def check_message_limits_spam(activities_table, lead_id, config):
     """
     Check if user exceeds message limits for any configured time period.
+    Counts come from the per-day message counters or, by default, from a
+    single paginated query over the lead's activities.
     Returns True if spam detected, False otherwise.
     """
     message_limits = config['spam_detection']['message_limits']
     warning_threshold_offset = config['spam_detection']['warning_threshold_offset']
     
-    for days, max_messages in message_limits:
-        # Calculate the start date for this period
-        start_date = (datetime.now() - timedelta(days=days)).date().isoformat()
-        
-        # Query activities for this period
-        activities_response = activities_table.query(
-            IndexName='lead-id-created-at-index',
-            KeyConditionExpression='lead_id = :lead_id AND created_at >= :start_date',
-            ExpressionAttributeValues={
-                ':lead_id': lead_id,
-                ':start_date': start_date
-            }
-        )
-        
-        message_count = len(activities_response['Items'])
-        
+    if config['spam_detection'].get('message_count_source') == 'counters':
+        message_windows = evaluate_counter_windows(lead_id, message_limits)
+    else:
+        message_windows = evaluate_message_windows(activities_table, lead_id, message_limits)
+    
+    for days, max_messages, message_count in message_windows:
         # Check if limit exceeded
         if message_count >= max_messages:
             logger.info(f"Lead {lead_id} marked as spammer: {message_count} messages in last {days} days (limit: {max_messages})")
@@ -51,24 +45,12 @@ def check_message_limits_spam(activities_table, lead_id, config):
 def check_spam_activities_limits(spam_activities_table, lead_id, config):
     """
     Check if user exceeds spam activities limits for any configured time period.
+    All periods are evaluated from a single paginated query.
     Returns True if spam detected, False otherwise.
     """
     spam_activities_limits = config['spam_detection']['spam_activities_limits']
     
-    for days, max_spam_activities in spam_activities_limits:
-        # Calculate the start date for this period
-        lookback_days_ago = (datetime.now() - timedelta(days=days)).isoformat()
-        spam_response = spam_activities_table.query(
-            IndexName='lead-id-spam-date-index',
-            KeyConditionExpression='lead_id = :lead_id AND spam_date >= :date',
-            ExpressionAttributeValues={
-                ':lead_id': lead_id,
-                ':date': lookback_days_ago
-            }
-        )
-        
-        spam_count = len(spam_response['Items'])
-        
+    for days, max_spam_activities, spam_count in evaluate_spam_windows(spam_activities_table, lead_id, spam_activities_limits):
         # Check if limit exceeded
         if spam_count >= max_spam_activities:
             logger.info(f"Lead {lead_id} marked as spammer: {spam_count} spam activities in last {days} days (limit: {max_spam_activities})")
@@ -82,6 +64,8 @@ def lambda_handler(event, context):
     """
     Lambda function to check spammer status for an existing lead.
     Lead must already exist (validated/created in previous lambda).
+    Trusted leads (reputation above the configured threshold) get
+    skip_spam_detection so the DetectSpam stage is not run for them.
     """
     
     try:
@@ -92,10 +76,9 @@ def lambda_handler(event, context):
         
         logger.info(f"Checking spam status for lead_id: {lead_id}")
         
-        # DynamoDB client
-        dynamodb = boto3.resource('dynamodb')
-        spam_activities_table = dynamodb.Table(os.environ['SPAM_ACTIVITIES_TABLE'])
-        activities_table = dynamodb.Table(os.environ['ACTIVITIES_TABLE'])
+        # DynamoDB tables
+        spam_activities_table = get_table(os.environ['SPAM_ACTIVITIES_TABLE'])
+        activities_table = get_table(os.environ['ACTIVITIES_TABLE'])
         
         config = load_business_config()
         
@@ -106,12 +89,17 @@ def lambda_handler(event, context):
         if not is_spammer:
             is_spammer = check_message_limits_spam(activities_table, lead_id, config)
         
-        logger.info(f"Spammer status: {is_spammer}")
+        # Message limits still apply to trusted leads; only the AI spam check is skipped
+        skip_spam_detection = not is_spammer and is_trusted_lead(lead_id, config)
+        
+        logger.info(f"Spammer status: {is_spammer}, skip spam detection: {skip_spam_detection}")
         
         response_data = {
             'lead_id': lead_id,
             'contact_method_id': contact_method_id,
             'is_spammer': is_spammer,
+            'skip_spam_detection': skip_spam_detection,
+            'new_lead': event.get('new_lead', False),
             'flow_input': flow_input
         }
         
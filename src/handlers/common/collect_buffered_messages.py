@@ -0,0 +1,50 @@
+import logging
+import os
+import sys
+
+# Add the src directory to Python path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from aux import load_business_config
+from message_buffer import collect_buffered_messages, merge_buffered_messages
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def lambda_handler(event, context):
+    """
+    Lambda function to collect a debounced burst of messages after its window.
+    Merges every buffered message of the sender into a single flow_input,
+    or stops execution if another run already collected them.
+    """
+
+    try:
+        buffer_key = event['debounce']['buffer_key']
+
+        messages = collect_buffered_messages(buffer_key)
+
+        if not messages:
+            logger.info(f"No buffered messages for {buffer_key}, already collected by another run")
+            return {
+                'action': 'stop',
+                'reason': 'already_collected'
+            }
+
+        config = load_business_config()
+        separator = config.get('message_debounce', {}).get('separator', '\n')
+
+        flow_input = merge_buffered_messages(messages, separator)
+
+        logger.info(f"Collected {len(messages)} buffered message(s) for {buffer_key}")
+
+        return {
+            'action': 'continue',
+            'flow_input': flow_input
+        }
+
+    except Exception as e:
+        logger.error(f"Error collecting buffered messages: {str(e)}")
+        return {
+            'action': 'error',
+            'error': str(e)
+        }
@@ -1,15 +1,20 @@
 import yaml
 import json
 import logging
-import boto3
 import os
 import sys
+import time
 from botocore.exceptions import ClientError
 
 # Add the src directory to Python path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from aux import load_business_config
+from aws_clients import get_bedrock_runtime
+from spam_heuristics import classify_message
+from spam_campaign_index import find_spam_campaign
+from spam_verdict_cache import get_cached_verdict, record_bedrock_latency, store_verdict
+from model_router import record_route_metrics, select_route
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -17,7 +22,10 @@ logger.setLevel(logging.INFO)
 def lambda_handler(event, context):
     """
     Lambda function to check if message is spam using Bedrock.
-    Uses Claude/other model to analyze message content.
+    Obvious cases are decided by local heuristics, near-duplicates of known spam
+    campaigns by the campaign index and repeated texts reuse a cached verdict;
+    other messages are analyzed by Claude/other model.
+    The deciding path is reported in spam_decided_by.
     """
     
     try:
@@ -34,81 +42,71 @@ def lambda_handler(event, context):
         # If already flagged as spammer, skip AI check
         if is_existing_spammer:
             logger.info("User already flagged as spammer, skipping AI check")
+            logger.info("Spam decision path: existing_spammer")
             return {
                 'is_spam': True,
                 'spam_reason': 'existing_spammer',
                 'confidence': 1.0,
+                'spam_decided_by': 'existing_spammer',
                 **input_data
             }
         
-        # Initialize Bedrock client - USE CORRECT REGION!
-        # Get region from environment or default to eu-west-1
-        aws_region = os.environ.get('AWS_REGION', 'eu-west-1')
-        
-        bedrock_runtime = boto3.client(
-            service_name='bedrock-runtime',
-            region_name=aws_region
-        )
-        
-        # Prepare the prompt for spam detection
-        spam_detection_prompt = f"""
-        Analyze the following message and determine if it's spam, meaningless, or a legitimate conversation message.
-
-        Message: "{message_body}"
-
-        Consider the message spam if it:
-        - Contains repetitive meaningless text
-        - Has promotional content without context
-        - Contains suspicious links or requests
-        - Is clearly automated or bot-generated
-        - Has no conversational value
-
-        Respond with a JSON object containing:
-        - "is_spam": true/false
-        - "confidence": 0.0-1.0 (confidence level)
-        - "reason": brief explanation
-
-        Example response: {{"is_spam": true, "confidence": 0.9, "reason": "repetitive meaningless text"}}
-        """
-        
         config = load_business_config()
-        # Prepare the request body for Claude
-        body = {
-            "anthropic_version": config['ai_models']['bedrock_version'],
-            "max_tokens": config['ai_models']['max_tokens_spam_detection'],
-            "messages": [
-                {
-                    "role": "user",
-                    "content": spam_detection_prompt
-                }
-            ]
-        }
-        
-        # Call Bedrock
-        response = bedrock_runtime.invoke_model(
-            body=json.dumps(body),
-            modelId=config['ai_models']['bedrock_model_id'],
-            accept='application/json',
-            contentType='application/json'
-        )
         
-        # Parse response
-        response_body = json.loads(response.get('body').read())
-        ai_response = response_body.get('content', [{}])[0].get('text', '')
+        # Decide obvious spam/ham locally before calling Bedrock
+        heuristic_rules = config['spam_detection'].get('heuristics', {})
+        if heuristic_rules.get('enabled'):
+            local_verdict = classify_message(message_body, heuristic_rules)
+            if local_verdict:
+                logger.info(f"Spam decision path: heuristic, is_spam={local_verdict['is_spam']} ({local_verdict['reason']})")
+                return {
+                    'is_spam': local_verdict['is_spam'],
+                    'spam_reason': local_verdict['reason'],
+                    'confidence': local_verdict['confidence'],
+                    'spam_decided_by': 'heuristic',
+                    **input_data
+                }
         
-        logger.info(f"Bedrock response: {ai_response}")
+        # Near-duplicates of known spam campaigns sent from many numbers
+        campaign_settings = config['spam_detection'].get('campaign_index', {})
+        if campaign_settings.get('enabled'):
+            campaign_match = find_spam_campaign(message_body, campaign_settings)
+            if campaign_match:
+                logger.info(f"Spam decision path: campaign_index, cluster {campaign_match['cluster_id']} "
+                            f"({campaign_match['leads']} leads, similarity {campaign_match['similarity']:.2f})")
+                return {
+                    'is_spam': True,
+                    'spam_reason': f"spam campaign {campaign_match['cluster_id']}",
+                    'confidence': campaign_settings.get('confidence', 0.9),
+                    'spam_decided_by': 'campaign_index',
+                    **input_data
+                }
         
-        # Parse AI response
-        try:
-            spam_analysis = json.loads(ai_response)
-            is_spam = spam_analysis.get('is_spam', False)
-            confidence = spam_analysis.get('confidence', 0.5)
-            reason = spam_analysis.get('reason', 'AI analysis')
-        except:
-            # Fallback parsing if JSON is malformed
-            is_spam = 'true' in ai_response.lower() and 'spam' in ai_response.lower()
-            confidence = config['spam_detection']['fallback_confidence']
-            reason = 'AI analysis with fallback parsing'
+        # Model for this message (ai_models.routing), then reuse the verdict of an identical (normalized) message
+        route = select_route('spam_detection', message_body, config)
+        model_id = route['model_id']
+        verdict_cache_settings = config['spam_detection'].get('verdict_cache', {})
+        cached_verdict = None
+        if verdict_cache_settings.get('enabled'):
+            cached_verdict = get_cached_verdict(message_body, model_id, verdict_cache_settings)
+        
+        if cached_verdict:
+            is_spam = cached_verdict['is_spam']
+            confidence = cached_verdict['confidence']
+            reason = cached_verdict['reason']
+            ai_response = cached_verdict['ai_response']
+            decided_by = 'verdict_cache'
+        else:
+            is_spam, confidence, reason, ai_response, parsed = analyze_with_bedrock(message_body, config, route)
+            decided_by = 'bedrock'
+            # Verdicts from fallback parsing are not reliable enough to reuse
+            if parsed and verdict_cache_settings.get('enabled'):
+                store_verdict(message_body, model_id, {
+                    'is_spam': is_spam,
+                    'confidence': confidence,
+                    'reason': reason,
+                    'ai_response': ai_response
+                }, verdict_cache_settings)
         
         # Check confidence threshold
         ai_confidence_threshold = config['spam_detection']['ai_confidence_threshold']
@@ -118,6 +116,7 @@ def lambda_handler(event, context):
             reason = f"Low confidence: {reason}"
         
         logger.info(f"Spam detection result: {is_spam}, confidence: {confidence}")
+        logger.info(f"Spam decision path: {decided_by}")
         
         # Prepare response
         response_data = {
@@ -125,6 +124,7 @@ def lambda_handler(event, context):
             'spam_reason': reason,
             'confidence': confidence,
             'ai_response': ai_response,
+            'spam_decided_by': decided_by,
             **input_data
         }
         
@@ -137,6 +137,7 @@ def lambda_handler(event, context):
             'is_spam': False,
             'spam_reason': 'bedrock_error',
             'confidence': 0.0,
+            'spam_decided_by': 'bedrock_error',
             'error': str(e),
             **input_data
         }
@@ -147,3 +148,79 @@ def lambda_handler(event, context):
             'action': 'error',
             'error': str(e)
         }
+
+def analyze_with_bedrock(message_body, config, route):
+    """
+    Ask the route's model whether the message is spam.
+    Returns (is_spam, confidence, reason, ai_response, parsed) where parsed is
+    False when the response was not valid JSON and fallback parsing was used.
+    """
+    # Bedrock client for the function's region (default eu-west-1)
+    bedrock_runtime = get_bedrock_runtime()
+    
+    # Prepare the prompt for spam detection
+    spam_detection_prompt = f"""
+    Analyze the following message and determine if it's spam, meaningless, or a legitimate conversation message.
+
+    Message: "{message_body}"
+
+    Consider the message spam if it:
+    - Contains repetitive meaningless text
+    - Has promotional content without context
+    - Contains suspicious links or requests
+    - Is clearly automated or bot-generated
+    - Has no conversational value
+
+    Respond with a JSON object containing:
+    - "is_spam": true/false
+    - "confidence": 0.0-1.0 (confidence level)
+    - "reason": brief explanation
+
+    Example response: {{"is_spam": true, "confidence": 0.9, "reason": "repetitive meaningless text"}}
+    """
+    
+    # Prepare the request body for Claude
+    body = {
+        "anthropic_version": config['ai_models']['bedrock_version'],
+        "max_tokens": route['max_tokens'],
+        "messages": [
+            {
+                "role": "user",
+                "content": spam_detection_prompt
+            }
+        ]
+    }
+    
+    # Call Bedrock
+    started = time.perf_counter()
+    response = bedrock_runtime.invoke_model(
+        body=json.dumps(body),
+        modelId=route['model_id'],
+        accept='application/json',
+        contentType='application/json'
+    )
+    
+    # Parse response
+    response_body = json.loads(response.get('body').read())
+    ai_response = response_body.get('content', [{}])[0].get('text', '')
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    record_bedrock_latency(elapsed_ms)
+    record_route_metrics('spam_detection', route, elapsed_ms, response_body.get('usage'))
+    
+    logger.info(f"Bedrock response: {ai_response}")
+    
+    # Parse AI response
+    try:
+        spam_analysis = json.loads(ai_response)
+        is_spam = spam_analysis.get('is_spam', False)
+        confidence = spam_analysis.get('confidence', 0.5)
+        reason = spam_analysis.get('reason', 'AI analysis')
+        parsed = True
+    except:
+        # Fallback parsing if JSON is malformed
+        is_spam = 'true' in ai_response.lower() and 'spam' in ai_response.lower()
+        confidence = config['spam_detection']['fallback_confidence']
+        reason = 'AI analysis with fallback parsing'
+        parsed = False
+    
+    return is_spam, confidence, reason, ai_response, parsed
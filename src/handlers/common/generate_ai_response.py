@@ -1,25 +1,53 @@
 import yaml
 import json
 import logging
-import boto3
 import os
 from datetime import datetime
 import uuid
 import sys
-import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Add the src directory to Python path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from aux import load_business_config
+from aux import load_business_config, load_s3_object
+from aws_clients import get_bedrock_runtime
+from message_counters import record_inbound_message
+from lead_reputation import record_legit_message
+from conversation_history import get_content_id, load_conversation_history
+from recent_messages import append_recent_message, get_lead_conversation, get_recent_messages_settings, to_conversation_history
+from conversation_summary import get_summary_settings, needs_refresh, request_summary_refresh, unsummarized_turns
+from prompt_budget import estimate_tokens, fit_newest, truncate_to_tokens
+from knowledge_index import load_knowledge_index, retrieve_system_prompt
+from reply_stream import OrderedDispatcher, stream_reply
+from faq_cache import find_cached_answer, get_prompt_version, is_cacheable_question, store_answer
+from model_router import record_route_metrics, select_route
+from message_segmentation import get_length_rules, segment_message
+from write_batch import WriteBatch, get_write_coalescing_settings
+from fanout import DEFAULT_MAX_WORKERS, PhaseTimer, fan_out, get_fanout_settings, submit, wait_all
+from transcript import compact_turns, estimate_messages_tokens, get_transcript_settings, render_lines, to_bedrock_messages
+from handlers.common.send_message import log_outbound_messages, send_platform_message
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Single thread sending streamed messages in order, reused across warm invocations
+dispatch_executor = ThreadPoolExecutor(max_workers=1)
+
 def lambda_handler(event, context):
     """
     Lambda function to handle normal (non-spam) messages.
     Uses Bedrock AI agent with knowledge base and conversation history.
+    If the event carries a speculative_reply (generated by the fused pipeline
+    while spam detection ran), that reply is used instead of calling Bedrock
+    and the side effects it deferred (summary refresh, FAQ cache store) are run.
+    With reply_streaming enabled for the platform the reply is streamed and
+    each message is sent as soon as it is complete; the send stage then only
+    reports what was dispatched.
+    With io_fanout enabled the inbound writes run concurrently with the reads
+    that precede the Bedrock call (or, with write_behind, alongside the Bedrock
+    call itself, awaited before returning). A per-phase timing breakdown is logged.
     """
     
     try:
@@ -30,137 +58,86 @@ def lambda_handler(event, context):
             
         lead_id = event.get('lead_id')
         contact_method_id = event.get('contact_method_id')
+        new_lead = event.get('new_lead', False)
         platform = flow_input['platform']
-        
-        clean_phone_number = flow_input.get('From', '')
         message_body = flow_input.get('Body', '')
-        message_sid = flow_input.get('MessageSid', '')
-        profile_name = flow_input.get('ProfileName', '')
-        original_to = flow_input.get('To', '')
+        speculative_reply = event.get('speculative_reply')
         
         logger.info(f"Processing normal message for lead {lead_id}: {message_body[:100]}")
         
-        # DynamoDB client
-        dynamodb = boto3.resource('dynamodb')
-        activities_table = dynamodb.Table(os.environ['ACTIVITIES_TABLE'])
-        activity_content_table = dynamodb.Table(os.environ['ACTIVITY_CONTENT_TABLE'])
-        
-        timestamp = datetime.now().isoformat()
-        
-        # Create inbound activity record BEFORE using Bedrock
+        timer = PhaseTimer(f"Normal message for lead {lead_id}")
+        config = timer.measure('config', load_business_config)
+        fanout_settings = get_fanout_settings(config)
+        timestamp = speculative_reply['timestamp'] if speculative_reply else datetime.now().isoformat()
         activity_id = str(uuid.uuid4())
-        activities_table.put_item(
-            Item={
-                'id': activity_id,
-                'lead_id': lead_id,
-                'contact_method_id': contact_method_id,
-                'activity_type': platform,
-                'status': 'completed',
-                'direction': 'inbound',
-                'completed_at': timestamp,
-                'created_at': timestamp,
-                'metadata': {
-                    'messageSid': message_sid,
-                    'profileName': profile_name,
-                    'messageType': 'text',
-                    'platform': platform
-                }
-            }
-        )
         
-        # Store inbound activity content BEFORE using Bedrock
-        activity_content_table.put_item(
-            Item={
-                'id': str(uuid.uuid4()),
-                'activity_id': activity_id,
-                'content_type': platform,
-                'content': {
-                    'leadMessage': message_body
-                },
-                'created_at': timestamp
+        # Store the inbound message BEFORE using Bedrock. With io_fanout the writes run
+        # concurrently with each other and with the reads of generate_reply (which then
+        # treats the message as pending); with write_behind also with the Bedrock call
+        writes = inbound_message_writes(lead_id, contact_method_id, flow_input, timestamp, config, activity_id)
+        inbound_writes = {}
+        pending_message = None
+        wait_for = {}
+        if fanout_settings.get('enabled'):
+            inbound_writes = {
+                name: submit(name, write, timer=timer, max_workers=fanout_settings.get('max_workers', DEFAULT_MAX_WORKERS))
+                for name, write in writes.items()
             }
-        )
-        
-        # Get conversation history
-        conversation_history = get_conversation_history(lead_id, platform)
-        
-        # Prepare conversation context for AI
-        conversation_context = f"""
-        Lead Information:
-        - Name: {profile_name}
-        - Phone: {clean_phone_number}
-        
-        Current Message: {message_body}
-        
-        Previous Conversations (JSON format): {json.dumps(conversation_history)}
-        """
-        
-        # Initialize Bedrock client
-        bedrock_runtime = boto3.client(
-            service_name='bedrock-runtime',
-            region_name=os.environ.get('AWS_REGION', 'eu-west-1')
-        )
-        
-        # Load system prompt from S3 or raise error
-        system_prompt = load_system_prompt_from_s3()
-        config = load_business_config()
-        
-        # Get platform-specific config or default
-        platform_config = config['reply_length'].get(platform, config['reply_length']['default'])
-        
-        if not system_prompt:
-            raise Exception("System prompt not found in S3")
-        system_prompt = f'''{system_prompt} 
-          ## CRITICAL RESPONSE RULES
-          - MAXIMUM {platform_config['max_response_characters']} characters per response - this is MANDATORY
-          - Use short sentences and abbreviations when needed
-        '''
-        
-        # Prepare the request for Bedrock
-        body = {
-            "anthropic_version": config['ai_models']['bedrock_version'],
-            "max_tokens": config['ai_models']['max_tokens_conversation'],
-            "system": system_prompt,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": conversation_context
-                }
-            ]
-        }
-        
-        # Call Bedrock AI
-        response = bedrock_runtime.invoke_model(
-            body=json.dumps(body),
-            modelId=config['ai_models']['bedrock_model_id'],
-            accept='application/json',
-            contentType='application/json'
-        )
-        
-        # Parse AI response
-        response_body = json.loads(response.get('body').read())
-        ai_response = response_body.get('content', [{}])[0].get('text', '')
-        
-        # Split message if it's too long (> N characters)
-        max_length = platform_config['character_limit_fallback']
-        ai_responses = split_message_by_stops(ai_response, max_length)
-        
-        logger.info(f"AI generated response: {ai_response}")
+            pending_message = {'timestamp': timestamp, 'lead_message': message_body, 'assistant_message': ''}
+            if not fanout_settings.get('write_behind'):
+                wait_for = inbound_writes
+        else:
+            for name, write in writes.items():
+                timer.measure(name, write)
+        
+        dispatched = None
+        try:
+            if speculative_reply:
+                logger.info(f"Using speculative reply generated during spam detection for lead {lead_id}")
+                ai_responses = speculative_reply['ai_responses']
+                conversation_history_count = speculative_reply['conversation_history_count']
+                run_deferred(lead_id, message_body, ai_responses, speculative_reply.get('deferred', {}), config)
+            elif platform in config.get('reply_streaming', {}).get('platforms', []) and config['reply_streaming'].get('enabled'):
+                ai_responses, conversation_history_count, dispatched = generate_and_dispatch(
+                    lead_id, contact_method_id, flow_input, activity_id, config, pending_message, timer, wait_for, new_lead
+                )
+            else:
+                ai_responses, conversation_history_count = generate_reply(
+                    lead_id, flow_input, config, pending_message, timer=timer, wait_for=wait_for, new_lead=new_lead
+                )
+        except Exception:
+            # The inbound message is stored even when the reply fails: let the writes
+            # finish before the error is returned (their own failures are logged by wait_all)
+            if inbound_writes:
+                try:
+                    wait_all(inbound_writes)
+                except Exception:
+                    pass
+            raise
+        
+        # Write-behind: the lambda must not return before the inbound message is stored
+        if inbound_writes:
+            wait_all(inbound_writes)
+        timer.log()
         
         response_data = {
             'action': 'message_processed',
+            'lead_id': lead_id,
+            'contact_method_id': contact_method_id,
             'activity_id': activity_id,
             'ai_response': ai_responses,
-            'conversation_history_count': len(conversation_history),
+            'conversation_history_count': conversation_history_count,
             'flow_input': flow_input,
             'send_message': {
                 'platform': platform,
-                'to': clean_phone_number,
+                'to': flow_input.get('From', ''),
                 'messages': ai_responses,
-                'from': original_to,
+                'from': flow_input.get('To', ''),
                 'answer_to_activity_id': activity_id
             }
         }
+        if dispatched:
+            response_data['send_message']['dispatched'] = dispatched
         
         logger.info(f"Normal message processed successfully for lead {lead_id}")
         
@@ -173,102 +150,423 @@ def lambda_handler(event, context):
             'error': str(e)
         }
 
-def split_message_by_stops(message, max_length):
+def generate_speculative_reply(event, context):
+    """
+    Generate the AI reply without storing anything, so it can run concurrently
+    with spam detection and be discarded if the message turns out to be spam.
+    The pending message is added to the history as if it had been stored.
+    The summary refresh and FAQ cache store are returned as deferred, run by
+    lambda_handler only if the reply is used.
+    """
+    
+    try:
+        flow_input = event['flow_input']
+        if isinstance(flow_input, str):
+            flow_input = yaml.safe_load(flow_input)
+        
+        timestamp = datetime.now().isoformat()
+        pending_message = {
+            'timestamp': timestamp,
+            'lead_message': flow_input.get('Body', ''),
+            'assistant_message': ''
+        }
+        deferred = {}
+        ai_responses, conversation_history_count = generate_reply(
+            event['lead_id'], flow_input, load_business_config(), pending_message,
+            new_lead=event.get('new_lead', False), deferred=deferred
+        )
+        
+        return {
+            'timestamp': timestamp,
+            'ai_responses': ai_responses,
+            'conversation_history_count': conversation_history_count,
+            'deferred': deferred
+        }
+        
+    except Exception as e:
+        logger.error(f"Error generating speculative reply: {str(e)}")
+        return {
+            'action': 'error',
+            'error': str(e)
+        }
+
+def inbound_message_writes(lead_id, contact_method_id, flow_input, timestamp, config, activity_id):
     """
-    Split a message into multiple parts by stops when it exceeds max_length.
-    Returns a list of messages.
+    The independent writes that store the inbound activity and its content and
+    update the counters, by name, to be run in any order or concurrently.
     """
-    if len(message) <= max_length:
-        return [message]
+    platform = flow_input['platform']
     
-    # Define stop patterns (sentence endings)
-    stop_patterns = ['. ', '! ', '? ', '.\n', '!\n', '?\n']
+    # Inbound activity record
+    activity_item = {
+        'id': activity_id,
+        'lead_id': lead_id,
+        'contact_method_id': contact_method_id,
+        'activity_type': platform,
+        'status': 'completed',
+        'direction': 'inbound',
+        'completed_at': timestamp,
+        'created_at': timestamp,
+        'metadata': {
+            'messageSid': flow_input.get('MessageSid', ''),
+            'profileName': flow_input.get('ProfileName', ''),
+            'messageType': 'text',
+            'platform': platform
+        }
+    }
     
-    messages = []
-    current_message = ""
+    # Inbound activity content
+    content_item = {
+        'id': get_content_id(activity_id),
+        'activity_id': activity_id,
+        'content_type': platform,
+        'content': {
+            'leadMessage': flow_input.get('Body', '')
+        },
+        'created_at': timestamp
+    }
     
-    # Split the message into sentences
-    sentences = re.split(r'([.!?])', message)
+    # Store both (in one transaction: the history expects every activity to have its content),
+    # and count the inbound message for spam limits and the lead reputation
+    records = WriteBatch(atomic=True, coalesce=get_write_coalescing_settings(config).get('enabled', False))
+    records.put(os.environ['ACTIVITIES_TABLE'], activity_item).put(os.environ['ACTIVITY_CONTENT_TABLE'], content_item)
+    return {
+        'activity_records': records.flush,
+        'message_counters': lambda: record_inbound_message(lead_id, timestamp, config),
+        'lead_reputation': lambda: record_legit_message(lead_id),
+        'recent_messages': lambda: append_recent_message(lead_id, timestamp, 'inbound', flow_input.get('Body', ''), config)
+    }
+
+def generate_and_dispatch(lead_id, contact_method_id, flow_input, activity_id, config, pending_message=None,
+                          timer=None, wait_for=None, new_lead=False):
+    """
+    Generate the reply with a streamed Bedrock call and send each message as
+    soon as it is complete, so the lead gets the first part of a long answer
+    before the rest has been generated. Sent messages are logged like in
+    send_message, all at once when the reply is complete.
+    Returns (reply parts, number of history entries used, dispatch summary).
+    """
+    platform = flow_input['platform']
+    send_data = {'platform': platform, 'to': flow_input.get('From', ''), 'from': flow_input.get('To', '')}
+    lead_data = {'lead_id': lead_id, 'contact_method_id': contact_method_id}
     
-    i = 0
-    while i < len(sentences):
-        part = sentences[i]
-        
-        # Reconstruct sentence with punctuation
-        if i + 1 < len(sentences) and sentences[i + 1] in ['.', '!', '?']:
-            part += sentences[i + 1]
-            i += 2
-        else:
-            i += 1
+    sent = []
+    
+    def send(message_body):
+        result = send_platform_message(platform, send_data['to'], message_body, send_data['from'])
+        if result.get('success'):
+            sent.append((result, message_body, datetime.now().isoformat()))
+        return result
+    
+    dispatcher = OrderedDispatcher(send, dispatch_executor)
+    try:
+        ai_responses, conversation_history_count = generate_reply(
+            lead_id, flow_input, config, pending_message, dispatcher.submit, timer, wait_for, new_lead
+        )
+    finally:
+        # Messages already handed over are sent (and logged) even if the stream broke afterwards
+        results = dispatcher.results()
+        log_outbound_messages(lead_data, send_data, sent, activity_id)
+    
+    logger.info(f"Streamed reply for lead {lead_id}: {len(results)} message(s), "
+                f"first sent after {dispatcher.first_sent_ms}ms")
+    
+    return ai_responses, conversation_history_count, {
+        'results': results,
+        'first_message_ms': dispatcher.first_sent_ms
+    }
+
+def generate_reply(lead_id, flow_input, config, pending_message=None, on_message=None, timer=None, wait_for=None,
+                   new_lead=False, deferred=None):
+    """
+    Generate the AI reply for the current message with Bedrock.
+    pending_message is the current message when it has not been stored yet
+    (or is being stored concurrently).
+    With on_message the reply is streamed and every message is passed to it
+    as soon as it is complete.
+    wait_for holds futures (the concurrent inbound writes) that must finish
+    before Bedrock is called. Phase times are recorded in timer.
+    new_lead is true when the lead was created by this message (get_or_create_lead).
+    With deferred (a dict) the summary refresh and the FAQ cache store are only
+    recorded in it, to be run by run_deferred once the reply is known to be used.
+    Returns (reply parts, number of history entries used).
+    """
+    platform = flow_input['platform']
+    clean_phone_number = flow_input.get('From', '')
+    message_body = flow_input.get('Body', '')
+    profile_name = flow_input.get('ProfileName', '')
+    
+    # Get platform-specific config or default
+    platform_config = config['reply_length'].get(platform, config['reply_length']['default'])
+    
+    owns_timer = timer is None
+    timer = timer or PhaseTimer(f"Reply generation for lead {lead_id}")
+    
+    # Get conversation history (turns not covered by the rolling summary) and the summary,
+    # while the knowledge files are fetched
+    fanout_settings = get_fanout_settings(config)
+    reads = {
+        'history': lambda: get_conversation_history(lead_id, platform),
+        'knowledge_prefetch': lambda: prefetch_knowledge(config)
+    }
+    if fanout_settings.get('enabled'):
+        reads = fan_out(reads, timer, fanout_settings.get('max_workers', DEFAULT_MAX_WORKERS))
+    else:
+        reads = {name: timer.measure(name, read) for name, read in reads.items()}
+    conversation_history, summary = reads['history']
+    if pending_message:
+        # A concurrently stored copy of the pending message may already be in the history
+        conversation_history = [pending_message] + [
+            turn for turn in conversation_history
+            if (turn.get('timestamp'), turn.get('lead_message')) != (pending_message['timestamp'], pending_message['lead_message'])
+        ][:platform_config['conversation_history_limit'] - 1]
+    
+    # Fold old turns into the summary asynchronously once enough have accumulated
+    summary_settings = get_summary_settings(config)
+    summary_refresh = bool(summary_settings.get('enabled')) and needs_refresh(len(conversation_history), summary_settings)
+    if deferred is not None:
+        deferred['summary_refresh'] = summary_refresh
+    elif summary_refresh:
+        request_summary_refresh(lead_id)
+    
+    # Reuse the reply to a near-identical first-turn question instead of calling Bedrock
+    faq_settings = config.get('faq_cache', {})
+    faq_version = None
+    faq_route = None
+    if (faq_settings.get('enabled') and not summary and is_first_turn(new_lead, conversation_history)
+            and is_cacheable_question(message_body, faq_settings)):
+        faq_route = select_route('conversation', message_body, config, len(conversation_history))
+        faq_version = get_prompt_version(config, platform, faq_route)
+        cached_answer = timer.measure('faq_cache', find_cached_answer, message_body, faq_version, faq_settings) if faq_version else None
+        if cached_answer:
+            if on_message:
+                for message in cached_answer['messages']:
+                    on_message(message)
+            if owns_timer:
+                timer.log()
+            return cached_answer['messages'], len(conversation_history)
+    
+    # Bedrock client
+    bedrock_runtime = get_bedrock_runtime()
+    
+    # Relevant knowledge sections plus the fixed persona/rules, or the whole system prompt from S3
+    system_prompt = timer.measure('system_prompt', get_system_prompt, message_body, conversation_history, config)
+    
+    if not system_prompt:
+        raise Exception("System prompt not found in S3")
+    system_prompt = f'''{system_prompt} 
+      ## CRITICAL RESPONSE RULES
+      - MAXIMUM {platform_config['max_response_characters']} characters per response - this is MANDATORY
+      - Use short sentences and abbreviations when needed
+    '''
+    
+    # Prepare conversation messages for AI (compact transcript), within the prompt token budget
+    messages, conversation_history = build_conversation_context(
+        profile_name, clean_phone_number, message_body, conversation_history, summary,
+        system_prompt, summary_settings.get('prompt_token_budget'), get_transcript_settings(config)
+    )
+    
+    # Model and max_tokens for this message (ai_models.routing)
+    route = select_route('conversation', message_body, config, len(conversation_history))
+    
+    # Prepare the request for Bedrock
+    body = {
+        "anthropic_version": config['ai_models']['bedrock_version'],
+        "max_tokens": route['max_tokens'],
+        "system": system_prompt,
+        "messages": messages
+    }
+    
+    # Split the reply into messages following the platform's length rules
+    length_rules = get_length_rules(platform, config)
+    
+    # The inbound message must be stored before the reply is generated
+    if wait_for:
+        wait_started = time.perf_counter()
+        wait_all(wait_for)
+        timer.record('inbound_writes_wait', (time.perf_counter() - wait_started) * 1000)
+    
+    started = time.perf_counter()
+    if on_message:
+        # Stream the reply, segmenting it into messages as tokens arrive
+        response = bedrock_runtime.invoke_model_with_response_stream(
+            body=json.dumps(body),
+            modelId=route['model_id'],
+            accept='application/json',
+            contentType='application/json'
+        )
+        usage = {}
+        ai_responses = stream_reply(response, length_rules, on_message, usage)
+        ai_response = ' '.join(ai_responses)
+    else:
+        # Call Bedrock AI
+        response = bedrock_runtime.invoke_model(
+            body=json.dumps(body),
+            modelId=route['model_id'],
+            accept='application/json',
+            contentType='application/json'
+        )
         
-        # Check if adding this part would exceed max_length
-        if len(current_message + part) > max_length:
-            if current_message:
-                messages.append(current_message.strip())
-                current_message = part
-            else:
-                # Single part is too long, force split by characters
-                messages.append(part[:max_length])
-                current_message = part[max_length:]
+        # Parse AI response
+        response_body = json.loads(response.get('body').read())
+        usage = response_body.get('usage')
+        ai_response = response_body.get('content', [{}])[0].get('text', '')
+        ai_responses = segment_message(ai_response, length_rules['max_length'], length_rules['unit'])
+    timer.record('bedrock', (time.perf_counter() - started) * 1000)
+    record_route_metrics('conversation', route, (time.perf_counter() - started) * 1000, usage)
+    
+    logger.info(f"AI generated response: {ai_response}")
+    
+    # Replies addressing the lead by name are not reusable for other leads, nor are
+    # replies from another route than the one the FAQ version was computed for
+    first_name = profile_name.split()[0].casefold() if profile_name.strip() else ''
+    if (faq_version and route == faq_route and ai_responses
+            and not (len(first_name) > 2 and first_name in ai_response.casefold())):
+        if deferred is not None:
+            deferred['faq_version'] = faq_version
         else:
-            current_message += part
+            store_answer(message_body, ai_responses, faq_version, faq_settings)
+    
+    if owns_timer:
+        timer.log()
+    return ai_responses, len(conversation_history)
+
+def run_deferred(lead_id, message_body, ai_responses, deferred, config):
+    """Run the side effects generate_reply recorded in deferred (summary refresh, FAQ cache store)"""
+    if deferred.get('summary_refresh'):
+        request_summary_refresh(lead_id)
+    if deferred.get('faq_version') and ai_responses:
+        store_answer(message_body, ai_responses, deferred['faq_version'], config.get('faq_cache', {}))
+
+def is_first_turn(new_lead, conversation_history):
+    """
+    The lead was created by this message and has no assistant reply yet.
+    The history length alone can't tell: a returning lead's recent_messages
+    buffer may hold only the current message.
+    """
+    return bool(new_lead) and not any(turn.get('assistant_message') for turn in conversation_history)
+
+def build_conversation_context(profile_name, phone, message_body, conversation_history, summary,
+                               system_prompt, token_budget=None, transcript_settings=None):
+    """
+    Build the Bedrock messages of the prompt: the lead's details, summary and
+    current message, with the history as a compact transcript (transcript
+    format 'lines') or as alternating user/assistant messages ('messages').
+    The history is cut to transcript.max_history_tokens and, with a
+    token_budget, the whole prompt (system prompt included) is kept within
+    it: the oldest history turns are dropped first, then the summary is truncated.
+    Returns (messages, history turns actually included).
+    """
+    transcript_settings = transcript_settings or {}
+    transcript_format = transcript_settings.get('format', 'lines')
+    now = datetime.now()
+    
+    def render(history, summary_text):
+        turns = compact_turns(history, message_body)
+        summary_section = f"\nSummary of earlier conversation: {summary_text}\n" if summary_text else ''
+        transcript_section = f"\nConversation so far:\n{render_lines(turns, now)}\n" if turns and transcript_format == 'lines' else ''
+        context = f"""Lead Information:
+- Name: {profile_name}
+- Phone: {phone}
+{summary_section}{transcript_section}
+Current Message: {message_body}"""
+        if transcript_format == 'messages':
+            return to_bedrock_messages(turns, context, now)
+        return [{'role': 'user', 'content': context}]
     
-    # Add remaining content
-    if current_message.strip():
-        messages.append(current_message.strip())
+    history_budget = transcript_settings.get('max_history_tokens')
+    summary_text = summary
+    if token_budget:
+        fixed_tokens = estimate_tokens(system_prompt) + estimate_messages_tokens(render([], ''))
+        summary_text = truncate_to_tokens(summary, max(token_budget - fixed_tokens, 0))
+        remaining = token_budget - fixed_tokens - estimate_tokens(summary_text)
+        history_budget = min(history_budget, remaining) if history_budget else remaining
+    if history_budget is not None:
+        # Each turn with its own time marker: a slight overestimate, as markers are shared
+        kept_history = fit_newest(conversation_history, history_budget,
+                                  lambda turn: render_lines(compact_turns([turn], message_body), now) + '\n')
+    else:
+        kept_history = conversation_history
     
-    # Filter out empty messages
-    messages = [msg for msg in messages if msg.strip()]
+    messages = render(kept_history, summary_text)
+    estimated_tokens = estimate_tokens(system_prompt) + estimate_messages_tokens(messages)
+    logger.info(f"Prompt ~{estimated_tokens} tokens ({transcript_format} transcript, {len(messages)} messages): "
+                f"{len(kept_history)}/{len(conversation_history)} history turns, "
+                f"summary {'included' if summary_text else 'none'}"
+                f"{f', budget {token_budget}' if token_budget else ''}")
     
-    return messages
+    return messages, kept_history
 
 def get_conversation_history(lead_id, platform):
-    """Get conversation history for the lead"""
+    """
+    Get conversation history for the lead: one GetItem of the lead's
+    recent_messages buffer (which also carries the rolling summary), or the
+    activity tables (content fetched in bulk) if the buffer is disabled or not built yet.
+    Turns already covered by the summary are left out.
+    Returns (history newest first, summary text).
+    """
     try:
         config = load_business_config()
-        dynamodb = boto3.resource('dynamodb')
-        activities_table = dynamodb.Table(os.environ['ACTIVITIES_TABLE'])
-        activity_content_table = dynamodb.Table(os.environ['ACTIVITY_CONTENT_TABLE'])
         
         # Get platform-specific config or default
         platform_config = config['reply_length'].get(platform, config['reply_length']['default'])
+        limit = platform_config['conversation_history_limit']
         
-        # Get recent activities for this lead
-        response = activities_table.query(
-            IndexName='lead-id-created-at-index',
-            KeyConditionExpression='lead_id = :lead_id',
-            ExpressionAttributeValues={':lead_id': lead_id},
-            ScanIndexForward=False,  # Most recent first
-            Limit=platform_config['conversation_history_limit']
-        )
+        conversation = {'recent_messages': None, 'conversation_summary': '', 'summary_covered_until': ''}
+        if get_recent_messages_settings(config).get('enabled') or get_summary_settings(config).get('enabled'):
+            conversation = get_lead_conversation(lead_id)
         
-        conversation_history = []
-        for activity in response['Items']:
-            # Get content for each activity
-            content_response = activity_content_table.query(
-                IndexName='activity-id-index',
-                KeyConditionExpression='activity_id = :activity_id',
-                ExpressionAttributeValues={':activity_id': activity['id']}
-            )
-            
-            if content_response['Items']:
-                content = content_response['Items'][0]['content']
-                conversation_history.append({
-                    'timestamp': activity.get('created_at', ''),
-                    'lead_message': content.get('leadMessage', ''),
-                    'assistant_message': content.get('assistantMessage', '')
-                })
+        if get_recent_messages_settings(config).get('enabled') and conversation['recent_messages'] is not None:
+            history = to_conversation_history(conversation['recent_messages'], limit)
+        else:
+            history = load_conversation_history(lead_id, limit)
         
-        return conversation_history
+        if not get_summary_settings(config).get('enabled'):
+            return history, ''
+        return unsummarized_turns(history, conversation['summary_covered_until']), conversation['conversation_summary']
         
     except Exception as e:
         logger.warning(f"Error getting conversation history: {str(e)}")
-        return []
+        return [], ''
+
+def get_system_prompt(message_body, conversation_history, config):
+    """
+    System prompt for a reply. With knowledge_retrieval enabled only the knowledge
+    sections relevant to the message (and the lead's previous messages, for short
+    follow-ups) are included; falls back to the whole system prompt file.
+    """
+    retrieval_settings = config.get('knowledge_retrieval', {})
+    if retrieval_settings.get('enabled'):
+        try:
+            previous_messages = [
+                turn['lead_message'] for turn in conversation_history[:retrieval_settings.get('query_history_turns', 2) + 1]
+                if turn.get('lead_message') and turn['lead_message'] != message_body
+            ]
+            system_prompt = retrieve_system_prompt(' '.join([message_body] + previous_messages), retrieval_settings)
+            if system_prompt:
+                return system_prompt
+        except Exception as e:
+            logger.warning(f"Knowledge retrieval failed, using the whole system prompt: {str(e)}")
+    
+    return load_system_prompt_from_s3()
+
+def prefetch_knowledge(config):
+    """
+    Load the S3 files get_system_prompt (and the FAQ cache prompt version) will
+    read into the container caches, so the fetch overlaps the history read.
+    """
+    retrieval_settings = config.get('knowledge_retrieval', {})
+    if retrieval_settings.get('enabled'):
+        load_knowledge_index(retrieval_settings['s3_key'])
+    if not retrieval_settings.get('enabled') or config.get('faq_cache', {}).get('enabled'):
+        load_system_prompt_from_s3()
 
 def load_system_prompt_from_s3():
-    """Load system prompt from S3 file. Returns None if file doesn't exist or error occurs."""
+    """
+    Load system prompt from S3 file (cached per container, revalidated after the TTL).
+    Returns None if file doesn't exist or error occurs.
+    """
     try:
-        s3_client = boto3.client('s3')
         bucket_name = os.environ.get('S3_KNOWLEDGE_BUCKET')
         file_key = os.environ.get('S3_KNOWLEDGE_FILE', 'knowledge/system_prompt.txt')
         
@@ -276,10 +574,7 @@ def load_system_prompt_from_s3():
             logger.info("No S3 bucket configured, using default system prompt")
             return None
             
-        response = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-        system_prompt = response['Body'].read().decode('utf-8')
-        logger.info(f"Loaded system prompt from S3: {bucket_name}/{file_key}")
-        return system_prompt
+        return load_s3_object(file_key).text
         
     except Exception as e:
         logger.warning(f"Could not load system prompt from S3: {str(e)}, using default")
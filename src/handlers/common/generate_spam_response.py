@@ -1,9 +1,8 @@
 import yaml
 import json
 import logging
-import boto3
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 import uuid
 import sys
 
@@ -11,6 +10,15 @@ import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from aux import load_business_config
+from aws_clients import get_table
+from spam_windows import evaluate_spam_windows
+from message_counters import record_inbound_message
+from lead_reputation import record_spam_message
+from conversation_history import get_content_id
+from recent_messages import append_recent_message
+from message_segmentation import segment_for_platform
+from write_batch import WriteBatch, get_write_coalescing_settings
+from fanout import DEFAULT_MAX_WORKERS, PhaseTimer, fan_out, get_fanout_settings
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -40,83 +48,83 @@ def lambda_handler(event, context):
         
         logger.info(f"Handling spam message for lead {lead_id} on {platform}")
         
-        # DynamoDB client
-        dynamodb = boto3.resource('dynamodb')
-        activities_table = dynamodb.Table(os.environ['ACTIVITIES_TABLE'])
-        spam_activities_table = dynamodb.Table(os.environ['SPAM_ACTIVITIES_TABLE'])
-        activity_content_table = dynamodb.Table(os.environ['ACTIVITY_CONTENT_TABLE'])
+        timer = PhaseTimer(f"Spam message for lead {lead_id}")
+        config = timer.measure('config', load_business_config)
+        
+        # DynamoDB tables
+        spam_activities_table = get_table(os.environ['SPAM_ACTIVITIES_TABLE'])
         
         timestamp = datetime.now().isoformat()
         
-        # Create inbound spam activity record
+        # Inbound spam activity record
         activity_id = str(uuid.uuid4())
-        activities_table.put_item(
-            Item={
-                'id': activity_id,
-                'lead_id': lead_id,
-                'contact_method_id': contact_method_id,
-                'activity_type': platform,
-                'status': 'completed',
-                'direction': 'inbound',
-                'completed_at': timestamp,
-                'created_at': timestamp,
-                'metadata': {
-                    'messageSid': message_sid,
-                    'profileName': profile_name,
-                    'spam': 'True',
-                    'spam_reason': spam_reason,
-                    'platform': platform
-                }
-            }
-        )
-        
-        # Store inbound activity content (only the lead message)
-        activity_content_table.put_item(
-            Item={
-                'id': str(uuid.uuid4()),
-                'activity_id': activity_id,
-                'content_type': platform,
-                'content': {
-                    'leadMessage': message_body
-                },
-                'created_at': timestamp
-            }
-        )
-        
-        # Create spam_activities record
-        spam_activities_table.put_item(
-            Item={
-                'id': str(uuid.uuid4()),
-                'activity_id': activity_id,
-                'lead_id': lead_id,
-                'flagged_by': 'bot',
+        activity_item = {
+            'id': activity_id,
+            'lead_id': lead_id,
+            'contact_method_id': contact_method_id,
+            'activity_type': platform,
+            'status': 'completed',
+            'direction': 'inbound',
+            'completed_at': timestamp,
+            'created_at': timestamp,
+            'metadata': {
+                'messageSid': message_sid,
+                'profileName': profile_name,
+                'spam': 'True',
                 'spam_reason': spam_reason,
-                'spam_date': timestamp,
-                'created_at': timestamp
+                'platform': platform
             }
-        )
+        }
+        
+        # Inbound activity content (only the lead message)
+        content_item = {
+            'id': get_content_id(activity_id),
+            'activity_id': activity_id,
+            'content_type': platform,
+            'content': {
+                'leadMessage': message_body
+            },
+            'created_at': timestamp
+        }
         
-        config = load_business_config()
+        # spam_activities record
+        spam_activity_item = {
+            'id': str(uuid.uuid4()),
+            'activity_id': activity_id,
+            'lead_id': lead_id,
+            'flagged_by': 'bot',
+            'spam_reason': spam_reason,
+            'spam_date': timestamp,
+            'created_at': timestamp
+        }
         
-        # Check spam activities limits to determine if user is spammer
-        spam_activities_limits = config['spam_detection']['spam_activities_limits']
-        is_spammer = False
+        # The three records are written in one transaction (the spam record points to the activity)
+        records = WriteBatch(atomic=True, coalesce=get_write_coalescing_settings(config).get('enabled', False))
+        records.put(os.environ['ACTIVITIES_TABLE'], activity_item)
+        records.put(os.environ['ACTIVITY_CONTENT_TABLE'], content_item)
+        records.put(os.environ['SPAM_ACTIVITIES_TABLE'], spam_activity_item)
         
-        for days, max_spam_activities in spam_activities_limits:
-            lookback_date = (datetime.now() - timedelta(days=days)).isoformat()
-            spam_response = spam_activities_table.query(
-                IndexName='lead-id-spam-date-index',
-                KeyConditionExpression='lead_id = :lead_id AND spam_date >= :date',
-                ExpressionAttributeValues={
-                    ':lead_id': lead_id,
-                    ':date': lookback_date
-                }
+        # Store the records, count the inbound message for spam limits, remember it for the
+        # lead reputation, and check the spam activities limits to determine if the user is a spammer.
+        # All independent: the windows query counts the new spam_activities record as pending
+        calls = {
+            'activity_records': records.flush,
+            'message_counters': lambda: record_inbound_message(lead_id, timestamp, config),
+            'lead_reputation': lambda: record_spam_message(lead_id, timestamp),
+            'recent_messages': lambda: append_recent_message(lead_id, timestamp, 'inbound', message_body, config),
+            'spam_windows': lambda: evaluate_spam_windows(
+                spam_activities_table, lead_id, config['spam_detection']['spam_activities_limits'],
+                pending_spam_dates=[timestamp]
             )
-            
-            spam_count = len(spam_response['Items'])
-            if spam_count >= max_spam_activities:
-                is_spammer = True
-                break
+        }
+        fanout_settings = get_fanout_settings(config)
+        if fanout_settings.get('enabled'):
+            results = fan_out(calls, timer, fanout_settings.get('max_workers', DEFAULT_MAX_WORKERS))
+        else:
+            results = {name: timer.measure(name, call) for name, call in calls.items()}
+        spam_windows = results['spam_windows']
+        timer.log()
+        is_spammer = any(spam_count >= max_spam_activities for _, max_spam_activities, spam_count in spam_windows)
         
         # Determine response message based on spam status
         if is_spammer:
@@ -128,6 +136,8 @@ def lambda_handler(event, context):
         
         response_data = {
             'action': 'spam_handled',
+            'lead_id': lead_id,
+            'contact_method_id': contact_method_id,
             'activity_id': activity_id,
             'response_message': response_message,
             'action_type': action_type,
@@ -136,7 +146,7 @@ def lambda_handler(event, context):
             'send_message': {
                 'platform': platform,
                 'to': clean_phone_number,
-                'message': response_message,
+                'messages': segment_for_platform(response_message, platform, config),
                 'from': original_to,
                 'answer_to_activity_id': activity_id
             }
@@ -1,11 +1,14 @@
 import yaml
 import logging
-import boto3
 import os
 import sys
 from datetime import datetime
-import uuid
-from botocore.exceptions import ClientError
+
+# Add the src directory to Python path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from aux import load_business_config
+from lead_store import get_lead_cache_settings, get_or_create_lead
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -13,7 +16,8 @@ logger.setLevel(logging.INFO)
 def lambda_handler(event, context):
     """
     Lambda function to check if phone exists in DB and get/create lead.
-    Creates lead if doesn't exist, returns lead info if exists.
+    Creates lead if doesn't exist, returns lead info if exists. Concurrent
+    first messages from the same phone resolve to a single lead.
     """
     
     try:
@@ -29,93 +33,39 @@ def lambda_handler(event, context):
         
         logger.info(f"Checking {platform} phone number: {clean_phone_number}")
         
-        # DynamoDB client
-        dynamodb = boto3.resource('dynamodb')
-        contact_methods_table = dynamodb.Table(os.environ['CONTACT_METHODS_TABLE'])
-        leads_table = dynamodb.Table(os.environ['LEADS_TABLE'])
-        contact_settings_table = dynamodb.Table(os.environ['CONTACT_METHOD_SETTINGS_TABLE'])
-        
-        # Check if phone number exists using GSI
-        type_value = f"phone#{clean_phone_number}"
-        response = contact_methods_table.query(
-            IndexName='type-value-index',
-            KeyConditionExpression='type_value = :tv',
-            ExpressionAttributeValues={':tv': type_value}
+        # Cached owner or guard read, then (new users only) one transaction for lead, contact method and settings
+        timestamp = datetime.now().isoformat()
+        lead = get_or_create_lead(
+            'phone',
+            clean_phone_number,
+            {
+                'name': profile_name,
+                'metadata': {
+                    'source': platform,
+                    'messageSid': message_sid,
+                    'firstContact': timestamp,
+                    'profileName': profile_name,
+                    'platform': platform
+                }
+            },
+            timestamp=timestamp,
+            cache_settings=get_lead_cache_settings(load_business_config())
         )
+        lead_id = lead['lead_id']
+        contact_method_id = lead['contact_method_id']
         
-        if response['Items']:
-            # Phone exists, get lead info
-            contact_method = response['Items'][0]
-            contact_method_id = contact_method['id']
-            lead_id = contact_method['lead_id']
-            
-            logger.info(f"Phone found for lead_id: {lead_id}")
-            
-            response_data = {
-                'action': 'existing_user',
-                'lead_id': lead_id,
-                'contact_method_id': contact_method_id,
-                'flow_input': flow_input
-            }
-            
-        else:
-            # Phone doesn't exist, create new lead and contact method
-            logger.info(f"Creating new lead for {platform} phone: {clean_phone_number}")
-            
-            # Create new lead
-            lead_id = str(uuid.uuid4())
-            timestamp = datetime.now().isoformat()
-            
-            leads_table.put_item(
-                Item={
-                    'id': lead_id,
-                    'name': profile_name,
-                    'metadata': {
-                        'source': platform,
-                        'messageSid': message_sid,
-                        'firstContact': timestamp,
-                        'profileName': profile_name,
-                        'platform': platform
-                    },
-                    'created_at': timestamp,
-                    'updated_at': timestamp
-                }
-            )
-            
-            # Create contact method
-            contact_method_id = str(uuid.uuid4())
-            contact_methods_table.put_item(
-                Item={
-                    'id': contact_method_id,
-                    'lead_id': lead_id,
-                    'type': 'phone',
-                    'value': clean_phone_number,
-                    'type_value': f"phone#{clean_phone_number}",
-                    'created_at': timestamp,
-                    'updated_at': timestamp
-                }
-            )
-            
-            # Set as primary contact method
-            contact_settings_table.put_item(
-                Item={
-                    'id': str(uuid.uuid4()),
-                    'contact_method_id': contact_method_id,
-                    'is_primary': True,
-                    'is_active': True,
-                    'created_at': timestamp,
-                    'updated_at': timestamp
-                }
-            )
-            
+        if lead['created']:
             logger.info(f"Created new lead {lead_id} with contact method {contact_method_id}")
-            
-            response_data = {
-                'action': 'new_user',
-                'lead_id': lead_id,
-                'contact_method_id': contact_method_id,
-                'flow_input': flow_input
-            }
+        else:
+            logger.info(f"Phone found for lead_id: {lead_id}")
+        
+        response_data = {
+            'action': 'new_user' if lead['created'] else 'existing_user',
+            'lead_id': lead_id,
+            'contact_method_id': contact_method_id,
+            'new_lead': lead['created'],
+            'flow_input': flow_input
+        }
         
         return response_data
         
@@ -0,0 +1,209 @@
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Add the src directory to Python path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from handlers.common import (
+    collect_buffered_messages,
+    check_content,
+    get_or_create_lead,
+    check_lead_spammer,
+    detect_spam,
+    generate_spam_response,
+    generate_ai_response,
+    send_message
+)
+from aux import load_business_config
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Threads for speculative reply generation, reused across warm invocations
+speculation_executor = ThreadPoolExecutor(max_workers=2)
+
+# Per-container counters of speculative replies and how many were discarded
+speculation_stats = {
+    'replies': 0,
+    'wasted': 0
+}
+
+def lambda_handler(event, context):
+    """
+    Lambda function that runs the whole message processing pipeline in-process.
+    Mirrors the states and Choice logic of step-function-definition.yml, calling
+    the same stage handlers directly instead of one Lambda per state.
+    """
+
+    try:
+        return run_pipeline(event, context)
+
+    except Exception as e:
+        logger.error(f"Error in fused pipeline: {str(e)}", exc_info=True)
+        return {
+            'action': 'error',
+            'error': str(e),
+            'final_state': 'ProcessingFailed'
+        }
+
+def run_pipeline(event, context):
+    """
+    Drive the pipeline stages in order, following the same transitions as the
+    Step Functions state machine. Returns a summary with the final state,
+    per-stage timings and the total elapsed time (excluding the debounce
+    wait) in milliseconds. Stages may run concurrently in speculative mode.
+    """
+    timings = {}
+    started = time.perf_counter()
+    waited_seconds = 0
+
+    def run_stage(state_name, handler, stage_input):
+        started = time.perf_counter()
+        try:
+            return handler(stage_input, context)
+        finally:
+            timings[state_name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def finish(final_state, output=None):
+        total_ms = round((time.perf_counter() - started - waited_seconds) * 1000, 1)
+        logger.info(f"Fused pipeline finished in {final_state} after {total_ms}ms: {timings}")
+        return {
+            'mode': 'fused',
+            'final_state': final_state,
+            'timings_ms': timings,
+            'total_ms': total_ms,
+            'output': output
+        }
+
+    # IsDebounced -> DebounceWait -> CollectBufferedMessages
+    if event.get('debounce'):
+        waited_seconds = event['debounce']['wait_seconds']
+        time.sleep(waited_seconds)
+        event = run_stage('CollectBufferedMessages', collect_buffered_messages.lambda_handler, event)
+        if event.get('action') == 'stop':
+            return finish('MessageEmpty', event)
+        if event.get('action') != 'continue':
+            return finish('ProcessingFailed', event)
+
+    # CheckMessageContent -> HasContent
+    state = run_stage('CheckMessageContent', check_content.lambda_handler, event)
+    if state.get('action') == 'stop':
+        return finish('MessageEmpty', state)
+    if state.get('action') != 'continue':
+        return finish('ProcessingFailed', state)
+
+    # GetOrCreateLead
+    state = run_stage('GetOrCreateLead', get_or_create_lead.lambda_handler, state)
+    if state.get('action') == 'error':
+        return finish('ProcessingFailed', state)
+
+    # CheckLeadSpammer -> CheckIfExistingSpammer
+    state = run_stage('CheckLeadSpammer', check_lead_spammer.lambda_handler, state)
+    if state.get('action') == 'error':
+        return finish('ProcessingFailed', state)
+
+    if state.get('is_spammer') is True:
+        return run_spam_branch(state, run_stage, finish)
+
+    # Trusted leads skip DetectSpam
+    if state.get('skip_spam_detection') is True:
+        return run_normal_branch(state, run_stage, finish)
+
+    if load_business_config().get('pipeline', {}).get('speculative_reply'):
+        return run_speculative_branch(state, run_stage, finish)
+
+    # DetectSpam -> IsSpamMessage (failures are treated as a normal message)
+    try:
+        detected = run_stage('DetectSpam', detect_spam.lambda_handler, state)
+    except Exception as e:
+        logger.warning(f"Spam detection failed, treating as normal message: {str(e)}")
+        detected = None
+
+    if detected is None or detected.get('action') == 'error':
+        return run_normal_branch(state, run_stage, finish)
+
+    if detected.get('is_spam') is True:
+        return run_spam_branch(detected, run_stage, finish)
+
+    return run_normal_branch(detected, run_stage, finish)
+
+def run_speculative_branch(state, run_stage, finish):
+    """
+    DetectSpam with the AI reply generated concurrently, so a legitimate
+    message waits for the slower of the two Bedrock calls instead of both.
+    Nothing is stored by the speculative reply (its summary refresh and FAQ
+    cache store are deferred to the normal branch); it is discarded for spam.
+    """
+    reply_future = speculation_executor.submit(
+        run_stage, 'GenerateReplySpeculative', generate_ai_response.generate_speculative_reply, state
+    )
+    speculation_stats['replies'] += 1
+
+    # DetectSpam -> IsSpamMessage (failures are treated as a normal message)
+    try:
+        detected = run_stage('DetectSpam', detect_spam.lambda_handler, state)
+    except Exception as e:
+        logger.warning(f"Spam detection failed, treating as normal message: {str(e)}")
+        detected = None
+
+    if detected is not None and detected.get('action') != 'error' and detected.get('is_spam') is True:
+        speculation_stats['wasted'] += 1
+        log_speculation('wasted')
+        result = run_spam_branch(detected, run_stage, finish)
+        # Let the discarded reply finish before the container is frozen
+        wait([reply_future])
+        return result
+
+    try:
+        reply = reply_future.result()
+    except Exception as e:
+        reply = {'action': 'error', 'error': str(e)}
+
+    normal_state = state if detected is None or detected.get('action') == 'error' else detected
+    if reply.get('action') == 'error':
+        # Generate the reply again in the normal (sequential) way
+        log_speculation(f"failed ({reply['error']})")
+        return run_normal_branch(normal_state, run_stage, finish)
+
+    log_speculation('used')
+    return run_normal_branch({**normal_state, 'speculative_reply': reply}, run_stage, finish)
+
+def log_speculation(outcome):
+    """Log the outcome of a speculative reply and the container-wide wasted rate"""
+    replies = speculation_stats['replies']
+    wasted = speculation_stats['wasted']
+    logger.info(f"Speculative reply {outcome} | wasted {wasted}/{replies} ({wasted / replies:.1%}) in this container")
+
+def run_spam_branch(state, run_stage, finish):
+    """GenerateSpamResponse -> SendSpamResponse -> SpamProcessed"""
+    state = run_stage('GenerateSpamResponse', generate_spam_response.lambda_handler, state)
+    if state.get('action') == 'error':
+        return finish('ProcessingFailed', state)
+
+    # Continue even if message sending fails
+    sent = send_safely('SendSpamResponse', state, run_stage)
+    return finish('SpamProcessed', sent)
+
+def run_normal_branch(state, run_stage, finish):
+    """GenerateAiResponse -> SendNormalResponse -> MessageProcessed"""
+    state = run_stage('GenerateAiResponse', generate_ai_response.lambda_handler, state)
+    if state.get('action') == 'error':
+        return finish('ProcessingFailed', state)
+
+    # Continue even if message sending fails
+    sent = send_safely('SendNormalResponse', state, run_stage)
+    return finish('MessageProcessed', sent)
+
+def send_safely(state_name, state, run_stage):
+    """Run the SendMessage stage without letting its failures abort the pipeline"""
+    try:
+        return run_stage(state_name, send_message.lambda_handler, state)
+    except Exception as e:
+        logger.warning(f"{state_name} failed: {str(e)}")
+        return {
+            'action': 'error',
+            'error': str(e)
+        }
@@ -1,12 +1,20 @@
 import json
 import logging
-import boto3
 import os
+import sys
 from datetime import datetime
 import uuid
 import time
 import random
 
+# Add the src directory to Python path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from aux import load_business_config
+from conversation_history import get_content_id
+from recent_messages import append_recent_messages
+from write_batch import WriteBatch, get_write_coalescing_settings
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
@@ -40,9 +48,26 @@ def lambda_handler(event, context):
                 'error': 'No messages to send'
             }
         
+        # Messages already sent while the reply was streamed (generate_ai_response streaming mode)
+        dispatched = send_message_data.get('dispatched')
+        if dispatched:
+            results = dispatched.get('results', [])
+            sent_count = sum(1 for result in results if result.get('success'))
+            logger.info(f"{sent_count}/{len(messages)} message(s) already dispatched via {platform} while streaming")
+            return {
+                'action': 'message_sent',
+                'platform': platform,
+                'total_messages': len(messages),
+                'sent_messages': sent_count,
+                'success': sent_count > 0,
+                'all_sent': sent_count == len(messages),
+                'results': results
+            }
+        
         logger.info(f"Sending {len(messages)} message(s) via {platform} to {to_number}")
         
         results = []
+        sent = []
         sent_count = 0
         
         for i, message_body in enumerate(messages):
@@ -52,24 +77,25 @@ def lambda_handler(event, context):
             logger.info(f"Sending message {i+1}/{len(messages)}: {message_body[:100]}")
             
             # Route to appropriate platform handler
-            if platform == 'whatsapp':
-                result = send_whatsapp_message(to_number, message_body, from_number)
-            elif platform == 'telegram':
-                result = send_telegram_message(to_number, message_body)
-            else:
-                logger.error(f"Unsupported platform: {platform}")
+            try:
+                result = send_platform_message(platform, to_number, message_body, from_number)
+            except ValueError as e:
+                logger.error(str(e))
                 return {
                     'action': 'error',
-                    'error': f'Unsupported platform: {platform}'
+                    'error': str(e)
                 }
             
             results.append(result)
             
             # Store outbound activity and content ONLY after successful sending
             if result.get('success'):
-                log_outbound_message(event, send_message_data, result, answer_to_activity_id, message_body)
+                sent.append((result, message_body, datetime.now().isoformat()))
                 sent_count += 1
         
+        # Log every sent message at once (one flush instead of writes per message)
+        log_outbound_messages(event, send_message_data, sent, answer_to_activity_id)
+        
         response_data = {
             'action': 'message_sent',
             'platform': platform,
@@ -94,6 +120,14 @@ def lambda_handler(event, context):
             'error': str(e)
         }
 
+def send_platform_message(platform, to_number, message_body, from_number):
+    """Send one message through the platform's API. Raises ValueError for unsupported platforms."""
+    if platform == 'whatsapp':
+        return send_whatsapp_message(to_number, message_body, from_number)
+    if platform == 'telegram':
+        return send_telegram_message(to_number, message_body)
+    raise ValueError(f'Unsupported platform: {platform}')
+
 def send_whatsapp_message(to_number, message_body, from_number):
     """Send WhatsApp message via Twilio"""
     try:
@@ -174,55 +208,67 @@ def send_telegram_message(to_number, message_body):
             'platform': 'telegram'
         }
 
-def log_outbound_message(original_data, send_data, result, answer_to_activity_id, message_content):
-    """Log outbound message to DynamoDB after successful sending"""
+def log_outbound_messages(original_data, send_data, sent, answer_to_activity_id):
+    """
+    Log outbound messages to DynamoDB after successful sending.
+    sent holds (send result, message content, sent timestamp) per message; the
+    activity and content records of all of them are written in one batch
+    and appended to the recent messages in one update (with write_coalescing).
+    """
+    if not sent:
+        return
     try:
-        dynamodb = boto3.resource('dynamodb')
-        activities_table = dynamodb.Table(os.environ.get('ACTIVITIES_TABLE', ''))
-        activity_content_table = dynamodb.Table(os.environ.get('ACTIVITY_CONTENT_TABLE', ''))
-        
-        if not activities_table or not activity_content_table:
+        if not os.environ.get('ACTIVITIES_TABLE') or not os.environ.get('ACTIVITY_CONTENT_TABLE'):
             logger.warning("DynamoDB tables not configured for message logging")
             return
         
-        timestamp = datetime.now().isoformat()
-        activity_id = str(uuid.uuid4())
+        config = load_business_config()
+        coalesce = get_write_coalescing_settings(config).get('enabled', False)
+        batch = WriteBatch(coalesce=coalesce)
+        platform = send_data.get('platform', 'unknown')
+        activity_ids = []
         
-        # Create outbound activity record
-        activities_table.put_item(
-            Item={
+        for result, message_content, timestamp in sent:
+            activity_id = str(uuid.uuid4())
+            activity_ids.append(activity_id)
+            
+            # Outbound activity record
+            batch.put(os.environ['ACTIVITIES_TABLE'], {
                 'id': activity_id,
                 'lead_id': original_data.get('lead_id', ''),
                 'contact_method_id': original_data.get('contact_method_id', ''),
-                'activity_type': send_data.get('platform', 'unknown'),
+                'activity_type': platform,
                 'status': 'completed',
                 'direction': 'outbound',
                 'completed_at': timestamp,
                 'created_at': timestamp,
                 'metadata': {
                     'messageSid': result.get('message_id', ''),
-                    'platform': send_data.get('platform', 'unknown'),
+                    'platform': platform,
                     'messageType': 'text',
                     'answer_to_activity_id': answer_to_activity_id
                 }
-            }
-        )
-        
-        # Store outbound activity content (only the assistant message)
-        activity_content_table.put_item(
-            Item={
-                'id': str(uuid.uuid4()),
+            })
+            
+            # Outbound activity content (only the assistant message)
+            batch.put(os.environ['ACTIVITY_CONTENT_TABLE'], {
+                'id': get_content_id(activity_id),
                 'activity_id': activity_id,
-                'content_type': send_data.get('platform', 'unknown'),
+                'content_type': platform,
                 'content': {
                     'assistantMessage': message_content
                 },
                 'created_at': timestamp,
-            }
-        )
+            })
+        
+        requests = batch.flush()
+        recent_messages = [(timestamp, 'outbound', message_content) for _, message_content, timestamp in sent]
+        for messages in ([recent_messages] if coalesce else [[message] for message in recent_messages]):
+            append_recent_messages(original_data.get('lead_id', ''), messages, config)
         
-        logger.info(f"Logged outbound message activity: {activity_id}")
+        logger.info(f"Logged {len(activity_ids)} outbound message activities in {requests} write request(s): "
+                    f"{', '.join(activity_ids)}")
         
     except Exception as e:
-        logger.warning(f"Error logging outbound message: {str(e)}")
+        logger.warning(f"Error logging outbound messages: {str(e)}")
         # Don't fail the main operation if logging fails
@@ -0,0 +1,77 @@
+import logging
+import os
+import sys
+
+# Add the src directory to Python path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from aux import load_business_config
+from aws_clients import get_table
+from conversation_history import load_conversation_history
+from conversation_summary import get_summary_settings, save_summary, select_turns_to_fold, summarize_turns
+from recent_messages import DEFAULT_MAX_MESSAGES, get_lead_conversation, get_recent_messages_settings
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def lambda_handler(event, context):
+    """
+    Lambda function to refresh the rolling conversation summary of a lead.
+    Invoked asynchronously by generate_ai_response once enough turns have
+    accumulated since the last refresh; folds every unsummarized turn except
+    the most recent ones into the summary, off the reply's critical path.
+    """
+
+    try:
+        lead_id = event['lead_id']
+        config = load_business_config()
+        settings = get_summary_settings(config)
+
+        if not settings.get('enabled'):
+            return {'action': 'skipped', 'reason': 'conversation summary disabled'}
+
+        conversation = get_lead_conversation(lead_id)
+        covered_until = conversation['summary_covered_until']
+        messages = conversation['recent_messages']
+        if messages is None:
+            messages = load_turns_from_activities(lead_id, config)
+
+        turns = select_turns_to_fold(messages, covered_until, settings)
+        if not turns:
+            logger.info(f"Not enough new turns to refresh the summary of lead {lead_id}")
+            return {'action': 'skipped', 'reason': 'not enough new turns', 'lead_id': lead_id}
+
+        summary = summarize_turns(conversation['conversation_summary'], turns, config)
+
+        try:
+            save_summary(lead_id, summary, turns[-1]['timestamp'], covered_until)
+        except get_table(os.environ['LEADS_TABLE']).meta.client.exceptions.ConditionalCheckFailedException:
+            logger.info(f"Summary of lead {lead_id} was refreshed concurrently, discarding this one")
+            return {'action': 'skipped', 'reason': 'concurrent refresh', 'lead_id': lead_id}
+
+        logger.info(f"Folded {len(turns)} turns into the summary of lead {lead_id} ({len(summary)} characters)")
+
+        return {
+            'action': 'summarized',
+            'lead_id': lead_id,
+            'folded_turns': len(turns),
+            'summary_covered_until': turns[-1]['timestamp']
+        }
+
+    except Exception as e:
+        logger.error(f"Error summarizing conversation: {str(e)}")
+        return {
+            'action': 'error',
+            'error': str(e)
+        }
+
+def load_turns_from_activities(lead_id, config):
+    """Buffer-style entries (oldest first) from the activity tables, for leads without recent_messages"""
+    limit = get_recent_messages_settings(config).get('max_messages', DEFAULT_MAX_MESSAGES)
+    turns = []
+    for message in reversed(load_conversation_history(lead_id, limit)):
+        if message['lead_message']:
+            turns.append({'timestamp': message['timestamp'], 'direction': 'inbound', 'text': message['lead_message']})
+        elif message['assistant_message']:
+            turns.append({'timestamp': message['timestamp'], 'direction': 'outbound', 'text': message['assistant_message']})
+    return turns
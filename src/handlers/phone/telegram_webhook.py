@@ -7,7 +7,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from handlers_aux import (
     NormalizedInputMessage, 
-    start_step_function_execution, 
+    dispatch_message, 
     get_platform_success_response,
     get_platform_error_response,
     handle_webhook_error
@@ -38,8 +38,8 @@ def lambda_handler(event, context):
         
         logger.info(f"Normalized Telegram message: From={normalized_message.From}")
         
-        # Start Step Functions execution
-        start_step_function_execution(normalized_message, context)
+        # Start pipeline execution (Step Functions or fused)
+        dispatch_message(normalized_message, context)
         
         return get_platform_success_response('telegram')
         
@@ -1,9 +1,13 @@
 import json
 import logging
-import boto3
 import os
+import zlib
 from dataclasses import dataclass, field
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from aux import load_business_config
+from aws_clients import get_client
+from message_buffer import get_buffer_key, get_debounce_window, buffer_message
 
 
 logger = logging.getLogger()
@@ -50,7 +54,7 @@ def validate_api_key(api_key):
     Returns True if valid, False otherwise.
     """
     try:
-        client = boto3.client('apigateway')
+        client = get_client('apigateway')
         
         # Get all API keys and check if the provided key exists
         response = client.get_api_keys()
@@ -66,11 +70,12 @@ def validate_api_key(api_key):
         return False
 
 
-def start_step_function_execution(normalized_message: NormalizedInputMessage, context):
+def start_step_function_execution(normalized_message: NormalizedInputMessage, context,
+                                  debounce: Optional[Dict[str, Any]] = None):
     """
     Start Step Functions execution with normalized data
     """
-    stepfunctions_client = boto3.client('stepfunctions')
+    stepfunctions_client = get_client('stepfunctions')
     state_machine_name = os.environ['STATE_MACHINE_NAME']
     region = os.environ.get('AWS_DEFAULT_REGION', 'eu-west-1')
     account_id = context.invoked_function_arn.split(':')[4]
@@ -79,6 +84,8 @@ def start_step_function_execution(normalized_message: NormalizedInputMessage, co
     execution_input = {
         'flow_input': normalized_message.to_dict()  # Wrap in flow_input structure
     }
+    if debounce:
+        execution_input['debounce'] = debounce
     
     response = stepfunctions_client.start_execution(
         stateMachineArn=state_machine_arn,
@@ -89,6 +96,85 @@ def start_step_function_execution(normalized_message: NormalizedInputMessage, co
     return response
 
 
+def use_fused_pipeline(sender: str) -> bool:
+    """
+    Decide whether a message is processed by the fused single-invocation pipeline.
+    FUSED_PIPELINE_PERCENTAGE (0-100) selects the share of senders routed to it;
+    the split is stable per sender so a conversation stays in one mode.
+    """
+    try:
+        percentage = int(os.environ.get('FUSED_PIPELINE_PERCENTAGE', '0'))
+    except ValueError:
+        logger.warning("Invalid FUSED_PIPELINE_PERCENTAGE, using Step Functions")
+        return False
+    
+    if percentage <= 0:
+        return False
+    if percentage >= 100:
+        return True
+    
+    return zlib.crc32(sender.encode('utf-8')) % 100 < percentage
+
+
+def start_fused_pipeline_execution(normalized_message: NormalizedInputMessage, context,
+                                  debounce: Optional[Dict[str, Any]] = None):
+    """
+    Invoke the fused pipeline Lambda asynchronously with the same input
+    the Step Functions execution would receive
+    """
+    lambda_client = get_client('lambda')
+    function_name = os.environ['FUSED_PIPELINE_FUNCTION_NAME']
+    
+    execution_input = {
+        'flow_input': normalized_message.to_dict()
+    }
+    if debounce:
+        execution_input['debounce'] = debounce
+    
+    response = lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps(execution_input)
+    )
+    
+    logger.info(f"Started fused pipeline execution: {function_name} (status {response['StatusCode']})")
+    return response
+
+
+def dispatch_message(normalized_message: NormalizedInputMessage, context):
+    """
+    Start processing of a normalized message, either through the Step Functions
+    state machine or through the fused pipeline Lambda.
+    When debouncing is enabled for the platform, only the first message of a
+    burst starts a run; later ones are buffered and merged into it.
+    """
+    debounce = None
+    
+    try:
+        window_seconds = get_debounce_window(load_business_config(), normalized_message.platform)
+        
+        if window_seconds > 0:
+            flow_input = normalized_message.to_dict()
+            if not buffer_message(flow_input, window_seconds):
+                logger.info("Message buffered into an open burst, no new execution started")
+                return None
+            
+            debounce = {
+                'buffer_key': get_buffer_key(flow_input),
+                'wait_seconds': window_seconds
+            }
+    except Exception as e:
+        # Never lose a message because debouncing is unavailable
+        logger.warning(f"Debouncing unavailable, dispatching message directly: {str(e)}")
+    
+    if use_fused_pipeline(normalized_message.From):
+        logger.info("Dispatching message to fused pipeline")
+        return start_fused_pipeline_execution(normalized_message, context, debounce)
+    
+    logger.info("Dispatching message to Step Functions pipeline")
+    return start_step_function_execution(normalized_message, context, debounce)
+
+
 def get_platform_success_response(platform: str):
     """Return appropriate success response based on platform"""
     if platform == 'whatsapp':
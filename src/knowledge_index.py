@@ -0,0 +1,250 @@
+import json
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from aux import get_config_cache_ttl, load_s3_object
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+INDEX_FORMAT_VERSION = 1
+
+# BM25 parameters (standard values)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+KNOWLEDGE_EXTENSIONS = ('.txt', '.md')
+
+STOPWORDS = frozenset("""
+a al algo como con cual de del el ella en es esta este esto hay la las le lo los mas me mi mucho muy
+no nos o para pero por que se ser si sin sobre su sus te tu un una uno unos y ya yo
+an and are as at be by for from how i in is it me my of on or the this to what with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase, accent-free terms without stopwords. Longer words lose a plural
+    's' and then a final vowel (a light stemmer), so 'maquinas'/'maquina' and
+    'hospitales'/'hospital' match.
+    """
+    folded = unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode('ascii')
+    terms = []
+    for token in TOKEN_PATTERN.findall(folded):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        if len(token) > 4:
+            if token.endswith('s'):
+                token = token[:-1]
+            if token[-1] in 'aeo':
+                token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def split_sections(text: str, source: str) -> List[Dict[str, Any]]:
+    """
+    Chunk a markdown document by heading. Each section holds the text up to the
+    next heading, with its heading path ('Company description > Tecnologia')
+    so retrieved sections keep their context. Text before the first heading
+    is kept as a section with an empty heading.
+    """
+    sections = []
+    path: List[Tuple[int, str]] = []
+    lines: List[str] = []
+
+    def flush():
+        body = '\n'.join(lines).strip()
+        if body or path:
+            sections.append({
+                'source': source,
+                'heading': ' > '.join(title for _, title in path),
+                'level': path[-1][0] if path else 0,
+                'text': body
+            })
+
+    for line in text.splitlines():
+        match = HEADING_PATTERN.match(line)
+        if not match:
+            lines.append(line)
+            continue
+        flush()
+        level = len(match.group(1))
+        path = [(parent_level, title) for parent_level, title in path if parent_level < level]
+        path.append((level, match.group(2)))
+        lines = []
+    flush()
+
+    return sections
+
+
+def sections_from_folder(folder: str) -> List[Dict[str, Any]]:
+    """Sections of every .txt/.md file of a knowledge folder (recursive, in path order)"""
+    sections = []
+    for root, _, files in sorted(os.walk(folder)):
+        for name in sorted(files):
+            if not name.endswith(KNOWLEDGE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, encoding='utf-8') as knowledge_file:
+                sections.extend(split_sections(knowledge_file.read(), os.path.relpath(path, folder)))
+    return sections
+
+
+def render_section(section: Dict[str, Any]) -> str:
+    """Section as markdown, with its heading at its original level"""
+    heading = section['heading'].split(' > ')[-1] if section['heading'] else ''
+    if not heading:
+        return section['text']
+    return f"{'#' * section['level']} {heading}\n{section['text']}".rstrip()
+
+
+class KnowledgeIndex:
+    """
+    BM25 index over the knowledge sections. Built offline from the knowledge
+    folder and stored as JSON; scoring walks the postings of the query terms only.
+    """
+
+    def __init__(self, sections: List[Dict[str, Any]], postings: Dict[str, List[List[int]]],
+                 section_lengths: List[int]):
+        self.sections = sections
+        self.postings = postings
+        self.section_lengths = section_lengths
+        self.average_length = sum(section_lengths) / len(section_lengths) if section_lengths else 0.0
+
+    @classmethod
+    def build(cls, sections: List[Dict[str, Any]]) -> 'KnowledgeIndex':
+        postings: Dict[str, List[List[int]]] = {}
+        section_lengths = []
+        for position, section in enumerate(sections):
+            # The heading path is part of the searchable text
+            terms = tokenize(f"{section['heading']}\n{section['text']}")
+            section_lengths.append(len(terms))
+            for term, count in Counter(terms).items():
+                postings.setdefault(term, []).append([position, count])
+        return cls(sections, postings, section_lengths)
+
+    def to_bytes(self) -> bytes:
+        return json.dumps({
+            'version': INDEX_FORMAT_VERSION,
+            'sections': self.sections,
+            'postings': self.postings,
+            'section_lengths': self.section_lengths
+        }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'KnowledgeIndex':
+        payload = json.loads(data.decode('utf-8'))
+        if payload.get('version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported knowledge index version {payload.get('version')}")
+        return cls(payload['sections'], payload['postings'], payload['section_lengths'])
+
+    def search(self, query: str, top_k: int,
+               candidates: Optional[List[int]] = None) -> List[Tuple[float, int]]:
+        """(score, section position) of the top_k sections matching the query, best first"""
+        allowed = set(candidates) if candidates is not None else None
+        section_count = len(self.sections)
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+            idf = math.log(1 + (section_count - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for position, count in term_postings:
+                if allowed is not None and position not in allowed:
+                    continue
+                length_norm = 1 - BM25_B + BM25_B * self.section_lengths[position] / (self.average_length or 1)
+                scores[position] = scores.get(position, 0.0) + idf * count * (BM25_K1 + 1) / (count + BM25_K1 * length_norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        return [(score, position) for position, score in ranked]
+
+    def is_fixed(self, position: int, fixed_sections: List[str]) -> bool:
+        """Whether a section belongs to a fixed (always included) top-level heading"""
+        root = self.sections[position]['heading'].split(' > ')[0].strip().lower()
+        return root in fixed_sections
+
+    def build_prompt(self, query: str, settings: Dict[str, Any]) -> Tuple[str, List[int]]:
+        """
+        System prompt with the fixed persona/rules sections plus the top_k
+        sections relevant to the query, in their original document order.
+        Returns (prompt, retrieved section positions).
+        """
+        fixed_sections = [heading.strip().lower() for heading in settings.get('fixed_sections', [])]
+        fixed = {position for position in range(len(self.sections)) if self.is_fixed(position, fixed_sections)}
+        candidates = [position for position in range(len(self.sections)) if position not in fixed]
+
+        retrieved = [position for score, position in self.search(query, settings.get('top_k', 3), candidates)
+                     if score >= settings.get('min_score', 0.0)]
+        selected = sorted(fixed | set(retrieved))
+
+        # Keep the parent heading of a retrieved subsection so its context is not lost
+        rendered = []
+        last_parent = None
+        for position in selected:
+            section = self.sections[position]
+            parent = section['heading'].rsplit(' > ', 1)[0] if ' > ' in section['heading'] else None
+            if parent and parent != last_parent:
+                rendered.append(f"{'#' * max(section['level'] - 1, 1)} {parent.split(' > ')[-1]}")
+            last_parent = parent or section['heading']
+            rendered.append(render_section(section))
+
+        return '\n\n'.join(part for part in rendered if part), retrieved
+
+
+# Skip reloading a missing index until the config cache TTL has passed
+_index_unavailable_at = None
+
+
+def load_knowledge_index(s3_key: str) -> Optional[KnowledgeIndex]:
+    """
+    Load the index from the knowledge bucket, parsed once per container and
+    revalidated with its ETag like the business config.
+    Returns None if no index has been built yet.
+    """
+    global _index_unavailable_at
+    if _index_unavailable_at and time.monotonic() - _index_unavailable_at < get_config_cache_ttl():
+        return None
+
+    try:
+        entry = load_s3_object(s3_key)
+    except Exception as e:
+        logger.warning(f"Knowledge index not available: {str(e)}")
+        _index_unavailable_at = time.monotonic()
+        return None
+
+    _index_unavailable_at = None
+    if entry.parsed is None:
+        entry.parsed = KnowledgeIndex.from_bytes(entry.body)
+        entry.body = None
+        logger.info(f"Loaded knowledge index: {len(entry.parsed.sections)} sections, {len(entry.parsed.postings)} terms")
+    return entry.parsed
+
+
+def retrieve_system_prompt(query: str, settings: Dict[str, Any]) -> Optional[str]:
+    """
+    System prompt built from the knowledge sections relevant to the query
+    (knowledge_retrieval settings), or None if the index is not available or
+    no section reaches min_score. Generic questions ("precio", "cómo
+    funciona") match no section, and the fixed sections alone carry no
+    product facts, so the caller then sends the whole system prompt.
+    """
+    index = load_knowledge_index(settings['s3_key'])
+    if index is None:
+        return None
+
+    started = time.perf_counter()
+    prompt, retrieved = index.build_prompt(query, settings)
+    logger.info(f"Knowledge retrieval: {len(retrieved)} sections "
+                f"({', '.join(index.sections[position]['heading'] for position in retrieved) or 'none, using the whole prompt'}) "
+                f"in {(time.perf_counter() - started) * 1000:.2f} ms")
+    return prompt if retrieved else None
@@ -0,0 +1,288 @@
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from aws_clients import get_resource, get_table
+from fanout import DEFAULT_MAX_WORKERS, get_executor
+from lead_store import (
+    GUARD_ID_PREFIX,
+    MAX_CONTACT_METHODS_PER_TRANSACTION,
+    contact_method_items,
+    guard_id,
+    legacy_lookup_enabled,
+    lookup_legacy_owner,
+    make_type_value,
+    put_guard,
+    read_guard,
+    release_guard,
+    validate_contact_method
+)
+from write_batch import BATCH_WRITE_MAX_ITEMS, batch_put
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+BATCH_GET_LIMIT = 100
+BATCH_GET_MAX_ATTEMPTS = 5
+
+# Per-row result statuses
+CREATED = 'created'
+EXISTS = 'exists'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+FAILED = 'error'
+
+
+def row_result(row: int, status: str, lead_id: Optional[str] = None, error: Optional[str] = None) -> Dict[str, Any]:
+    result = {'row': row, 'status': status}
+    if lead_id:
+        result['lead_id'] = lead_id
+    if error:
+        result['error'] = error
+    return result
+
+
+def parse_row(row: Any) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+    """Validated contact methods of a lead row (first one primary), or the validation error"""
+    if not isinstance(row, dict):
+        return None, "Row must be a JSON object"
+    if row.get('lead_id'):
+        return None, "lead_id is not supported in bulk imports"
+    contact_methods = row.get('contact_methods')
+    if not isinstance(contact_methods, list) or not contact_methods:
+        return None, "At least one contact method is required"
+    if len(contact_methods) > MAX_CONTACT_METHODS_PER_TRANSACTION:
+        return None, f"At most {MAX_CONTACT_METHODS_PER_TRANSACTION} contact methods per lead"
+
+    normalized = []
+    for i, contact_method in enumerate(contact_methods):
+        error = validate_contact_method(contact_method) if isinstance(contact_method, dict) else "Must be an object"
+        if error:
+            return None, f"Contact method {i + 1}: {error}"
+        normalized.append({'type': contact_method['type'], 'value': contact_method['value'].strip(), 'is_primary': i == 0})
+
+    type_values = [make_type_value(cm['type'], cm['value']) for cm in normalized]
+    if len(set(type_values)) < len(type_values):
+        return None, "Duplicate contact methods in row"
+    return normalized, None
+
+
+def prepare_rows(rows: List[Any], seen: Set[str], start_row: int = 0) -> Tuple[Dict[int, Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Validate rows and drop those repeating a contact method of an earlier row
+    (tracked in `seen`, which callers keep across chunks of one import).
+    Returns the results of the rejected rows and the rows left to import.
+    """
+    results = {}
+    pending = []
+    for offset, row in enumerate(rows):
+        index = start_row + offset
+        contact_methods, error = parse_row(row)
+        if error:
+            results[index] = row_result(index, INVALID, error=error)
+            continue
+
+        type_values = [make_type_value(cm['type'], cm['value']) for cm in contact_methods]
+        duplicate = next((type_value for type_value in type_values if type_value in seen), None)
+        seen.update(type_values)
+        if duplicate:
+            results[index] = row_result(index, DUPLICATE, error=f"{duplicate} is in an earlier row")
+            continue
+        pending.append({'row': index, 'lead': row, 'contact_methods': contact_methods, 'type_values': type_values})
+    return results, pending
+
+
+def batch_read_guards(type_values: List[str]) -> Dict[str, Dict[str, str]]:
+    """Owners of the contact methods that have a guard (consistent BatchGetItem of up to 100 keys)"""
+    table_name = os.environ['CONTACT_METHODS_TABLE']
+    dynamodb = get_resource('dynamodb')
+    owners = {}
+
+    request = {table_name: {'Keys': [{'id': guard_id(type_value)} for type_value in type_values], 'ConsistentRead': True}}
+    for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(table_name, []):
+            owners[item['id'][len(GUARD_ID_PREFIX):]] = {
+                'lead_id': item['owner_lead_id'],
+                'contact_method_id': item['owner_contact_method_id']
+            }
+
+        request = response.get('UnprocessedKeys')
+        if not request:
+            return owners
+        time.sleep(0.05 * 2 ** attempt)
+    raise Exception(f"{len(request[table_name]['Keys'])} guards left unprocessed by BatchGetItem")
+
+
+def find_owners(type_values: List[str], executor: ThreadPoolExecutor) -> Dict[str, Dict[str, str]]:
+    """
+    Owners of the contact methods that already exist: guards are read in
+    concurrent BatchGetItem requests, contact methods without a guard (while
+    LEGACY_CONTACT_LOOKUP is on) with concurrent type-value-index queries.
+    """
+    owners = {}
+    chunks = [type_values[start:start + BATCH_GET_LIMIT] for start in range(0, len(type_values), BATCH_GET_LIMIT)]
+    for chunk_owners in executor.map(batch_read_guards, chunks):
+        owners.update(chunk_owners)
+
+    if legacy_lookup_enabled():
+        missing = [type_value for type_value in type_values if type_value not in owners]
+        for type_value, owner in zip(missing, executor.map(lookup_legacy_owner, missing)):
+            if owner:
+                owners[type_value] = owner
+    return owners
+
+
+def build_new_lead(pending: Dict[str, Any], timestamp: str) -> Dict[str, Any]:
+    """Lead, contact method, settings and guard items of a row to create"""
+    lead_id = str(uuid.uuid4())
+    lead = pending['lead']
+    items = [(os.environ['LEADS_TABLE'], {
+        'id': lead_id,
+        'name': str(lead.get('name') or '').strip(),
+        'metadata': lead.get('metadata') or {},
+        'created_at': timestamp,
+        'updated_at': timestamp
+    }, None)]
+    guards = []
+    for contact_method, type_value in zip(pending['contact_methods'], pending['type_values']):
+        _, contact_method_item, settings_item = contact_method_items(
+            lead_id, contact_method['type'], contact_method['value'], contact_method['is_primary'], timestamp
+        )
+        items.append((os.environ['CONTACT_METHODS_TABLE'], contact_method_item, None))
+        items.append((os.environ['CONTACT_METHOD_SETTINGS_TABLE'], settings_item, None))
+        guards.append((type_value, contact_method_item['id']))
+    return {'row': pending['row'], 'lead_id': lead_id, 'items': items, 'guards': guards, 'timestamp': timestamp}
+
+
+def claim_guards(new_lead: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Claim the guards of a lead whose items are written (conditional puts, as
+    the single-lead transaction does) and return the row's result. A contact
+    method is only ever resolved to a lead that exists: if one already
+    belongs to another lead, or a claim fails, the guards claimed for the
+    row are released and its items deleted.
+    """
+    lead_id = new_lead['lead_id']
+    claimed = []
+    try:
+        for type_value, contact_method_id in new_lead['guards']:
+            if not put_guard(type_value, lead_id, contact_method_id, new_lead['timestamp']):
+                owner = read_guard(type_value)
+                # A message's legacy lookup may have created the guard from this lead's own contact method
+                if not owner or owner['lead_id'] != lead_id:
+                    discard_lead(new_lead, claimed)
+                    return row_result(new_lead['row'], EXISTS, lead_id=owner and owner['lead_id'],
+                                      error=f"{type_value} already exists")
+            claimed.append(type_value)
+        return row_result(new_lead['row'], CREATED, lead_id=lead_id)
+    except Exception as e:
+        discard_lead(new_lead, claimed)
+        return row_result(new_lead['row'], FAILED, error=str(e))
+
+
+def release_guards(lead_id: str, type_values: Iterable[str]):
+    for type_value in type_values:
+        try:
+            release_guard(type_value, lead_id)
+        except Exception as e:
+            logger.error(f"Could not release guard {type_value} of lead {lead_id}: {str(e)}")
+
+
+def discard_lead(new_lead: Dict[str, Any], claimed: Iterable[str] = ()):
+    """
+    Release the guards claimed for a lead, then delete whatever of its items
+    may have been written (settings and contact methods before the lead item)
+    """
+    release_guards(new_lead['lead_id'], claimed)
+    for table_name, item, _ in reversed(new_lead['items']):
+        try:
+            get_table(table_name).delete_item(Key={'id': item['id']})
+        except Exception as e:
+            logger.error(f"Could not delete {item['id']} of lead {new_lead['lead_id']} from {table_name}: {str(e)}")
+
+
+def write_group(new_leads: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Write the items of whole leads with BatchWriteItem. The puts are idempotent,
+    so a batch that keeps failing is retried item by item; leads still failing
+    are discarded. Returns the written leads and the results of the failed rows.
+    """
+    items = [item for new_lead in new_leads for item in new_lead['items']]
+    try:
+        batch_put(items)
+    except Exception as e:
+        logger.warning(f"BatchWriteItem of {len(new_leads)} leads failed ({str(e)}), writing their items one by one")
+        written, failed = [], []
+        for new_lead in new_leads:
+            try:
+                for table_name, item, _ in new_lead['items']:
+                    get_table(table_name).put_item(Item=item)
+                written.append(new_lead)
+            except Exception as e:
+                discard_lead(new_lead)
+                failed.append(row_result(new_lead['row'], FAILED, error=str(e)))
+        return written, failed
+    return new_leads, []
+
+
+def group_leads(new_leads: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Pack leads into groups of at most one BatchWriteItem (a lead is never split between groups)"""
+    groups = []
+    group, group_items = [], 0
+    for new_lead in new_leads:
+        if group and group_items + len(new_lead['items']) > BATCH_WRITE_MAX_ITEMS:
+            groups.append(group)
+            group, group_items = [], 0
+        group.append(new_lead)
+        group_items += len(new_lead['items'])
+    if group:
+        groups.append(group)
+    return groups
+
+
+def import_leads(rows: List[Any], seen: Optional[Set[str]] = None, start_row: int = 0,
+                 max_workers: int = DEFAULT_MAX_WORKERS, timestamp: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Import many leads ({'name', 'metadata', 'contact_methods'} rows, as the
+    single-lead API body) and return one result per row, in order: created
+    (with lead_id), exists (a contact method belongs to lead_id), duplicate
+    (of an earlier row), invalid or error.
+
+    Existing contact methods are checked with concurrent BatchGetItem reads,
+    then the lead, contact method and settings items of the new leads are
+    written with concurrent BatchWriteItem requests (unprocessed items
+    retried), and only then does each lead claim its guards with concurrent
+    conditional puts. A guard therefore always points to a complete lead, and
+    rows whose contact methods were taken meanwhile by messages or other
+    imports are deleted again instead of duplicating a lead.
+    """
+    seen = set() if seen is None else seen
+    timestamp = timestamp or datetime.utcnow().isoformat()
+    results, pending = prepare_rows(rows, seen, start_row)
+    executor = get_executor(max_workers)
+
+    owners = find_owners([type_value for row in pending for type_value in row['type_values']], executor)
+    new_leads = []
+    for row in pending:
+        owned = next((type_value for type_value in row['type_values'] if type_value in owners), None)
+        if owned:
+            results[row['row']] = row_result(row['row'], EXISTS, lead_id=owners[owned]['lead_id'],
+                                             error=f"{owned} already exists")
+        else:
+            new_leads.append(build_new_lead(row, timestamp))
+
+    written = []
+    for group_written, failed in executor.map(write_group, group_leads(new_leads)):
+        written.extend(group_written)
+        for result in failed:
+            results[result['row']] = result
+
+    for result in executor.map(claim_guards, written):
+        results[result['row']] = result
+
+    return [results[start_row + offset] for offset in range(len(rows))]
@@ -0,0 +1,120 @@
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from aws_clients import get_table
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Lead attributes the reputation is computed from
+REPUTATION_ATTRIBUTES = ['legit_message_count', 'last_spam_at', 'is_customer', 'created_at']
+
+
+def get_lead_reputation(lead_id: str) -> Dict[str, Any]:
+    """Read the reputation attributes of a lead (only those attributes are fetched)"""
+    leads_table = get_table(os.environ['LEADS_TABLE'])
+    response = leads_table.get_item(
+        Key={'id': lead_id},
+        ProjectionExpression=', '.join(f'#{attribute}' for attribute in REPUTATION_ATTRIBUTES),
+        ExpressionAttributeNames={f'#{attribute}': attribute for attribute in REPUTATION_ATTRIBUTES}
+    )
+    return response.get('Item', {})
+
+
+def days_since(timestamp: Optional[str], now: datetime) -> Optional[float]:
+    if not timestamp:
+        return None
+    return (now - datetime.fromisoformat(timestamp)).total_seconds() / 86400
+
+
+def reputation_score(reputation: Dict[str, Any], settings: Dict[str, Any],
+                     now: Optional[datetime] = None) -> float:
+    """
+    Score a lead from its reputation attributes (spam_detection.reputation settings):
+    points per legitimate message and per day without spam (both capped),
+    plus a bonus for leads marked as customers by a human.
+    Leads with spam more recent than min_days_since_spam score 0.
+    """
+    now = now or datetime.now()
+    days_since_spam = days_since(reputation.get('last_spam_at'), now)
+    if days_since_spam is not None and days_since_spam < settings.get('min_days_since_spam', 30):
+        return 0.0
+
+    # Days clean count from the last spam, or from the first contact if there was none
+    clean_days = days_since_spam if days_since_spam is not None else days_since(reputation.get('created_at'), now) or 0
+
+    score = min(
+        int(reputation.get('legit_message_count', 0)) * settings.get('points_per_legit_message', 1),
+        settings.get('max_message_points', 60)
+    )
+    score += min(clean_days * settings.get('points_per_clean_day', 1), settings.get('max_clean_day_points', 30))
+    if reputation.get('is_customer'):
+        score += settings.get('customer_points', 100)
+    return float(score)
+
+
+def is_trusted_lead(lead_id: str, config: Dict[str, Any]) -> bool:
+    """
+    True if the lead's reputation reaches spam_detection.reputation.bypass_threshold,
+    meaning spam detection can be skipped for its messages.
+    """
+    settings = config['spam_detection'].get('reputation', {})
+    if not settings.get('enabled'):
+        return False
+
+    try:
+        score = reputation_score(get_lead_reputation(lead_id), settings)
+    except Exception as e:
+        logger.warning(f"Could not compute reputation for lead {lead_id}: {str(e)}")
+        return False
+
+    trusted = score >= settings['bypass_threshold']
+    logger.info(f"Lead {lead_id} reputation score {score:.0f} (bypass threshold {settings['bypass_threshold']}): "
+                f"{'trusted' if trusted else 'not trusted'}")
+    return trusted
+
+
+def record_legit_message(lead_id: str):
+    """Count a message that went through the normal (non-spam) flow, without failing the caller"""
+    try:
+        get_table(os.environ['LEADS_TABLE']).update_item(
+            Key={'id': lead_id},
+            UpdateExpression='ADD legit_message_count :one',
+            ConditionExpression='attribute_exists(id)',
+            ExpressionAttributeValues={':one': 1}
+        )
+    except Exception as e:
+        logger.warning(f"Could not update reputation of lead {lead_id}: {str(e)}")
+
+
+def record_spam_message(lead_id: str, timestamp: str):
+    """Remember the latest spam activity of the lead, without failing the caller"""
+    try:
+        get_table(os.environ['LEADS_TABLE']).update_item(
+            Key={'id': lead_id},
+            UpdateExpression='SET last_spam_at = :timestamp',
+            ConditionExpression='attribute_exists(id)',
+            ExpressionAttributeValues={':timestamp': timestamp}
+        )
+    except Exception as e:
+        logger.warning(f"Could not update reputation of lead {lead_id}: {str(e)}")
+
+
+def set_customer(lead_id: str, is_customer: bool) -> bool:
+    """Mark or unmark a lead as customer. Returns False if the lead does not exist."""
+    leads_table = get_table(os.environ['LEADS_TABLE'])
+    try:
+        leads_table.update_item(
+            Key={'id': lead_id},
+            UpdateExpression='SET is_customer = :is_customer, updated_at = :updated_at',
+            ConditionExpression='attribute_exists(id)',
+            ExpressionAttributeValues={
+                ':is_customer': is_customer,
+                ':updated_at': datetime.now().isoformat()
+            }
+        )
+    except leads_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
@@ -0,0 +1,327 @@
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from aws_clients import get_table
+from lru_cache import LRUCache
+from write_batch import TRANSACTION_MAX_ITEMS, WriteBatch
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Uniqueness guards live in the contact methods table under 'type_value#<type>#<value>'.
+# They carry no lead_id / type_value attribute, so neither GSI ever returns them.
+GUARD_ID_PREFIX = 'type_value#'
+GUARD_ITEM_TYPE = 'type_value_guard'
+NOT_EXISTS_CONDITION = 'attribute_not_exists(id)'
+
+VALID_CONTACT_TYPES = ['phone', 'email', 'other']
+
+TRANSACTION_ATTEMPTS = 3
+# Guard, contact method and settings item per contact method, plus the lead item
+MAX_CONTACT_METHODS_PER_TRANSACTION = (TRANSACTION_MAX_ITEMS - 1) // 3
+
+DEFAULT_CACHE_ENTRIES = 10000
+DEFAULT_CACHE_TTL_SECONDS = 24 * 3600
+DEFAULT_NEGATIVE_TTL_SECONDS = 30
+
+# In-process tier over the guards (type_value -> owner), kept across warm invocations.
+# A contact method's owner never changes once created; NO_OWNER entries are only a
+# hint, since creating still goes through the guard condition.
+owner_cache = LRUCache(DEFAULT_CACHE_ENTRIES, DEFAULT_CACHE_TTL_SECONDS)
+NO_OWNER = 'no_owner'
+
+# Per-container counters used for the hit rate logs
+cache_stats = {
+    'lookups': 0,
+    'hits': 0,
+    'negative_hits': 0
+}
+
+
+class ContactMethodExistsError(Exception):
+    """A contact method (type#value) is already owned by a lead"""
+
+    def __init__(self, type_value: str, lead_id: str, contact_method_id: str):
+        super().__init__(f"Contact method {type_value} already exists (lead {lead_id})")
+        self.type_value = type_value
+        self.lead_id = lead_id
+        self.contact_method_id = contact_method_id
+
+
+def validate_contact_method(contact_method: Dict[str, Any]) -> Optional[str]:
+    """Validate contact method data; returns the error message or None"""
+    for field in ('type', 'value'):
+        if field not in contact_method:
+            return f"Missing required field: {field}"
+
+    if contact_method['type'] not in VALID_CONTACT_TYPES:
+        return f"Invalid contact method type. Must be one of: {', '.join(VALID_CONTACT_TYPES)}"
+
+    if not isinstance(contact_method['value'], str) or not contact_method['value'].strip():
+        return "Contact method value cannot be empty"
+
+    return None
+
+
+def make_type_value(contact_type: str, value: str) -> str:
+    return f"{contact_type}#{value}"
+
+
+def guard_id(type_value: str) -> str:
+    return f"{GUARD_ID_PREFIX}{type_value}"
+
+
+def legacy_lookup_enabled() -> bool:
+    """Fall back to the type-value-index for contact methods created before the guards (until backfilled)"""
+    return os.environ.get('LEGACY_CONTACT_LOOKUP', 'true').lower() == 'true'
+
+
+def guard_item(type_value: str, lead_id: str, contact_method_id: str, timestamp: str) -> Dict[str, Any]:
+    return {
+        'id': guard_id(type_value),
+        'item_type': GUARD_ITEM_TYPE,
+        'owner_lead_id': lead_id,
+        'owner_contact_method_id': contact_method_id,
+        'created_at': timestamp
+    }
+
+
+def put_guard(type_value: str, lead_id: str, contact_method_id: str, timestamp: Optional[str] = None) -> bool:
+    """Create the guard of an existing contact method; False if there already is one"""
+    try:
+        get_table(os.environ['CONTACT_METHODS_TABLE']).put_item(
+            Item=guard_item(type_value, lead_id, contact_method_id, timestamp or datetime.now().isoformat()),
+            ConditionExpression=NOT_EXISTS_CONDITION
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+
+def release_guard(type_value: str, lead_id: str):
+    """Delete a guard claimed by lead_id whose lead was not written (left alone if another lead owns it)"""
+    try:
+        get_table(os.environ['CONTACT_METHODS_TABLE']).delete_item(
+            Key={'id': guard_id(type_value)},
+            ConditionExpression='owner_lead_id = :lead_id',
+            ExpressionAttributeValues={':lead_id': lead_id}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+def read_guard(type_value: str) -> Optional[Dict[str, str]]:
+    """Owner of a contact method from its guard (strongly consistent read)"""
+    item = get_table(os.environ['CONTACT_METHODS_TABLE']).get_item(
+        Key={'id': guard_id(type_value)}, ConsistentRead=True
+    ).get('Item')
+    if not item:
+        return None
+    return {'lead_id': item['owner_lead_id'], 'contact_method_id': item['owner_contact_method_id']}
+
+
+def get_contact_method_owner(type_value: str) -> Optional[Dict[str, str]]:
+    """
+    lead_id and contact_method_id owning a contact method, or None. Reads the
+    guard; contact methods older than the guards are looked up in the
+    type-value-index and get their guard created on the way.
+    """
+    owner = read_guard(type_value)
+    if owner or not legacy_lookup_enabled():
+        return owner
+    return lookup_legacy_owner(type_value)
+
+
+def lookup_legacy_owner(type_value: str) -> Optional[Dict[str, str]]:
+    """Owner of a contact method without a guard, from the type-value-index (creating its guard)"""
+    response = get_table(os.environ['CONTACT_METHODS_TABLE']).query(
+        IndexName='type-value-index',
+        KeyConditionExpression=Key('type_value').eq(type_value)
+    )
+    if not response['Items']:
+        return None
+
+    contact_method = response['Items'][0]
+    if put_guard(type_value, contact_method['lead_id'], contact_method['id']):
+        logger.info(f"Created missing guard for {type_value}")
+        return {'lead_id': contact_method['lead_id'], 'contact_method_id': contact_method['id']}
+    return read_guard(type_value)
+
+
+def get_lead_cache_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    return config.get('lead_cache', {})
+
+
+def log_cache_stats(source: str):
+    """Log how this lookup was resolved and the container-wide hit rate"""
+    lookups = cache_stats['lookups']
+    hit_rate = cache_stats['hits'] / lookups if lookups else 0.0
+    logger.info(
+        f"Lead cache: {source} | hit rate {hit_rate:.1%} ({cache_stats['hits']}/{lookups}, "
+        f"negative {cache_stats['negative_hits']}) | {len(owner_cache)} entries"
+    )
+
+
+def remember_owner(type_value: str, owner: Optional[Dict[str, str]], cache_settings: Optional[Dict[str, Any]]):
+    """Cache an owner, or its absence for negative_ttl_seconds (0 disables negative entries)"""
+    if not cache_settings or not cache_settings.get('enabled'):
+        return
+    if owner:
+        owner_cache.put(type_value, owner)
+        return
+    negative_ttl_seconds = cache_settings.get('negative_ttl_seconds', DEFAULT_NEGATIVE_TTL_SECONDS)
+    if negative_ttl_seconds > 0:
+        owner_cache.put(type_value, NO_OWNER, negative_ttl_seconds)
+
+
+def find_owner(type_value: str, cache_settings: Optional[Dict[str, Any]] = None) -> Tuple[Optional[Dict[str, str]], str]:
+    """
+    Owner of a contact method through the in-process cache (when enabled), then
+    the guard. Returns the owner (or None) and how it was resolved: 'hit',
+    'negative_hit', 'miss' or 'uncached'.
+    """
+    if not cache_settings or not cache_settings.get('enabled'):
+        return get_contact_method_owner(type_value), 'uncached'
+
+    owner_cache.resize(
+        cache_settings.get('max_entries', DEFAULT_CACHE_ENTRIES),
+        cache_settings.get('ttl_seconds', DEFAULT_CACHE_TTL_SECONDS)
+    )
+    cache_stats['lookups'] += 1
+    cached = owner_cache.get(type_value)
+    if cached == NO_OWNER:
+        cache_stats['hits'] += 1
+        cache_stats['negative_hits'] += 1
+        return None, 'negative_hit'
+    if cached is not None:
+        cache_stats['hits'] += 1
+        return cached, 'hit'
+
+    owner = get_contact_method_owner(type_value)
+    remember_owner(type_value, owner, cache_settings)
+    return owner, 'miss'
+
+
+def contact_method_items(lead_id: str, contact_type: str, value: str, is_primary: bool,
+                         timestamp: str) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Guard, contact method and settings items of a new contact method"""
+    contact_method_id = str(uuid.uuid4())
+    type_value = make_type_value(contact_type, value)
+    contact_method_item = {
+        'id': contact_method_id,
+        'lead_id': lead_id,
+        'type': contact_type,
+        'value': value,
+        'type_value': type_value,
+        'created_at': timestamp,
+        'updated_at': timestamp
+    }
+    settings_item = {
+        'id': str(uuid.uuid4()),
+        'contact_method_id': contact_method_id,
+        'is_primary': is_primary,
+        'is_active': True,
+        'created_at': timestamp,
+        'updated_at': timestamp
+    }
+    return guard_item(type_value, lead_id, contact_method_id, timestamp), contact_method_item, settings_item
+
+
+def cancellation_codes(error: ClientError) -> List[str]:
+    """Per-item reason codes of a cancelled transaction ('None' for the items that passed)"""
+    return [reason.get('Code', 'None') for reason in error.response.get('CancellationReasons', [])]
+
+
+def create_contact_methods(lead_id: str, contact_methods: List[Dict[str, Any]],
+                           lead_item: Optional[Dict[str, Any]] = None,
+                           timestamp: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Create contact methods ({'type', 'value', 'is_primary'}) for a lead, and the
+    lead itself when lead_item is given, in one transaction: all items are
+    written or none. Every contact method's guard is conditional on not
+    existing, so a type#value already owned by any lead raises
+    ContactMethodExistsError with the owner's ids. Returns the contact method
+    and settings items written, in order.
+    """
+    if len(contact_methods) > MAX_CONTACT_METHODS_PER_TRANSACTION:
+        raise ValueError(f"At most {MAX_CONTACT_METHODS_PER_TRANSACTION} contact methods can be created at once")
+    timestamp = timestamp or datetime.now().isoformat()
+    contact_methods_table = os.environ['CONTACT_METHODS_TABLE']
+    settings_table = os.environ['CONTACT_METHOD_SETTINGS_TABLE']
+
+    puts = []
+    created = []
+    if lead_item:
+        puts.append((os.environ['LEADS_TABLE'], lead_item, None))
+    for contact_method in contact_methods:
+        guard, contact_method_item, settings_item = contact_method_items(
+            lead_id, contact_method['type'], contact_method['value'], contact_method.get('is_primary', False), timestamp
+        )
+        puts.extend([(contact_methods_table, guard, NOT_EXISTS_CONDITION),
+                     (contact_methods_table, contact_method_item, None),
+                     (settings_table, settings_item, None)])
+        created.append({'contact_method': contact_method_item, 'settings': settings_item})
+
+    for attempt in range(1, TRANSACTION_ATTEMPTS + 1):
+        batch = WriteBatch(atomic=True)
+        for table_name, item, condition_expression in puts:
+            batch.put(table_name, item, condition_expression)
+        try:
+            batch.flush()
+            return created
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            codes = cancellation_codes(e)
+            for (_, item, _), code in zip(puts, codes):
+                if code == 'ConditionalCheckFailed' and item.get('item_type') == GUARD_ITEM_TYPE:
+                    type_value = item['id'][len(GUARD_ID_PREFIX):]
+                    owner = read_guard(type_value)
+                    if not owner:
+                        raise
+                    raise ContactMethodExistsError(type_value, owner['lead_id'], owner['contact_method_id'])
+            if 'TransactionConflict' not in codes or attempt == TRANSACTION_ATTEMPTS:
+                raise
+            logger.warning(f"Contact method transaction conflicted (attempt {attempt}), retrying")
+
+
+def get_or_create_lead(contact_type: str, value: str, lead_fields: Dict[str, Any],
+                       timestamp: Optional[str] = None,
+                       cache_settings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Lead owning a contact method, creating the lead with it as primary contact
+    method when there is none. Safe under concurrency: when two invocations
+    create the same contact method at once, exactly one transaction succeeds and
+    the other returns the winner's ids. Returns lead_id, contact_method_id and
+    whether they were created.
+    """
+    type_value = make_type_value(contact_type, value)
+    owner, source = find_owner(type_value, cache_settings)
+    if source != 'uncached':
+        log_cache_stats(source)
+    if owner:
+        return {**owner, 'created': False}
+
+    lead_id = str(uuid.uuid4())
+    timestamp = timestamp or datetime.now().isoformat()
+    lead_item = {'id': lead_id, **lead_fields, 'created_at': timestamp, 'updated_at': timestamp}
+    try:
+        created = create_contact_methods(
+            lead_id, [{'type': contact_type, 'value': value, 'is_primary': True}], lead_item=lead_item, timestamp=timestamp
+        )
+    except ContactMethodExistsError as e:
+        logger.info(f"{type_value} was created concurrently by lead {e.lead_id}")
+        remember_owner(type_value, {'lead_id': e.lead_id, 'contact_method_id': e.contact_method_id}, cache_settings)
+        return {'lead_id': e.lead_id, 'contact_method_id': e.contact_method_id, 'created': False}
+    contact_method_id = created[0]['contact_method']['id']
+    remember_owner(type_value, {'lead_id': lead_id, 'contact_method_id': contact_method_id}, cache_settings)
+    return {'lead_id': lead_id, 'contact_method_id': contact_method_id, 'created': True}
@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List
+
+from botocore.exceptions import ClientError
+
+from aws_clients import get_table
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# A burst whose pipeline run never collected it (e.g. failed to start) is
+# reopened by the next message once it is this many seconds past its window
+STALE_BUFFER_GRACE_SECONDS = 30
+
+# Buffers are removed by DynamoDB TTL if nothing ever collects them
+BUFFER_TTL_SECONDS = 3600
+
+
+def get_buffer_key(flow_input: Dict[str, Any]) -> str:
+    """Buffer key for a sender: platform#From"""
+    return f"{flow_input['platform']}#{flow_input['From']}"
+
+
+def get_debounce_window(config: Dict[str, Any], platform: str) -> int:
+    """Return the debounce window in seconds for a platform (0 when disabled)"""
+    debounce_config = config.get('message_debounce', {})
+    if platform not in debounce_config.get('platforms', []):
+        return 0
+    return int(debounce_config.get('window_seconds', 0))
+
+
+def buffer_message(flow_input: Dict[str, Any], window_seconds: int) -> bool:
+    """
+    Append a message to its sender's buffer.
+    Returns True if the message opened a new burst, meaning the caller must
+    start the pipeline run that will collect the buffer after the window.
+    """
+    buffer_table = get_table(os.environ['MESSAGE_BUFFER_TABLE'])
+
+    now = int(time.time())
+    response = buffer_table.update_item(
+        Key={'buffer_key': get_buffer_key(flow_input)},
+        UpdateExpression=(
+            'SET messages = list_append(if_not_exists(messages, :empty), :message), '
+            'opened_at = if_not_exists(opened_at, :now), expires_at = :expires_at'
+        ),
+        ExpressionAttributeValues={
+            ':empty': [],
+            ':message': [json.dumps(flow_input)],
+            ':now': now,
+            ':expires_at': now + BUFFER_TTL_SECONDS
+        },
+        ReturnValues='UPDATED_NEW'
+    )
+
+    attributes = response['Attributes']
+    if len(attributes['messages']) == 1:
+        return True
+
+    # Reopen bursts that were never collected so buffered messages are not stranded
+    opened_at = int(attributes.get('opened_at', now))
+    if now - opened_at <= window_seconds + STALE_BUFFER_GRACE_SECONDS:
+        return False
+
+    try:
+        # Only one concurrent message wins the reopen
+        buffer_table.update_item(
+            Key={'buffer_key': get_buffer_key(flow_input)},
+            UpdateExpression='SET opened_at = :now',
+            ConditionExpression='opened_at = :opened_at',
+            ExpressionAttributeValues={':now': now, ':opened_at': opened_at}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+    logger.warning(f"Buffer for {get_buffer_key(flow_input)} was never collected, starting a new run")
+    return True
+
+
+def collect_buffered_messages(buffer_key: str) -> List[Dict[str, Any]]:
+    """
+    Atomically remove and return all buffered messages for a sender.
+    Returns an empty list if another run already collected them.
+    """
+    buffer_table = get_table(os.environ['MESSAGE_BUFFER_TABLE'])
+
+    response = buffer_table.delete_item(
+        Key={'buffer_key': buffer_key},
+        ReturnValues='ALL_OLD'
+    )
+
+    raw_messages = response.get('Attributes', {}).get('messages', [])
+    return [json.loads(raw_message) for raw_message in raw_messages]
+
+
+def merge_buffered_messages(messages: List[Dict[str, Any]], separator: str = '\n') -> Dict[str, Any]:
+    """
+    Merge a burst of messages into a single flow_input.
+    Sender fields come from the first message, Body is the concatenation of all
+    bodies and MessageSid is the latest one.
+    """
+    merged = dict(messages[0])
+    merged['Body'] = separator.join(
+        message.get('Body', '').strip() for message in messages if message.get('Body', '').strip()
+    )
+    merged['MessageSid'] = messages[-1].get('MessageSid', merged.get('MessageSid', ''))
+    merged['metadata'] = {
+        **merged.get('metadata', {}),
+        'bufferedMessageSids': [message.get('MessageSid', '') for message in messages],
+        'bufferedMessageCount': len(messages)
+    }
+    return merged
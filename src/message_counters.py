@@ -0,0 +1,85 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from aws_clients import get_table
+from spam_windows import day_window_start
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def get_counter_retention_days(config: Dict[str, Any]) -> int:
+    """Days a day bucket must be kept to cover the largest message_limits window"""
+    message_limits = config['spam_detection']['message_limits']
+    return max((days for days, _ in message_limits), default=0) + 1
+
+
+def get_counter_expiry(day: str, retention_days: int) -> int:
+    """Epoch seconds when a day bucket can be removed by DynamoDB TTL"""
+    return int((datetime.fromisoformat(day) + timedelta(days=retention_days + 1)).timestamp())
+
+
+def increment_message_counter(lead_id: str, timestamp: str, config: Dict[str, Any]):
+    """
+    Atomically count an inbound message in the lead's day bucket.
+    `timestamp` is the activity created_at, so buckets line up with the
+    day-based windows of message_limits.
+    """
+    counters_table = get_table(os.environ['LEAD_MESSAGE_COUNTERS_TABLE'])
+    day = timestamp[:10]
+
+    counters_table.update_item(
+        Key={'lead_id': lead_id, 'day': day},
+        UpdateExpression='ADD message_count :one SET expires_at = :expires_at',
+        ExpressionAttributeValues={
+            ':one': 1,
+            ':expires_at': get_counter_expiry(day, get_counter_retention_days(config))
+        }
+    )
+
+
+def record_inbound_message(lead_id: str, timestamp: str, config: Dict[str, Any]):
+    """Increment the message counter without failing the caller if it is unavailable"""
+    try:
+        increment_message_counter(lead_id, timestamp, config)
+    except Exception as e:
+        logger.warning(f"Could not increment message counter for lead {lead_id}: {str(e)}")
+
+
+def evaluate_counter_windows(lead_id: str, message_limits: List[Tuple[int, int]],
+                             now: Optional[datetime] = None) -> List[Tuple[int, int, int]]:
+    """
+    Message counts for each message_limits window read from the day buckets.
+    Reads at most one small item per day of the largest window.
+    Returns (days, limit, count) per window, in the configured order.
+    """
+    if not message_limits:
+        return []
+
+    counters_table = get_table(os.environ['LEAD_MESSAGE_COUNTERS_TABLE'])
+    now = now or datetime.now()
+    starts = [day_window_start(days, now) for days, _ in message_limits]
+
+    query_kwargs = {
+        'KeyConditionExpression': 'lead_id = :lead_id AND #day >= :since',
+        'ProjectionExpression': '#day, message_count',
+        'ExpressionAttributeNames': {'#day': 'day'},
+        'ExpressionAttributeValues': {':lead_id': lead_id, ':since': min(starts)}
+    }
+
+    buckets = []
+    while True:
+        response = counters_table.query(**query_kwargs)
+        buckets.extend((item['day'], int(item.get('message_count', 0))) for item in response['Items'])
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    return [
+        (days, limit, sum(count for day, count in buckets if day >= start))
+        for (days, limit), start in zip(message_limits, starts)
+    ]
@@ -0,0 +1,181 @@
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Sentence ends: stop punctuation followed by whitespace (or the end), or a line break
+SENTENCE_END_PATTERN = re.compile(r'[.!?…]+(?=\s|$)|\n')
+WORD_PATTERN = re.compile(r'\S+')
+# Below U+0300 every code point is a grapheme on its own
+COMPLEX_SCRIPT_PATTERN = re.compile('[^\u0000-\u02ff]')
+
+LENGTH_UNITS = ('code_points', 'utf16')
+
+ZERO_WIDTH_JOINER = '\u200d'
+
+
+def text_length(text: str, unit: str = 'code_points') -> int:
+    """
+    Length as counted by a platform: Python code points, or UTF-16 code units
+    (Twilio/WhatsApp and Telegram count characters outside the BMP, like most emojis, as 2).
+    """
+    if unit == 'utf16':
+        return len(text.encode('utf-16-le')) // 2
+    return len(text)
+
+
+def is_grapheme_extender(char: str) -> bool:
+    """Code points that belong to the previous character's grapheme (marks, emoji modifiers)"""
+    code_point = ord(char)
+    return (
+        unicodedata.category(char) in ('Mn', 'Me', 'Mc')
+        or 0xFE00 <= code_point <= 0xFE0F       # variation selectors
+        or 0x1F3FB <= code_point <= 0x1F3FF     # skin tones
+        or 0xE0020 <= code_point <= 0xE007F     # tag sequences (subdivision flags)
+        or code_point == 0x20E3                 # keycap
+    )
+
+
+def is_regional_indicator(char: str) -> bool:
+    return 0x1F1E6 <= ord(char) <= 0x1F1FF
+
+
+def grapheme_ends(text: str, start: int, end: int) -> Iterable[int]:
+    """
+    End offsets of the grapheme clusters in text[start:end]: a character with
+    its combining marks, emoji modifiers and ZWJ sequences, or a flag pair.
+    """
+    position = start
+    while position < end:
+        following = position + 1
+        if text[position] == '\r' and following < end and text[following] == '\n':
+            following += 1
+        elif is_regional_indicator(text[position]) and following < end and is_regional_indicator(text[following]):
+            following += 1
+        while following < end:
+            if text[following] == ZERO_WIDTH_JOINER:
+                following = min(following + 2, end)
+            elif is_grapheme_extender(text[following]):
+                following += 1
+            else:
+                break
+        yield following
+        position = following
+
+
+def sentence_spans(text: str) -> Iterable[Tuple[int, int]]:
+    """(start, end) of each sentence without its surrounding whitespace"""
+    start = 0
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        yield from trimmed_span(text, start, match.end())
+        start = match.end()
+    yield from trimmed_span(text, start, len(text))
+
+
+def trimmed_span(text: str, start: int, end: int) -> Iterable[Tuple[int, int]]:
+    """The span text[start:end] with its leading and trailing whitespace trimmed, if not empty"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start < end:
+        yield start, end
+
+
+def segment_spans(text: str, max_length: int, unit: str = 'code_points') -> List[Tuple[int, int]]:
+    """
+    Split text into (start, end) spans of at most max_length (in `unit`), in a
+    single pass over the text. Whole sentences are packed greedily; a sentence
+    that does not fit in a message of its own is split at word boundaries, and
+    a word longer than a message at grapheme boundaries. Spans exclude the
+    whitespace between messages.
+    """
+    spans: List[Tuple[int, int]] = []
+    # Current message: start, end and length of text[start:end]
+    current = [0, 0, 0]
+    has_current = False
+
+    if unit == 'code_points':
+        def measure(start: int, end: int) -> int:
+            return end - start
+    else:
+        def measure(start: int, end: int) -> int:
+            return text_length(text[start:end], unit)
+
+    def add(start: int, end: int) -> bool:
+        """Append text[start:end] to the current message, or start a new one; False if it can't fit alone"""
+        nonlocal has_current
+        token_length = measure(start, end)
+        if has_current:
+            joined_length = current[2] + measure(current[1], start) + token_length
+            if joined_length <= max_length:
+                current[1], current[2] = end, joined_length
+                return True
+            spans.append((current[0], current[1]))
+            has_current = False
+        if token_length > max_length:
+            return False
+        current[0], current[1], current[2] = start, end, token_length
+        has_current = True
+        return True
+
+    for sentence_start, sentence_end in sentence_spans(text):
+        if add(sentence_start, sentence_end):
+            continue
+        for word in WORD_PATTERN.finditer(text, sentence_start, sentence_end):
+            if add(word.start(), word.end()):
+                continue
+            grapheme_start = word.start()
+            if not COMPLEX_SCRIPT_PATTERN.search(text, word.start(), word.end()):
+                # Plain word: cut it into full messages directly, the rest continues the packing
+                while word.end() - grapheme_start > max_length:
+                    spans.append((grapheme_start, grapheme_start + max_length))
+                    grapheme_start += max_length
+                add(grapheme_start, word.end())
+                continue
+            for grapheme_end in grapheme_ends(text, word.start(), word.end()):
+                if not add(grapheme_start, grapheme_end):
+                    # A single grapheme longer than the limit is sent on its own
+                    spans.append((grapheme_start, grapheme_end))
+                grapheme_start = grapheme_end
+
+    if has_current:
+        spans.append((current[0], current[1]))
+    return spans
+
+
+def segment_message(text: str, max_length: int, unit: str = 'code_points') -> List[str]:
+    """Messages of at most max_length (in `unit`) covering the text, see segment_spans"""
+    return [text[start:end] for start, end in segment_spans(text, max_length, unit)]
+
+
+def get_length_rules(platform: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Message length rules of a platform from reply_length: the split length
+    (character_limit_fallback, capped by the platform's own platform_max_length)
+    and the unit the platform counts in.
+    """
+    platform_config = config['reply_length'].get(platform, config['reply_length']['default'])
+    max_length = platform_config['character_limit_fallback']
+    if platform_config.get('platform_max_length'):
+        max_length = min(max_length, platform_config['platform_max_length'])
+    unit = platform_config.get('length_unit', 'code_points')
+    if unit not in LENGTH_UNITS:
+        raise ValueError(f"Unknown length_unit {unit} for platform {platform}")
+    return {'max_length': max_length, 'unit': unit}
+
+
+def segment_for_platform(text: str, platform: str, config: Dict[str, Any]) -> List[str]:
+    """Split a reply into messages following the platform's length rules"""
+    rules = get_length_rules(platform, config)
+    return segment_message(text, rules['max_length'], rules['unit'])
+
+
+def stable_prefix_end(text: str) -> int:
+    """
+    Offset up to which a growing text (a streamed reply) only holds complete
+    words: everything before its trailing, possibly incomplete, word. All but
+    the last span of segment_spans(text[:offset]) are final, whatever follows.
+    """
+    if text and text[-1].isspace():
+        return len(text)
+    return max(text.rfind(' '), text.rfind('\n'), text.rfind('\t')) + 1
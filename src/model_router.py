@@ -0,0 +1,120 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from spam_heuristics import normalize_message
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# max_tokens setting used by each stage when no route applies
+DEFAULT_MAX_TOKENS_KEYS = {
+    'spam_detection': 'max_tokens_spam_detection',
+    'conversation': 'max_tokens_conversation'
+}
+
+# Per-container latency and token totals by stage and route
+route_stats: Dict[str, Dict[str, float]] = {}
+
+# Keywords ending in this match any word starting with them ("financ*")
+PREFIX_MARKER = '*'
+
+_intent_patterns: Dict[str, Any] = {}
+
+
+def keyword_pattern(keyword: str) -> str:
+    """Regex of a keyword: whole words, or a word prefix if it ends in PREFIX_MARKER"""
+    is_prefix = keyword.endswith(PREFIX_MARKER)
+    pattern = re.escape(normalize_message(keyword.rstrip(PREFIX_MARKER)))
+    return pattern if is_prefix else pattern + r'\b'
+
+
+def get_intent_patterns(intents: Dict[str, List[str]]):
+    """Compiled keyword pattern per intent (whole words unless marked as prefixes, accent-insensitive)"""
+    cache_key = repr(sorted((name, tuple(keywords)) for name, keywords in intents.items()))
+    if _intent_patterns.get('key') != cache_key:
+        _intent_patterns['key'] = cache_key
+        _intent_patterns['patterns'] = {
+            name: re.compile(r'\b(?:' + '|'.join(keyword_pattern(keyword) for keyword in keywords) + r')')
+            for name, keywords in intents.items() if keywords
+        }
+    return _intent_patterns['patterns']
+
+
+def detect_intents(message: str, intents: Dict[str, List[str]]) -> List[str]:
+    """Names of the configured intents whose keywords appear in the message"""
+    normalized = normalize_message(message)
+    return [name for name, pattern in get_intent_patterns(intents).items() if pattern.search(normalized)]
+
+
+def rule_matches(conditions: Dict[str, Any], message: str, history_turns: int, intents: List[str]) -> bool:
+    """All conditions of a rule must hold; a rule without conditions always matches"""
+    length = len(message)
+    if 'min_message_length' in conditions and length < conditions['min_message_length']:
+        return False
+    if 'max_message_length' in conditions and length > conditions['max_message_length']:
+        return False
+    if 'min_history_turns' in conditions and history_turns < conditions['min_history_turns']:
+        return False
+    if 'max_history_turns' in conditions and history_turns > conditions['max_history_turns']:
+        return False
+    if 'intents' in conditions and not set(conditions['intents']) & set(intents):
+        return False
+    if 'no_intents' in conditions and set(conditions['no_intents']) & set(intents):
+        return False
+    return True
+
+
+def select_route(stage: str, message: str, config: Dict[str, Any], history_turns: int = 0) -> Dict[str, Any]:
+    """
+    Model id and max_tokens for a Bedrock call of a stage ('spam_detection' or
+    'conversation'), from the first matching rule of ai_models.routing.<stage>.
+    Falls back to bedrock_model_id and the stage's max_tokens setting.
+    """
+    ai_models = config['ai_models']
+    route = {
+        'name': 'default',
+        'model_id': ai_models['bedrock_model_id'],
+        'max_tokens': ai_models[DEFAULT_MAX_TOKENS_KEYS[stage]]
+    }
+
+    routing = ai_models.get('routing', {})
+    if not routing.get('enabled'):
+        return route
+
+    intents = detect_intents(message, routing.get('intents', {}))
+    for rule in routing.get(stage, []):
+        if rule_matches(rule.get('when', {}), message, history_turns, intents):
+            route = {
+                'name': rule.get('name', 'unnamed'),
+                'model_id': rule.get('model_id', route['model_id']),
+                'max_tokens': rule.get('max_tokens', route['max_tokens'])
+            }
+            break
+
+    logger.info(f"Model route {stage}/{route['name']}: {route['model_id']} (max_tokens {route['max_tokens']}, "
+                f"{len(message)} chars, {history_turns} history turns, intents {intents or 'none'})")
+    return route
+
+
+def record_route_metrics(stage: str, route: Dict[str, Any], elapsed_ms: float,
+                         usage: Optional[Dict[str, Any]] = None):
+    """Log the latency and token usage of a routed call with the route's running averages"""
+    usage = usage or {}
+    input_tokens = int(usage.get('input_tokens', 0))
+    output_tokens = int(usage.get('output_tokens', 0))
+
+    stats = route_stats.setdefault(f"{stage}/{route['name']}", {
+        'calls': 0, 'ms': 0.0, 'input_tokens': 0, 'output_tokens': 0
+    })
+    stats['calls'] += 1
+    stats['ms'] += elapsed_ms
+    stats['input_tokens'] += input_tokens
+    stats['output_tokens'] += output_tokens
+
+    logger.info(
+        f"Model route {stage}/{route['name']} ({route['model_id']}): {elapsed_ms:.0f} ms, "
+        f"{input_tokens} input / {output_tokens} output tokens | route average "
+        f"{stats['ms'] / stats['calls']:.0f} ms, {stats['output_tokens'] / stats['calls']:.0f} output tokens "
+        f"over {stats['calls']} calls in this container"
+    )
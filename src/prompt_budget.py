@@ -0,0 +1,37 @@
+import math
+from typing import Any, Callable, List
+
+# Conservative characters-per-token ratio for Spanish/English text with Claude
+# models (real ratios are ~3.5-4.5), so estimates err on the side of fewer tokens fitting
+CHARS_PER_TOKEN = 3.5
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a text (no tokenizer call needed)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut a text to about max_tokens, at a word boundary when possible"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(int(max_tokens * CHARS_PER_TOKEN), 0)]
+    if ' ' in cut:
+        cut = cut[:cut.rindex(' ')]
+    return cut.rstrip() + '…' if cut else ''
+
+
+def fit_newest(items: List[Any], max_tokens: int, render: Callable[[Any], str]) -> List[Any]:
+    """
+    Longest prefix of `items` (ordered newest first) whose rendered size fits
+    in max_tokens, so the oldest items are the ones dropped.
+    """
+    kept = []
+    used = 0
+    for item in items:
+        tokens = estimate_tokens(render(item))
+        if used + tokens > max_tokens:
+            break
+        kept.append(item)
+        used += tokens
+    return kept
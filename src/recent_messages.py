@@ -0,0 +1,185 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from aws_clients import get_table
+from conversation_history import hydrate_activities, query_recent_activities
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+DEFAULT_MAX_MESSAGES = 20
+DEFAULT_MAX_TEXT_LENGTH = 1000
+COMPACTION_ATTEMPTS = 3
+# The buffer grows to this many times max_messages before it is compacted back
+# to max_messages, so appends stay single writes between compactions
+GROWTH_FACTOR = 2
+
+
+def get_recent_messages_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    return config.get('recent_messages', {})
+
+
+def make_entry(timestamp: str, direction: str, text: str, settings: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        'timestamp': timestamp,
+        'direction': direction,
+        'text': text[:settings.get('max_text_length', DEFAULT_MAX_TEXT_LENGTH)]
+    }
+
+
+def append_recent_message(lead_id: str, timestamp: str, direction: str, text: str, config: Dict[str, Any]):
+    """Append a message to the lead's recent_messages ring buffer without failing the caller"""
+    append_recent_messages(lead_id, [(timestamp, direction, text)], config)
+
+
+def append_recent_messages(lead_id: str, messages: List[Tuple[str, str, str]], config: Dict[str, Any]):
+    """
+    Append (timestamp, direction, text) messages to the lead's recent_messages
+    ring buffer in one write, without failing the caller.
+    A single conditional UpdateItem appends while the buffer holds fewer than
+    GROWTH_FACTOR * max_messages entries; once it is full (or before it exists)
+    a versioned read-modify-write compacts it back to the last max_messages.
+    Readers take the last entries they need (see to_conversation_history).
+    """
+    settings = get_recent_messages_settings(config)
+    if not settings.get('enabled') or not lead_id or not messages:
+        return
+
+    leads_table = get_table(os.environ['LEADS_TABLE'])
+    entries = [make_entry(timestamp, direction, text, settings) for timestamp, direction, text in messages]
+    max_messages = settings.get('max_messages', DEFAULT_MAX_MESSAGES)
+
+    try:
+        leads_table.update_item(
+            Key={'id': lead_id},
+            UpdateExpression='SET recent_messages = list_append(recent_messages, :entries) '
+                             'ADD recent_messages_version :one',
+            ConditionExpression='attribute_exists(recent_messages) AND size(recent_messages) <= :room',
+            ExpressionAttributeValues={':entries': entries, ':one': 1, ':room': GROWTH_FACTOR * max_messages - len(entries)}
+        )
+    except leads_table.meta.client.exceptions.ConditionalCheckFailedException:
+        compact_and_append(leads_table, lead_id, entries, settings)
+    except Exception as e:
+        logger.warning(f"Could not append to recent messages of lead {lead_id}: {str(e)}")
+
+
+def seed_recent_messages(lead_id: str, settings: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Buffer entries of the lead's last messages in the activities tables"""
+    max_messages = settings.get('max_messages', DEFAULT_MAX_MESSAGES)
+    return build_recent_messages(hydrate_activities(query_recent_activities(lead_id, max_messages)), settings)
+
+
+def merge_entries(messages: List[Dict[str, str]], entries: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Buffer entries plus the new ones, oldest first and without repeats (a
+    seed read from the activities may already include a message that is
+    also appended on its own)
+    """
+    merged = []
+    for entry in messages + entries:
+        if entry not in merged:
+            merged.append(entry)
+    return sorted(merged, key=lambda message: message.get('timestamp', ''))
+
+
+def compact_and_append(leads_table, lead_id: str, entries: List[Dict[str, str]], settings: Dict[str, Any]):
+    """
+    Append to a full buffer and compact it to its last max_messages entries,
+    retrying if another writer got there first. A lead without a buffer yet (created before
+    recent_messages was enabled) gets it seeded from its activities, so the
+    history is not cut to the messages written since.
+    """
+    max_messages = settings.get('max_messages', DEFAULT_MAX_MESSAGES)
+    try:
+        for _ in range(COMPACTION_ATTEMPTS):
+            item = leads_table.get_item(
+                Key={'id': lead_id},
+                ProjectionExpression='id, recent_messages, recent_messages_version',
+                ConsistentRead=True
+            ).get('Item')
+            if item is None:
+                return
+
+            if 'recent_messages' in item:
+                current = item['recent_messages']
+                version = item.get('recent_messages_version')
+                condition = 'recent_messages_version = :version' if version is not None \
+                    else 'attribute_not_exists(recent_messages_version)'
+            else:
+                current = seed_recent_messages(lead_id, settings)
+                version = None
+                condition = 'attribute_not_exists(recent_messages)'
+
+            messages = merge_entries(current, entries)[-max_messages:]
+            try:
+                leads_table.update_item(
+                    Key={'id': lead_id},
+                    UpdateExpression='SET recent_messages = :messages ADD recent_messages_version :one',
+                    ConditionExpression=condition,
+                    ExpressionAttributeValues={
+                        ':messages': messages,
+                        ':one': 1,
+                        **({':version': version} if version is not None else {})
+                    }
+                )
+                return
+            except leads_table.meta.client.exceptions.ConditionalCheckFailedException:
+                continue
+        logger.warning(f"Gave up compacting recent messages of lead {lead_id} after {COMPACTION_ATTEMPTS} attempts")
+    except Exception as e:
+        logger.warning(f"Could not compact recent messages of lead {lead_id}: {str(e)}")
+
+
+def get_lead_conversation(lead_id: str) -> Dict[str, Any]:
+    """
+    Read the lead's conversation state with one GetItem: recent_messages
+    (oldest first, None if not built yet) and the rolling conversation summary.
+    """
+    leads_table = get_table(os.environ['LEADS_TABLE'])
+    item = leads_table.get_item(
+        Key={'id': lead_id},
+        ProjectionExpression='recent_messages, conversation_summary, summary_covered_until'
+    ).get('Item') or {}
+
+    recent_messages = item.get('recent_messages')
+    return {
+        'recent_messages': merge_entries([], recent_messages) if recent_messages is not None else None,
+        'conversation_summary': item.get('conversation_summary', ''),
+        'summary_covered_until': item.get('summary_covered_until', '')
+    }
+
+
+def to_conversation_history(messages: List[Dict[str, str]], limit: int) -> List[Dict[str, str]]:
+    """Last `limit` buffer entries, newest first, in the prompt's conversation history format"""
+    return [
+        {
+            'timestamp': message.get('timestamp', ''),
+            'lead_message': message.get('text', '') if message.get('direction') == 'inbound' else '',
+            'assistant_message': message.get('text', '') if message.get('direction') == 'outbound' else ''
+        }
+        for message in reversed(messages[-limit:] if limit > 0 else [])
+    ]
+
+
+def build_recent_messages(activities: List[Dict[str, Any]], settings: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Buffer entries (oldest first) from activities hydrated with their content"""
+    entries = []
+    for activity in sorted(activities, key=lambda activity: activity.get('created_at', '')):
+        content = activity.get('content')
+        if not content:
+            continue
+        direction = activity.get('direction', 'inbound')
+        text = content.get('leadMessage', '') if direction == 'inbound' else content.get('assistantMessage', '')
+        entries.append(make_entry(activity.get('created_at', ''), direction, text, settings))
+    return entries[-settings.get('max_messages', DEFAULT_MAX_MESSAGES):]
+
+
+def replace_recent_messages(lead_id: str, messages: List[Dict[str, str]]):
+    """Overwrite the lead's buffer (used by the rebuild script)"""
+    get_table(os.environ['LEADS_TABLE']).update_item(
+        Key={'id': lead_id},
+        UpdateExpression='SET recent_messages = :messages ADD recent_messages_version :one',
+        ConditionExpression='attribute_exists(id)',
+        ExpressionAttributeValues={':messages': messages, ':one': 1}
+    )
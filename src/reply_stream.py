@@ -0,0 +1,113 @@
+import json
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from message_segmentation import segment_spans, stable_prefix_end, text_length
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class StreamSegmenter:
+    """
+    Incremental message_segmentation: text is fed as it is generated and a
+    message is emitted as soon as no later text can change it, giving exactly
+    the messages segment_message returns for the whole reply. Each feed
+    re-segments the complete words received so far, which is cheap for replies
+    bounded by max_tokens.
+    """
+
+    def __init__(self, max_length: int, unit: str = 'code_points'):
+        self.max_length = max_length
+        self.unit = unit
+        self.text = ''
+        self.emitted = 0
+
+    def feed(self, text: str) -> List[str]:
+        """Add generated text; returns the messages completed by it"""
+        self.text += text
+        if text_length(self.text, self.unit) <= self.max_length:
+            return []
+        stable = self.text[:stable_prefix_end(self.text)]
+        # The last span can still grow with the next words
+        spans = segment_spans(stable, self.max_length, self.unit)[self.emitted:-1]
+        self.emitted += len(spans)
+        return [stable[start:end] for start, end in spans]
+
+    def close(self) -> List[str]:
+        """The remaining messages, once generation has finished"""
+        spans = segment_spans(self.text, self.max_length, self.unit)[self.emitted:]
+        self.emitted += len(spans)
+        return [self.text[start:end] for start, end in spans]
+
+
+def iter_stream_text(response: Dict[str, Any], usage: Optional[Dict[str, int]] = None) -> Iterable[str]:
+    """
+    Text deltas of an invoke_model_with_response_stream response (Anthropic
+    messages format). Token usage reported by the stream is stored in `usage`.
+    """
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if not chunk:
+            continue
+        payload = json.loads(chunk['bytes'])
+        event_type = payload.get('type')
+        if event_type == 'content_block_delta':
+            yield payload.get('delta', {}).get('text', '')
+        elif usage is not None and event_type == 'message_start':
+            usage.update(payload.get('message', {}).get('usage', {}))
+        elif usage is not None and event_type == 'message_delta':
+            usage.update(payload.get('usage', {}))
+
+
+def stream_reply(response: Dict[str, Any], length_rules: Dict[str, Any], on_message: Callable[[str], Any],
+                 usage: Optional[Dict[str, int]] = None) -> List[str]:
+    """
+    Segment a streamed reply into messages (length_rules from get_length_rules)
+    as it arrives, handing each one to on_message as soon as it is complete.
+    Returns all the messages in order.
+    """
+    segmenter = StreamSegmenter(length_rules['max_length'], length_rules['unit'])
+    messages = []
+    for text in iter_stream_text(response, usage):
+        for message in segmenter.feed(text):
+            messages.append(message)
+            on_message(message)
+    for message in segmenter.close():
+        messages.append(message)
+        on_message(message)
+    return messages
+
+
+class OrderedDispatcher:
+    """
+    Sends messages on a single background thread so reading the stream is not
+    blocked by the platform API, while keeping the messages in order.
+    Records when the first message went out.
+    """
+
+    def __init__(self, send: Callable[[str], Dict[str, Any]], executor: ThreadPoolExecutor):
+        self.send = send
+        self.executor = executor
+        self.futures: List[Future] = []
+        self.started = time.perf_counter()
+        self.first_sent_ms: Optional[float] = None
+
+    def submit(self, message: str):
+        self.futures.append(self.executor.submit(self.send_and_time, message))
+
+    def send_and_time(self, message: str) -> Dict[str, Any]:
+        try:
+            return self.send(message)
+        except Exception as e:
+            logger.error(f"Error dispatching streamed message: {str(e)}")
+            return {'success': False, 'error': str(e)}
+        finally:
+            if self.first_sent_ms is None:
+                self.first_sent_ms = round((time.perf_counter() - self.started) * 1000, 1)
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Wait for every submitted message and return the send results in order"""
+        return [future.result() for future in self.futures]
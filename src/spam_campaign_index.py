@@ -0,0 +1,295 @@
+import hashlib
+import json
+import logging
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aux import get_config_cache_ttl, load_s3_object
+from spam_heuristics import normalize_message
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+INDEX_MAGIC = b'SPAMLSH2'
+HEADER_FORMAT = '<8sBIIIIQI'  # magic, little endian, num_perm, bands, rows, seed, members, metadata bytes
+
+SHINGLE_SIZE = 4
+# Messages with fewer shingles (about 12 normalized characters) are too short to compare
+MIN_SHINGLES = 8
+DEFAULT_NUM_PERM = 32
+DEFAULT_ROWS_PER_BAND = 4
+DEFAULT_SEED = 1
+# Low bits of each MinHash value kept per member to verify band matches (b-bit MinHash)
+VERIFY_MASK = 0xFFFF
+# A match needs this many bands and this estimated Jaccard similarity with a
+# campaign message (see scripts/benchmarks/bench_spam_campaign_index.py)
+DEFAULT_MIN_MATCHING_BANDS = 2
+DEFAULT_MIN_SIMILARITY = 0.8
+# Candidates verified per lookup, those matching the most bands first
+MAX_VERIFIED_CANDIDATES = 64
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Character shingles of the normalized text (robust to small edits and reordering)"""
+    normalized = normalize_message(text)
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def minhash_signature(text: str, num_perm: int = DEFAULT_NUM_PERM, seed: int = DEFAULT_SEED) -> Optional[List[int]]:
+    """
+    MinHash signature of the text, or None if it is too short to compare.
+    Each shingle is hashed once with SHAKE-128 into num_perm 32-bit values
+    (one per hash function), so signatures are stable across processes and
+    cheaper than evaluating num_perm arithmetic hash functions in Python.
+    """
+    text_shingles = shingles(text)
+    if len(text_shingles) < MIN_SHINGLES:
+        return None
+    prefix = seed.to_bytes(4, 'little')
+    values = array('I', b''.join(
+        hashlib.shake_128(prefix + shingle.encode('utf-8')).digest(4 * num_perm) for shingle in text_shingles
+    ))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return [min(values[function::num_perm]) for function in range(num_perm)]
+
+
+def band_keys(signature: List[int], rows_per_band: int) -> List[int]:
+    """64-bit key of each band of the signature; similar texts share at least one key"""
+    return [
+        int.from_bytes(hashlib.blake2b(
+            struct.pack(f'<{rows_per_band}I', *signature[start:start + rows_per_band]), digest_size=8
+        ).digest(), 'little')
+        for start in range(0, len(signature), rows_per_band)
+    ]
+
+
+def verification_values(signature: List[int]) -> List[int]:
+    return [value & VERIFY_MASK for value in signature]
+
+
+def estimate_similarity(signature: List[int], other: List[int]) -> float:
+    """Estimated Jaccard similarity of two texts: share of equal MinHash values"""
+    return sum(value == other_value for value, other_value in zip(signature, other)) / len(signature)
+
+
+class SpamCampaignIndex:
+    """
+    In-memory LSH index of known spam campaign messages.
+    Each band is a sorted array of 64-bit band keys with a parallel array of
+    member ids, so finding candidates is one binary search per band. Every
+    member keeps its cluster id and the low bits of its signature, used to
+    estimate the Jaccard similarity of a candidate before it counts as a match.
+    """
+
+    def __init__(self, num_perm: int, rows_per_band: int, seed: int,
+                 band_key_arrays: List[array], band_member_arrays: List[array],
+                 member_clusters: array, member_signatures: array,
+                 clusters: List[Dict[str, Any]]):
+        self.num_perm = num_perm
+        self.rows_per_band = rows_per_band
+        self.seed = seed
+        self.band_key_arrays = band_key_arrays
+        self.band_member_arrays = band_member_arrays
+        self.member_clusters = member_clusters
+        self.member_signatures = member_signatures
+        self.clusters = clusters
+
+    @property
+    def bands(self) -> int:
+        return self.num_perm // self.rows_per_band
+
+    @property
+    def entries(self) -> int:
+        return len(self.member_clusters)
+
+    @classmethod
+    def build(cls, members: Iterable[Tuple[List[int], int]], clusters: List[Dict[str, Any]],
+              num_perm: int = DEFAULT_NUM_PERM, rows_per_band: int = DEFAULT_ROWS_PER_BAND,
+              seed: int = DEFAULT_SEED) -> 'SpamCampaignIndex':
+        """
+        Build the index from (signature, cluster_id) pairs; signatures must use
+        the same num_perm/seed. Repeated signatures of a cluster are stored once.
+        """
+        bands = num_perm // rows_per_band
+        band_entries = [[] for _ in range(bands)]
+        member_clusters = array('I')
+        member_signatures = array('H')
+        stored = set()
+        for signature, cluster_id in members:
+            if (tuple(signature), cluster_id) in stored:
+                continue
+            stored.add((tuple(signature), cluster_id))
+            member = len(member_clusters)
+            member_clusters.append(cluster_id)
+            member_signatures.extend(verification_values(signature))
+            for band, key in enumerate(band_keys(signature, rows_per_band)):
+                band_entries[band].append((key, member))
+
+        band_key_arrays = []
+        band_member_arrays = []
+        for entries in band_entries:
+            entries.sort()
+            band_key_arrays.append(array('Q', (key for key, _ in entries)))
+            band_member_arrays.append(array('I', (member for _, member in entries)))
+
+        return cls(num_perm, rows_per_band, seed, band_key_arrays, band_member_arrays,
+                   member_clusters, member_signatures, clusters)
+
+    def to_bytes(self) -> bytes:
+        """Serialize as a header, the band arrays, the members and the cluster metadata (JSON)"""
+        metadata = json.dumps(self.clusters).encode('utf-8')
+        parts = [
+            struct.pack(HEADER_FORMAT, INDEX_MAGIC, sys.byteorder == 'little', self.num_perm,
+                        self.bands, self.rows_per_band, self.seed, self.entries, len(metadata))
+        ]
+        for keys, members in zip(self.band_key_arrays, self.band_member_arrays):
+            parts.append(keys.tobytes())
+            parts.append(members.tobytes())
+        parts.append(self.member_clusters.tobytes())
+        parts.append(self.member_signatures.tobytes())
+        parts.append(metadata)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'SpamCampaignIndex':
+        magic, little_endian, num_perm, bands, rows_per_band, seed, members, metadata_size = \
+            struct.unpack_from(HEADER_FORMAT, data)
+        if magic != INDEX_MAGIC:
+            raise ValueError('Not a spam campaign index of this version, rebuild it')
+        swap = bool(little_endian) != (sys.byteorder == 'little')
+        view = memoryview(data)
+        offset = struct.calcsize(HEADER_FORMAT)
+
+        def read_array(typecode: str, count: int) -> array:
+            nonlocal offset
+            values = array(typecode)
+            size = values.itemsize * count
+            values.frombytes(view[offset:offset + size])
+            if swap:
+                values.byteswap()
+            offset += size
+            return values
+
+        band_key_arrays = []
+        band_member_arrays = []
+        for _ in range(bands):
+            band_key_arrays.append(read_array('Q', members))
+            band_member_arrays.append(read_array('I', members))
+        member_clusters = read_array('I', members)
+        member_signatures = read_array('H', members * num_perm)
+        clusters = json.loads(bytes(view[offset:offset + metadata_size]).decode('utf-8'))
+
+        return cls(num_perm, rows_per_band, seed, band_key_arrays, band_member_arrays,
+                   member_clusters, member_signatures, clusters)
+
+    def match_keys(self, keys: List[int]) -> Counter:
+        """Number of matching bands per member id"""
+        matches = Counter()
+        for band, key in enumerate(keys):
+            band_array = self.band_key_arrays[band]
+            position = bisect_left(band_array, key)
+            while position < len(band_array) and band_array[position] == key:
+                matches[self.band_member_arrays[band][position]] += 1
+                position += 1
+        return matches
+
+    def member_similarity(self, member: int, values: List[int]) -> float:
+        start = member * self.num_perm
+        return estimate_similarity(values, self.member_signatures[start:start + self.num_perm])
+
+    def lookup_signature(self, signature: List[int], min_matching_bands: int = DEFAULT_MIN_MATCHING_BANDS,
+                         min_similarity: float = DEFAULT_MIN_SIMILARITY) -> Optional[Dict[str, Any]]:
+        """
+        Most similar campaign message among those matching at least
+        min_matching_bands bands, if its estimated Jaccard similarity reaches
+        min_similarity. Returns the cluster metadata with matching_bands and
+        similarity, or None.
+        """
+        matches = self.match_keys(band_keys(signature, self.rows_per_band))
+        candidates = sorted(((matching_bands, member) for member, matching_bands in matches.items()
+                             if matching_bands >= min_matching_bands), reverse=True)
+        if not candidates:
+            return None
+
+        values = verification_values(signature)
+        best = None
+        for matching_bands, member in candidates[:MAX_VERIFIED_CANDIDATES]:
+            similarity = self.member_similarity(member, values)
+            if similarity >= min_similarity and (best is None or similarity > best[0]):
+                best = (similarity, matching_bands, member)
+        if best is None:
+            return None
+
+        similarity, matching_bands, member = best
+        cluster_id = self.member_clusters[member]
+        return {
+            **self.clusters[cluster_id],
+            'cluster_id': cluster_id,
+            'matching_bands': matching_bands,
+            'similarity': similarity
+        }
+
+    def lookup(self, text: str, min_matching_bands: int = DEFAULT_MIN_MATCHING_BANDS,
+               min_similarity: float = DEFAULT_MIN_SIMILARITY) -> Optional[Dict[str, Any]]:
+        """Find the spam cluster the text is a near-duplicate of (see lookup_signature)"""
+        signature = minhash_signature(text, self.num_perm, self.seed)
+        if signature is None or not self.entries:
+            return None
+        return self.lookup_signature(signature, min_matching_bands, min_similarity)
+
+
+# Skip reloading a missing index until the config cache TTL has passed
+_index_unavailable_at = None
+
+
+def load_campaign_index(s3_key: str) -> Optional[SpamCampaignIndex]:
+    """
+    Load the index from the knowledge bucket, kept in memory on warm containers
+    and revalidated with its ETag like the business config.
+    Returns None if no index has been built yet.
+    """
+    global _index_unavailable_at
+    if _index_unavailable_at and time.monotonic() - _index_unavailable_at < get_config_cache_ttl():
+        return None
+
+    try:
+        entry = load_s3_object(s3_key)
+    except Exception as e:
+        logger.warning(f"Spam campaign index not available: {str(e)}")
+        _index_unavailable_at = time.monotonic()
+        return None
+
+    _index_unavailable_at = None
+    if entry.parsed is None:
+        try:
+            entry.parsed = SpamCampaignIndex.from_bytes(entry.body)
+        except ValueError as e:
+            logger.warning(f"Spam campaign index not usable: {str(e)}")
+            _index_unavailable_at = time.monotonic()
+            return None
+        # The arrays hold their own copy; revalidation only needs the ETag
+        entry.body = None
+        logger.info(f"Loaded spam campaign index: {entry.parsed.entries} signatures, {len(entry.parsed.clusters)} clusters")
+    return entry.parsed
+
+
+def find_spam_campaign(message_body: str, settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Match a message against known spam campaigns (spam_detection.campaign_index settings)"""
+    index = load_campaign_index(settings['s3_key'])
+    if index is None:
+        return None
+
+    started = time.perf_counter()
+    match = index.lookup(message_body, settings.get('min_matching_bands', DEFAULT_MIN_MATCHING_BANDS),
+                         settings.get('min_similarity', DEFAULT_MIN_SIMILARITY))
+    logger.info(f"Spam campaign lookup: {'cluster ' + str(match['cluster_id']) if match else 'no match'} "
+                f"in {(time.perf_counter() - started) * 1000:.2f} ms")
+    return match
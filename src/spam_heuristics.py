@@ -0,0 +1,140 @@
+import hashlib
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Optional
+
+URL_PATTERN = re.compile(r'(?:https?://|www\.)\S+|\b[\w-]+\.(?:com|net|org|info|biz|xyz|top|ly|me|io|shop)\b\S*', re.IGNORECASE)
+# Digits with spaces, dashes or parentheses; dotted or comma-grouped numbers
+# (1.000.000, 2,500,000, 600.123.456) are amounts, not phone numbers
+PHONE_PATTERN = re.compile(r'(?<![\w.,])\+?\d[\d\s()-]{7,}\d(?![\w]|[.,]\d)')
+WORD_PATTERN = re.compile(r'[^\W\d_]{3,}')
+
+# A word with a character repeated this many times in a row is not a real word
+STRETCHED_WORD_RUN = 3
+
+# Code points that only modify how the previous emoji is rendered
+EMOJI_MODIFIERS = {0x200D, 0xFE0E, 0xFE0F} | set(range(0x1F3FB, 0x1F400))
+
+
+def is_emoji(char: str) -> bool:
+    """True for pictographic characters (emojis, symbols, flags)"""
+    code_point = ord(char)
+    return (
+        0x1F000 <= code_point <= 0x1FAFF
+        or 0x2600 <= code_point <= 0x27BF
+        or 0x2300 <= code_point <= 0x23FF
+        or 0x2B00 <= code_point <= 0x2BFF
+        or unicodedata.category(char) == 'So'
+    )
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normalize a message for matching: case, accents, emoji modifiers and
+    whitespace differences are removed, as are leading/trailing punctuation.
+    """
+    decomposed = unicodedata.normalize('NFKD', message.casefold())
+    kept = ''.join(
+        char for char in decomposed
+        if not unicodedata.combining(char) and ord(char) not in EMOJI_MODIFIERS
+    )
+    return ' '.join(kept.split()).strip('.,;:!?¡¿ ')
+
+
+def message_hash(message: str) -> str:
+    """SHA-256 of the normalized message (used for known campaign hashes)"""
+    return hashlib.sha256(normalize_message(message).encode('utf-8')).hexdigest()
+
+
+def character_entropy(text: str) -> float:
+    """Shannon entropy in bits per character, ignoring whitespace"""
+    chars = [char for char in text if not char.isspace()]
+    if not chars:
+        return 0.0
+    total = len(chars)
+    return -sum((count / total) * math.log2(count / total) for count in Counter(chars).values())
+
+
+def longest_character_run(text: str) -> int:
+    """Length of the longest run of the same character"""
+    longest = current = 0
+    previous = None
+    for char in text:
+        current = current + 1 if char == previous else 1
+        previous = char
+        longest = max(longest, current)
+    return longest
+
+
+def has_real_words(text: str) -> bool:
+    """True if the text has a word of 3+ letters without stretched characters ("gracias", not "siiiii")"""
+    return any(longest_character_run(word) < STRETCHED_WORD_RUN for word in WORD_PATTERN.findall(text))
+
+
+def verdict(is_spam: bool, reason: str, rules: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a heuristic verdict with the configured confidence"""
+    return {
+        'is_spam': is_spam,
+        'confidence': rules.get('confidence', 0.95),
+        'reason': reason
+    }
+
+
+def symbols_only(text: str) -> bool:
+    """True if the message has no letters or digits (only emojis, punctuation, symbols)"""
+    return not any(char.isalnum() for char in text if not is_emoji(char))
+
+
+def classify_message(message: str, rules: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Classify obvious spam/ham locally using the spam_detection.heuristics rules.
+    Returns a verdict dict (is_spam, confidence, reason), or None when the
+    message is ambiguous and must be analyzed by Bedrock.
+    """
+    text = message.strip()
+    if not text:
+        return None
+
+    normalized = normalize_message(text)
+
+    if message_hash(text) in set(rules.get('known_campaign_hashes') or []):
+        return verdict(True, 'known spam campaign', rules)
+
+    if normalized in set(rules.get('ham_phrases') or []):
+        return verdict(False, 'common legitimate phrase', rules)
+
+    if symbols_only(text):
+        symbols_verdict = rules.get('symbols_only_verdict', 'bedrock')
+        if symbols_verdict in ('spam', 'ham'):
+            return verdict(symbols_verdict == 'spam', 'only emojis or symbols', rules)
+
+    urls = URL_PATTERN.findall(text)
+    if urls and not URL_PATTERN.sub('', text).strip():
+        url_verdict = rules.get('url_only_verdict', 'bedrock')
+        if url_verdict in ('spam', 'ham'):
+            return verdict(url_verdict == 'spam', 'only links', rules)
+
+    if len(text) > rules.get('max_message_length', math.inf):
+        return verdict(True, 'message too long', rules)
+
+    if len(urls) >= rules.get('max_urls', math.inf):
+        return verdict(True, f'{len(urls)} links', rules)
+
+    phone_numbers = PHONE_PATTERN.findall(text)
+    if len(phone_numbers) >= rules.get('max_phone_numbers', math.inf):
+        return verdict(True, f'{len(phone_numbers)} phone numbers', rules)
+
+    if longest_character_run(text) >= rules.get('max_repeated_characters', math.inf):
+        # "siiiiiiiiiiiiiiii gracias" is emphasis, not noise: let Bedrock decide
+        if has_real_words(text):
+            return None
+        return verdict(True, 'repeated characters', rules)
+
+    if len(text) >= rules.get('min_length_for_entropy', math.inf):
+        entropy = character_entropy(text)
+        if entropy < rules.get('min_character_entropy', 0):
+            return verdict(True, f'repetitive text (entropy {entropy:.2f})', rules)
+
+    return None
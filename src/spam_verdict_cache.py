@@ -0,0 +1,123 @@
+import logging
+import os
+import time
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from aws_clients import get_table
+from lru_cache import LRUCache
+from spam_heuristics import message_hash
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+DEFAULT_MEMORY_ENTRIES = 5000
+DEFAULT_TTL_HOURS = 24
+DEFAULT_BEDROCK_LATENCY_MS = 600
+
+# In-process tier, kept across warm invocations
+memory_cache = LRUCache(DEFAULT_MEMORY_ENTRIES)
+
+# Per-container counters used for the hit rate / saved latency logs
+cache_stats = {
+    'lookups': 0,
+    'memory_hits': 0,
+    'table_hits': 0,
+    'saved_ms': 0.0,
+    'bedrock_calls': 0,
+    'bedrock_ms': 0.0
+}
+
+
+def get_cache_key(message_body: str, model_id: str) -> str:
+    """Verdicts are keyed by model and normalized text, so a model change starts a fresh cache"""
+    return f"{model_id}#{message_hash(message_body)}"
+
+
+def get_average_bedrock_latency_ms(settings: Dict[str, Any]) -> float:
+    """Average measured Bedrock latency in this container, or the configured estimate"""
+    if cache_stats['bedrock_calls']:
+        return cache_stats['bedrock_ms'] / cache_stats['bedrock_calls']
+    return float(settings.get('assumed_bedrock_latency_ms', DEFAULT_BEDROCK_LATENCY_MS))
+
+
+def record_bedrock_latency(elapsed_ms: float):
+    """Measure Bedrock calls so saved latency reflects real model latency"""
+    cache_stats['bedrock_calls'] += 1
+    cache_stats['bedrock_ms'] += elapsed_ms
+
+
+def log_cache_stats(source: str):
+    """Log how this message was resolved and the container-wide hit rate and saved latency"""
+    hits = cache_stats['memory_hits'] + cache_stats['table_hits']
+    lookups = cache_stats['lookups']
+    hit_rate = hits / lookups if lookups else 0.0
+    logger.info(
+        f"Spam verdict cache: {source} | hit rate {hit_rate:.1%} ({hits}/{lookups}, "
+        f"memory {cache_stats['memory_hits']}, table {cache_stats['table_hits']}) | "
+        f"saved {cache_stats['saved_ms']:.0f} ms of Bedrock latency"
+    )
+
+
+def get_cached_verdict(message_body: str, model_id: str, settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Look up a previous Bedrock verdict for the same normalized text.
+    Checks the in-process LRU first and then the DynamoDB table.
+    Returns the verdict (is_spam, confidence, reason, ai_response) or None.
+    """
+    started = time.perf_counter()
+    memory_cache.resize(
+        settings.get('memory_entries', DEFAULT_MEMORY_ENTRIES),
+        settings.get('ttl_hours', DEFAULT_TTL_HOURS) * 3600
+    )
+    cache_key = get_cache_key(message_body, model_id)
+    cache_stats['lookups'] += 1
+
+    verdict = memory_cache.get(cache_key)
+    source = 'memory_hit'
+
+    if verdict is None:
+        source = 'table_hit'
+        try:
+            verdict_table = get_table(os.environ['SPAM_VERDICT_CACHE_TABLE'])
+            item = verdict_table.get_item(Key={'cache_key': cache_key}).get('Item')
+            # TTL deletion can lag, so expired items are ignored here
+            if item and int(item.get('expires_at', 0)) > time.time():
+                verdict = {
+                    'is_spam': bool(item['is_spam']),
+                    'confidence': float(item['confidence']),
+                    'reason': item.get('reason', ''),
+                    'ai_response': item.get('ai_response', '')
+                }
+                memory_cache.put(cache_key, verdict)
+        except Exception as e:
+            logger.warning(f"Could not read spam verdict cache: {str(e)}")
+
+    if verdict is None:
+        log_cache_stats('miss')
+        return None
+
+    cache_stats['memory_hits' if source == 'memory_hit' else 'table_hits'] += 1
+    lookup_ms = (time.perf_counter() - started) * 1000
+    cache_stats['saved_ms'] += max(get_average_bedrock_latency_ms(settings) - lookup_ms, 0.0)
+    log_cache_stats(source)
+    return verdict
+
+
+def store_verdict(message_body: str, model_id: str, verdict: Dict[str, Any], settings: Dict[str, Any]):
+    """Store a Bedrock verdict in both tiers without failing the caller"""
+    cache_key = get_cache_key(message_body, model_id)
+    memory_cache.put(cache_key, verdict)
+
+    try:
+        verdict_table = get_table(os.environ['SPAM_VERDICT_CACHE_TABLE'])
+        verdict_table.put_item(Item={
+            'cache_key': cache_key,
+            'is_spam': verdict['is_spam'],
+            'confidence': Decimal(str(verdict['confidence'])),
+            'reason': verdict['reason'],
+            'ai_response': verdict.get('ai_response', ''),
+            'expires_at': int(time.time() + settings.get('ttl_hours', DEFAULT_TTL_HOURS) * 3600)
+        })
+    except Exception as e:
+        logger.warning(f"Could not store spam verdict: {str(e)}")
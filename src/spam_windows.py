@@ -0,0 +1,109 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def day_window_start(days: int, now: datetime) -> str:
+    """Window start at the beginning of the day `days` ago (message limits semantics)"""
+    return (now - timedelta(days=days)).date().isoformat()
+
+
+def exact_window_start(days: int, now: datetime) -> str:
+    """Window start exactly `days` ago (spam activities limits semantics)"""
+    return (now - timedelta(days=days)).isoformat()
+
+
+def query_sort_key_values(table, index_name: str, partition_key: str, partition_value: str,
+                          sort_key: str, since: str, filter_expression: Optional[str] = None,
+                          filter_names: Optional[Dict[str, str]] = None,
+                          filter_values: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Return the sort key values of an index partition from `since` onwards, ascending.
+    Only the sort key is projected and every page is followed, so partitions
+    larger than 1MB are counted completely.
+    """
+    query_kwargs = {
+        'IndexName': index_name,
+        'KeyConditionExpression': '#pk = :partition_value AND #sk >= :since',
+        'ProjectionExpression': '#sk',
+        'ExpressionAttributeNames': {'#pk': partition_key, '#sk': sort_key},
+        'ExpressionAttributeValues': {':partition_value': partition_value, ':since': since}
+    }
+    if filter_expression:
+        query_kwargs['FilterExpression'] = filter_expression
+        query_kwargs['ExpressionAttributeNames'].update(filter_names or {})
+        query_kwargs['ExpressionAttributeValues'].update(filter_values or {})
+
+    values = []
+    while True:
+        response = table.query(**query_kwargs)
+        values.extend(item[sort_key] for item in response['Items'])
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    return values
+
+
+def count_since(sorted_values: List[str], since: str) -> int:
+    """Count values >= since in an ascending list"""
+    return len(sorted_values) - bisect_left(sorted_values, since)
+
+
+def evaluate_windows(table, index_name: str, partition_key: str, partition_value: str,
+                     sort_key: str, limits: List[Tuple[int, int]], window_start=exact_window_start,
+                     now: Optional[datetime] = None, filter_expression: Optional[str] = None,
+                     filter_names: Optional[Dict[str, str]] = None,
+                     filter_values: Optional[Dict[str, Any]] = None,
+                     pending_values: Optional[List[str]] = None) -> List[Tuple[int, int, int]]:
+    """
+    Count items in every configured [days, limit] window with a single query.
+    Queries once for the largest window and derives the count of each window
+    from the sorted sort key values. pending_values are sort key values of
+    items being written concurrently: counted once whether or not the index
+    already returns them. Returns (days, limit, count) per window, in the
+    configured order.
+    """
+    if not limits:
+        return []
+
+    now = now or datetime.now()
+    starts = [window_start(days, now) for days, _ in limits]
+
+    sorted_values = query_sort_key_values(
+        table, index_name, partition_key, partition_value, sort_key, min(starts),
+        filter_expression, filter_names, filter_values
+    )
+    sorted_values.extend(value for value in pending_values or [] if value not in sorted_values)
+    sorted_values.sort()
+
+    return [
+        (days, limit, count_since(sorted_values, start))
+        for (days, limit), start in zip(limits, starts)
+    ]
+
+
+def evaluate_message_windows(activities_table, lead_id: str, message_limits: List[Tuple[int, int]],
+                             now: Optional[datetime] = None) -> List[Tuple[int, int, int]]:
+    """Inbound message counts for each message_limits window"""
+    return evaluate_windows(
+        activities_table, 'lead-id-created-at-index', 'lead_id', lead_id, 'created_at',
+        message_limits, window_start=day_window_start, now=now,
+        # Only messages sent by the lead count towards its limits
+        filter_expression='#direction = :inbound',
+        filter_names={'#direction': 'direction'},
+        filter_values={':inbound': 'inbound'}
+    )
+
+
+def evaluate_spam_windows(spam_activities_table, lead_id: str, spam_activities_limits: List[Tuple[int, int]],
+                          now: Optional[datetime] = None,
+                          pending_spam_dates: Optional[List[str]] = None) -> List[Tuple[int, int, int]]:
+    """Spam activity counts for each spam_activities_limits window"""
+    return evaluate_windows(
+        spam_activities_table, 'lead-id-spam-date-index', 'lead_id', lead_id, 'spam_date',
+        spam_activities_limits, window_start=exact_window_start, now=now,
+        pending_values=pending_spam_dates
+    )
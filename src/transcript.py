@@ -0,0 +1,120 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from prompt_budget import estimate_tokens
+
+# 'lines': the history as a compact transcript inside the user turn;
+# 'messages': the history as alternating Bedrock user/assistant messages
+TRANSCRIPT_FORMATS = ('lines', 'messages')
+
+ROLE_LABELS = {
+    'lead': 'Lead',
+    'assistant': 'You'
+}
+
+# Rough per-message overhead of the messages array (role markers)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def get_transcript_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    settings = config.get('transcript', {})
+    if settings.get('format', 'lines') not in TRANSCRIPT_FORMATS:
+        raise ValueError(f"Unknown transcript format {settings['format']}")
+    return settings
+
+
+def parse_timestamp(timestamp: str) -> Optional[datetime]:
+    """Stored ISO timestamps as naive UTC (the Lambda clock), None if missing or invalid"""
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def relative_time(timestamp: str, now: datetime) -> str:
+    """Coarse age of a message ('just now', '5m ago', '3h ago', '2d ago'), '' if unknown"""
+    parsed = parse_timestamp(timestamp)
+    if parsed is None:
+        return ''
+    seconds = (now - parsed).total_seconds()
+    if seconds < 60:
+        return 'just now'
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m ago"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}h ago"
+    return f"{int(seconds // 86400)}d ago"
+
+
+def compact_turns(history: List[Dict[str, str]], current_message: str = '') -> List[Tuple[str, str, str]]:
+    """
+    (role, text, timestamp) of the non-empty messages of a history (newest
+    first, conversation history format), oldest first, with whitespace
+    collapsed. The newest entry is left out when it is the current message,
+    which the prompt already carries.
+    """
+    turns = []
+    for index, turn in enumerate(reversed(history)):
+        lead_message = ' '.join((turn.get('lead_message') or '').split())
+        assistant_message = ' '.join((turn.get('assistant_message') or '').split())
+        is_current = (index == len(history) - 1 and not assistant_message
+                      and lead_message == ' '.join(current_message.split()))
+        if lead_message and not is_current:
+            turns.append(('lead', lead_message, turn.get('timestamp', '')))
+        if assistant_message:
+            turns.append(('assistant', assistant_message, turn.get('timestamp', '')))
+    return turns
+
+
+def render_lines(turns: List[Tuple[str, str, str]], now: datetime) -> str:
+    """
+    One 'Role: text' line per message, oldest first, with a '[3h ago]' line
+    whenever the relative time changes instead of a timestamp per message.
+    """
+    lines = []
+    last_age = None
+    for role, text, timestamp in turns:
+        age = relative_time(timestamp, now)
+        if age and age != last_age:
+            lines.append(f"[{age}]")
+            last_age = age
+        lines.append(f"{ROLE_LABELS[role]}: {text}")
+    return '\n'.join(lines)
+
+
+def to_bedrock_messages(turns: List[Tuple[str, str, str]], context: str, now: datetime) -> List[Dict[str, str]]:
+    """
+    Bedrock messages array: the turns as alternating user/assistant messages
+    (consecutive messages of one side merged) followed by the user turn with
+    the context. Relative times go on lead messages only, so the model does
+    not imitate them in its replies.
+    """
+    messages: List[Dict[str, str]] = []
+    last_age = None
+    for role, text, timestamp in turns:
+        bedrock_role = 'user' if role == 'lead' else 'assistant'
+        if bedrock_role == 'user':
+            age = relative_time(timestamp, now)
+            if age and age != last_age:
+                text = f"[{age}] {text}"
+                last_age = age
+        if messages and messages[-1]['role'] == bedrock_role:
+            messages[-1]['content'] += '\n' + text
+        else:
+            messages.append({'role': bedrock_role, 'content': text})
+
+    if messages and messages[-1]['role'] == 'user':
+        messages[-1]['content'] += '\n\n' + context
+    else:
+        messages.append({'role': 'user', 'content': context})
+    # The conversation must open with a user message
+    if messages[0]['role'] == 'assistant':
+        messages.insert(0, {'role': 'user', 'content': '(earlier conversation)'})
+    return messages
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS for message in messages)
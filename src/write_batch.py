@@ -0,0 +1,107 @@
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.types import TypeSerializer
+
+from aws_clients import get_client, get_table
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# DynamoDB request limits
+TRANSACTION_MAX_ITEMS = 100
+BATCH_WRITE_MAX_ITEMS = 25
+
+BATCH_WRITE_ATTEMPTS = 5
+BATCH_WRITE_BASE_DELAY_SECONDS = 0.05
+
+_serializer = TypeSerializer()
+
+
+def get_write_coalescing_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    return config.get('write_coalescing', {})
+
+
+def serialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Item in the low-level attribute value format of the DynamoDB client"""
+    return {key: _serializer.serialize(value) for key, value in item.items()}
+
+
+class WriteBatch:
+    """
+    Collects the put writes of a stage (any tables) and flushes them together:
+    as one TransactWriteItems when the items must appear all or none (atomic),
+    else as BatchWriteItem requests of up to 25 items with unprocessed items
+    retried. With coalesce off every item is a PutItem of its own.
+    Atomic batches can carry a condition per item (e.g. attribute_not_exists(id)).
+    """
+
+    def __init__(self, atomic: bool = False, coalesce: bool = True):
+        self.atomic = atomic
+        self.coalesce = coalesce
+        self.puts: List[Tuple[str, Dict[str, Any], Optional[str]]] = []
+
+    def put(self, table_name: str, item: Dict[str, Any], condition_expression: Optional[str] = None) -> 'WriteBatch':
+        if condition_expression and not self.atomic:
+            raise ValueError("Conditional puts need an atomic batch")
+        self.puts.append((table_name, item, condition_expression))
+        return self
+
+    def __len__(self) -> int:
+        return len(self.puts)
+
+    def flush(self) -> int:
+        """Write the collected items; returns the number of DynamoDB requests made"""
+        puts, self.puts = self.puts, []
+        if not puts:
+            return 0
+        if not self.coalesce:
+            for table_name, item, condition_expression in puts:
+                get_table(table_name).put_item(
+                    Item=item, **({'ConditionExpression': condition_expression} if condition_expression else {})
+                )
+            return len(puts)
+        if self.atomic:
+            return transact_put(puts)
+        return batch_put(puts)
+
+
+def transact_put(puts: List[Tuple[str, Dict[str, Any], Optional[str]]]) -> int:
+    """
+    Put all items in one transaction. If a condition fails the client raises
+    TransactionCanceledException, with a CancellationReasons entry per item.
+    """
+    if len(puts) > TRANSACTION_MAX_ITEMS:
+        raise ValueError(f"A transaction holds at most {TRANSACTION_MAX_ITEMS} items, got {len(puts)}")
+    transact_items = []
+    for table_name, item, condition_expression in puts:
+        put = {'TableName': table_name, 'Item': serialize_item(item)}
+        if condition_expression:
+            put['ConditionExpression'] = condition_expression
+        transact_items.append({'Put': put})
+    get_client('dynamodb').transact_write_items(TransactItems=transact_items)
+    return 1
+
+
+def batch_put(puts: List[Tuple[str, Dict[str, Any], Optional[str]]]) -> int:
+    """Put the items in BatchWriteItem requests, retrying unprocessed items with backoff"""
+    client = get_client('dynamodb')
+    requests = 0
+    for start in range(0, len(puts), BATCH_WRITE_MAX_ITEMS):
+        request_items: Dict[str, List[Dict[str, Any]]] = {}
+        for table_name, item, _ in puts[start:start + BATCH_WRITE_MAX_ITEMS]:
+            request_items.setdefault(table_name, []).append({'PutRequest': {'Item': serialize_item(item)}})
+
+        for attempt in range(BATCH_WRITE_ATTEMPTS):
+            response = client.batch_write_item(RequestItems=request_items)
+            requests += 1
+            request_items = response.get('UnprocessedItems') or {}
+            if not request_items:
+                break
+            time.sleep(BATCH_WRITE_BASE_DELAY_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5))
+        else:
+            unprocessed = sum(len(table_requests) for table_requests in request_items.values())
+            raise Exception(f"{unprocessed} item(s) still unprocessed after {BATCH_WRITE_ATTEMPTS} BatchWriteItem attempts")
+    return requests
@@ -0,0 +1,112 @@
+"""
+Property tests: reply segmentation (src/message_segmentation.py).
+
+Randomized texts mixing prose, long words, emojis with skin tones / ZWJ
+sequences / flags, combining accents and line breaks are segmented with
+random limits and units, checking that:
+
+- every message fits the limit in the platform's unit (code points, UTF-16)
+- messages are non-empty, trimmed, and together keep every non-space character in order
+- messages only break inside a word when the word alone exceeds the limit
+- grapheme clusters are never split
+- streamed segmentation (StreamSegmenter) gives exactly the batch messages
+
+Usage:
+    python -m pytest tests/test_message_segmentation.py
+"""
+import os
+import random
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from message_segmentation import grapheme_ends, segment_message, segment_spans, text_length
+from reply_stream import StreamSegmenter
+
+WORDS = ('hola maquina expendedora renting precio instalacion seguro reposicion tarjeta oficina hospital '
+         'rentabilidad inteligencia artificial sensores camara estantes').split()
+EMOJIS = ['😀', '👍🏽', '👨‍👩‍👧', '🇪🇸', '❤️', '1️⃣', 'é', 'ñ']
+STOPS = ['. ', '! ', '? ', '.\n', '\n\n', ', ', ' ']
+CASES = 500
+
+
+def random_text(rng, size):
+    parts = []
+    length = 0
+    while length < size:
+        roll = rng.random()
+        if roll < 0.75:
+            token = rng.choice(WORDS)
+        elif roll < 0.9:
+            token = rng.choice(EMOJIS)
+        elif roll < 0.97:
+            token = ''.join(rng.choice(WORDS) for _ in range(rng.randint(3, 30)))  # long word
+        else:
+            token = 'https://example.com/' + 'x' * rng.randint(10, 400)
+        parts.append(token)
+        parts.append(rng.choice(STOPS) if rng.random() < 0.3 else ' ')
+        length += len(token) + 1
+    return ''.join(parts)
+
+
+def stream(text, max_length, unit):
+    """Messages of StreamSegmenter fed the text in random small chunks"""
+    segmenter = StreamSegmenter(max_length, unit)
+    messages = []
+    position = 0
+    rng = random.Random(len(text))
+    while position < len(text):
+        step = rng.randint(1, 20)
+        messages.extend(segmenter.feed(text[position:position + step]))
+        position += step
+    messages.extend(segmenter.close())
+    return messages
+
+
+@pytest.mark.parametrize('case', range(CASES))
+def test_random_text(case):
+    rng = random.Random(case)
+    text = random_text(rng, rng.randint(0, 3000))
+    max_length = rng.choice([5, 20, 160, 280, 1600, 4096])
+    unit = rng.choice(['code_points', 'utf16'])
+
+    spans = segment_spans(text, max_length, unit)
+    messages = [text[start:end] for start, end in spans]
+    clusters = set()
+    for word in re.finditer(r'\S+', text):
+        clusters.update(grapheme_ends(text, word.start(), word.end()))
+
+    for message in messages:
+        assert message and message == message.strip(), f"empty or untrimmed message {message!r}"
+        if len(list(grapheme_ends(message, 0, len(message)))) > 1:
+            assert text_length(message, unit) <= max_length, \
+                f"message of {text_length(message, unit)} {unit} > {max_length}"
+
+    assert re.sub(r'\s', '', ''.join(messages)) == re.sub(r'\s', '', text), "messages do not cover the text"
+
+    for (_, end), (next_start, _) in zip(spans, spans[1:]):
+        assert not text[end:next_start].strip(), "text lost between messages"
+        if end == next_start:
+            # Broken inside a word: only allowed for words longer than a message, at a grapheme boundary
+            word_start = max(text.rfind(' ', 0, end), text.rfind('\n', 0, end)) + 1
+            word_end = min([position for position in (text.find(' ', end), text.find('\n', end)) if position >= 0] or [len(text)])
+            assert text_length(text[word_start:word_end], unit) > max_length, \
+                f"word split although it fits: {text[word_start:word_end]!r}"
+            assert end in clusters, "grapheme cluster split"
+
+    assert stream(text, max_length, unit) == messages, "streamed messages differ from batch messages"
+
+
+def test_short_message_is_kept_whole():
+    assert segment_message('Hola, ¿en qué puedo ayudarte?', 280) == ['Hola, ¿en qué puedo ayudarte?']
+
+
+def test_zwj_sequence_is_not_split():
+    assert segment_message('👨‍👩‍👧' * 3, 5) == ['👨‍👩‍👧'] * 3
+
+
+def test_utf16_counts_skin_tone_emoji_as_four_units():
+    assert segment_message('👍🏽 ' * 10, 8, 'utf16') == ['👍🏽'] * 10